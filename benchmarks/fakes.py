@@ -0,0 +1,332 @@
+"""
+Pengganti lokal untuk semua upstream (Telegram Bot API, OpenAI, Gemini, Google Sheets).
+
+Setiap fake punya latency (dengan jitter) dan injeksi error/429 yang bisa
+diatur, serta menghitung jumlah panggilan per operasi. Fake dipasang pada
+level transport/client sehingga kode service yang sebenarnya (rate limiter,
+retry, parsing) tetap berjalan.
+"""
+import asyncio
+import io
+import json
+import random
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+FINANCIAL_RESULT = {
+    "prompt_text": "",
+    "category": "food",
+    "amount": 25000,
+    "payment_method": "gopay",
+    "type": "expense",
+    "summary": "Transaksi benchmark",
+    "items": []
+}
+
+class FakeUpstream:
+    """Latency dan injeksi error untuk satu upstream"""
+
+    def __init__(self, name: str, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def outcome(self, operation: str) -> str:
+        """Mencatat satu panggilan dan menentukan hasilnya: "ok", "error" atau "throttle" """
+        self.calls[operation] += 1
+        roll = random.random()
+        if roll < self.throttle_rate:
+            self.errors["throttle"] += 1
+            return "throttle"
+        if roll < self.throttle_rate + self.error_rate:
+            self.errors["error"] += 1
+            return "error"
+        return "ok"
+
+    async def wait(self):
+        await asyncio.sleep(self.delay())
+
+    def wait_blocking(self):
+        time.sleep(self.delay())
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": dict(self.calls), "injected": dict(self.errors)}
+
+def build_result(prompt: str, structured: bool = False) -> str:
+    """
+    Respons LLM palsu: satu objek JSON, atau JSON array untuk prompt batch
+    (dibungkus {"transactions": [...]} jika structured output diminta).
+    """
+    batch = re.search(r"JSON array berisi (\d+) objek", prompt)
+    if batch:
+        count = int(batch.group(1))
+        results = [dict(FINANCIAL_RESULT, index=index) for index in range(1, count + 1)]
+        return json.dumps({"transactions": results} if structured else results)
+    return json.dumps(FINANCIAL_RESULT)
+
+def make_receipt_image(width: int = 1600, height: int = 1200) -> bytes:
+    """JPEG sederhana mirip foto struk agar preprocessing gambar ikut terukur"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (width, height), (235, 232, 225))
+    draw = ImageDraw.Draw(image)
+    for line in range(30):
+        y = 80 + line * 35
+        draw.rectangle((200, y, 200 + random.randint(400, 1100), y + 12), fill=(40, 40, 40))
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+class FakeTelegram(FakeUpstream):
+    """Bot API palsu (sendMessage, editMessageText, getFile, unduhan file) untuk httpx.MockTransport"""
+
+    def __init__(self, image_data: bytes, **kwargs):
+        super().__init__("telegram", **kwargs)
+        self.image_data = image_data
+        self.messages: List[Dict[str, Any]] = []
+        self.edits: List[Dict[str, Any]] = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        operation = "download" if "/file/" in path else path.rsplit("/", 1)[-1]
+        outcome = self.outcome(operation)
+        await self.wait()
+
+        if outcome == "throttle":
+            return httpx.Response(429, json={
+                "ok": False, "error_code": 429, "description": "Too Many Requests",
+                "parameters": {"retry_after": 1}
+            })
+        if outcome == "error":
+            return httpx.Response(500, json={"ok": False, "error_code": 500, "description": "Internal Server Error"})
+
+        if operation == "download":
+            return httpx.Response(200, content=self.image_data, headers={"content-type": "image/jpeg"})
+        if operation == "getFile":
+            return httpx.Response(200, json={"ok": True, "result": {"file_path": "photos/benchmark.jpg"}})
+
+        payload = json.loads(request.content) if request.content else {}
+        if operation == "sendMessage":
+            self.messages.append(payload)
+        elif operation == "editMessageText":
+            self.edits.append(payload)
+        return httpx.Response(200, json={"ok": True, "result": {"message_id": len(self.messages)}})
+
+class FakeOpenAI(FakeUpstream):
+    """Endpoint chat completions palsu untuk httpx.MockTransport"""
+
+    def __init__(self, **kwargs):
+        super().__init__("openai", **kwargs)
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        outcome = self.outcome("chat.completions")
+        await self.wait()
+
+        if outcome == "throttle":
+            return httpx.Response(429, headers={"retry-after": "1"}, json={
+                "error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}
+            })
+        if outcome == "error":
+            return httpx.Response(500, json={"error": {"message": "Internal error", "type": "server_error"}})
+
+        body = json.loads(request.content)
+        prompt = ""
+        for message in body.get("messages", []):
+            content = message.get("content")
+            if isinstance(content, str):
+                prompt += content
+            else:
+                prompt += "".join(part.get("text", "") for part in content if part.get("type") == "text")
+
+        prompt_tokens = len(prompt) // 4
+        return httpx.Response(200, headers={
+            "x-ratelimit-remaining-requests": "1000",
+            "x-ratelimit-remaining-tokens": "1000000"
+        }, json={
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": build_result(prompt, structured="response_format" in body)
+                },
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 60, "total_tokens": prompt_tokens + 60}
+        })
+
+class FakeGeminiResponse:
+    def __init__(self, text: str, prompt_tokens: int):
+        self.text = text
+        self.usage_metadata = type("UsageMetadata", (), {
+            "prompt_token_count": prompt_tokens,
+            "candidates_token_count": 60
+        })()
+
+class FakeGeminiModel(FakeUpstream):
+    """Pengganti genai.GenerativeModel dengan generate_content_async"""
+
+    def __init__(self, **kwargs):
+        super().__init__("gemini", **kwargs)
+
+    async def generate_content_async(self, contents, request_options: Optional[Dict[str, Any]] = None,
+                                     generation_config: Optional[Dict[str, Any]] = None):
+        from google.api_core import exceptions as google_exceptions
+
+        outcome = self.outcome("generate_content")
+        await self.wait()
+        if outcome == "throttle":
+            raise google_exceptions.ResourceExhausted("Quota exceeded (benchmark)")
+        if outcome == "error":
+            raise google_exceptions.InternalServerError("Internal error (benchmark)")
+
+        prompt = contents if isinstance(contents, str) else "".join(part for part in contents if isinstance(part, str))
+        structured = bool(generation_config and generation_config.get("response_schema"))
+        return FakeGeminiResponse(build_result(prompt, structured), len(prompt) // 4)
+
+class FakeAPIErrorResponse:
+    """Respons minimal agar gspread.exceptions.APIError bisa dibuat"""
+
+    def __init__(self, code: int, message: str):
+        self.status_code = code
+        self.text = message
+        self._body = {"error": {"code": code, "message": message, "status": "BENCHMARK"}}
+
+    def json(self):
+        return self._body
+
+class FakeWorksheet:
+    def __init__(self, upstream: FakeUpstream, title: str = "Sheet1"):
+        self.upstream = upstream
+        self.title = title
+        self.rows: List[List[Any]] = []
+
+    def _call(self, operation: str):
+        from gspread.exceptions import APIError
+
+        outcome = self.upstream.outcome(operation)
+        self.upstream.wait_blocking()
+        if outcome == "throttle":
+            raise APIError(FakeAPIErrorResponse(429, "Quota exceeded (benchmark)"))
+        if outcome == "error":
+            raise APIError(FakeAPIErrorResponse(500, "Internal error (benchmark)"))
+
+    def row_values(self, row: int) -> List[Any]:
+        self._call("row_values")
+        return self.rows[row - 1] if len(self.rows) >= row else []
+
+    def append_row(self, values: List[Any], **kwargs):
+        self._call("append_row")
+        self.rows.append(values)
+
+    def append_rows(self, values: List[List[Any]], **kwargs) -> Dict[str, Any]:
+        self._call("append_rows")
+        start = len(self.rows) + 1
+        self.rows.extend(values)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:H{len(self.rows)}"}}
+
+    def col_values(self, col: int) -> List[Any]:
+        self._call("col_values")
+        return [row[col - 1] for row in self.rows if len(row) >= col]
+
+    def insert_row(self, values: List[Any], index: int = 1, **kwargs):
+        self._call("insert_row")
+        self.rows.insert(index - 1, values)
+
+    def sort(self, *specs, range: Optional[str] = None):
+        from gspread.utils import a1_to_rowcol
+
+        self._call("sort")
+        start, end = 1, len(self.rows)
+        if range:
+            start = a1_to_rowcol(range.split(":")[0])[0]
+            end = a1_to_rowcol(range.split(":")[1])[0]
+        block = sorted(self.rows[start - 1:end], key=lambda row: str(row[0]), reverse=True)
+        self.rows[start - 1:end] = block
+
+class FakeSpreadsheet:
+    def __init__(self, upstream: FakeUpstream, title: str):
+        self.id = "benchmark-spreadsheet"
+        self.url = "https://docs.google.com/spreadsheets/d/benchmark-spreadsheet"
+        self.title = title
+        self.upstream = upstream
+        self.sheet1 = FakeWorksheet(upstream)
+        self.worksheets = {self.sheet1.title: self.sheet1}
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        from gspread.exceptions import WorksheetNotFound
+
+        if title not in self.worksheets:
+            raise WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title: str, rows: int, cols: int) -> FakeWorksheet:
+        self.upstream.outcome("add_worksheet")
+        self.upstream.wait_blocking()
+        self.worksheets[title] = FakeWorksheet(self.upstream, title)
+        return self.worksheets[title]
+
+class FakeSheetsClient:
+    """Pengganti client gspread (open, open_by_key, create)"""
+
+    def __init__(self, upstream: FakeUpstream, title: str):
+        self.upstream = upstream
+        self.spreadsheet = FakeSpreadsheet(upstream, title)
+
+    def open(self, title: str) -> FakeSpreadsheet:
+        self.upstream.outcome("open")
+        self.upstream.wait_blocking()
+        return self.spreadsheet
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        self.upstream.outcome("open_by_key")
+        self.upstream.wait_blocking()
+        return self.spreadsheet
+
+    def create(self, title: str) -> FakeSpreadsheet:
+        return self.spreadsheet
+
+class FakeUpstreams:
+    """Kumpulan semua fake upstream untuk satu run benchmark"""
+
+    def __init__(self, telegram: Dict[str, float], openai: Dict[str, float],
+                 gemini: Dict[str, float], sheets: Dict[str, float]):
+        self.telegram = FakeTelegram(make_receipt_image(), **telegram)
+        self.openai = FakeOpenAI(**openai)
+        self.gemini = FakeGeminiModel(**gemini)
+        self.sheets = FakeUpstream("sheets", **sheets)
+
+    def install(self, finance_bot):
+        """Pasang semua fake ke service container aplikasi"""
+        import openai
+        from config import settings
+
+        finance_bot.telegram._client = httpx.AsyncClient(transport=httpx.MockTransport(self.telegram.handler))
+        finance_bot.chatgpt.client = openai.AsyncOpenAI(
+            api_key="benchmark",
+            timeout=settings.llm_timeout,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.openai.handler))
+        )
+        finance_bot.gemini.model = self.gemini
+        finance_bot.sheets._client = FakeSheetsClient(self.sheets, settings.google_sheet_name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            upstream.name: upstream.stats()
+            for upstream in (self.telegram, self.openai, self.gemini, self.sheets)
+        }
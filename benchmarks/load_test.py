@@ -0,0 +1,258 @@
+"""
+Load test end-to-end untuk `/webhook` tanpa upstream sungguhan.
+
+Aplikasi FastAPI dijalankan in-process (lifespan, antrian, ledger dan
+replikasi ikut berjalan), semua upstream diganti fake dari `fakes.py`, lalu
+update teks dan foto dikirim ke `/webhook` dengan laju tertentu. Hasilnya:
+throughput, latency p50/p95/p99 (dari request webhook sampai update selesai
+diproses) dan jumlah panggilan ke setiap upstream.
+
+Contoh dari root repository:
+
+    python benchmarks/load_test.py --rate 50 --duration 20 --photo-ratio 0.2 \\
+        --openai-latency 1.5 --openai-error-rate 0.02
+
+Setting aplikasi lain (WEBHOOK_WORKERS, LLM_BATCHING_ENABLED, ...) diatur lewat
+environment variable seperti biasa. Kuota rate limit (OPENAI_RPM, OPENAI_TPM,
+GEMINI_RPM, SHEETS_WRITES_PER_MINUTE) default-nya dinaikkan karena fake tidak
+punya kuota; export nilai produksi untuk mengukur efek rate limiter.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FAST_PATH_TEXTS = [
+    "makan siang 25rb gopay",
+    "bensin 50rb cash",
+    "kopi 18rb ovo",
+    "parkir 5rb cash",
+    "gajian 5jt bca"
+]
+
+LLM_TEXTS = [
+    "tadi belanja bulanan di supermarket sama bayar laundry juga",
+    "transfer ke adik buat bayar kos bulan ini",
+    "beli hadiah ulang tahun teman kantor patungan",
+    "bayar tagihan listrik dan internet rumah"
+]
+
+def letters(number: int) -> str:
+    """Kode huruf unik (tanpa angka, agar tidak terbaca sebagai nominal)"""
+    code = ""
+    number += 1
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        code = string.ascii_lowercase[remainder] + code
+    return code
+
+def build_update(index: int, args) -> dict:
+    """Membuat satu update Telegram (teks fast path, teks LLM, atau foto)"""
+    chat_id = 100000 + index % args.chats
+    message = {
+        "message_id": index,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "first_name": "Benchmark"}
+    }
+    roll = random.random()
+    if roll < args.photo_ratio:
+        unique = letters(index) if args.unique else "same"
+        message["photo"] = [
+            {"file_id": f"small-{unique}", "file_unique_id": f"small-{unique}", "width": 90, "height": 68},
+            {"file_id": f"large-{unique}", "file_unique_id": f"large-{unique}", "width": 1600, "height": 1200}
+        ]
+    elif roll < args.photo_ratio + args.fast_path_ratio:
+        message["text"] = random.choice(FAST_PATH_TEXTS)
+    else:
+        text = random.choice(LLM_TEXTS)
+        message["text"] = f"{text} nota {letters(index)}" if args.unique else text
+    return {"update_id": index, "message": message}
+
+def percentile(values: List[float], percent: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def upstream_options(parser: argparse.ArgumentParser, name: str, latency: float):
+    parser.add_argument(f"--{name}-latency", type=float, default=latency, help=f"latency {name} (detik)")
+    parser.add_argument(f"--{name}-jitter", type=float, default=latency / 4, help=f"jitter latency {name} (detik)")
+    parser.add_argument(f"--{name}-error-rate", type=float, default=0.0, help=f"proporsi error 5xx {name}")
+    parser.add_argument(f"--{name}-throttle-rate", type=float, default=0.0, help=f"proporsi 429 {name}")
+
+def upstream_config(args, name: str) -> Dict[str, float]:
+    key = name.replace("-", "_")
+    return {
+        "latency": getattr(args, f"{key}_latency"),
+        "jitter": getattr(args, f"{key}_jitter"),
+        "error_rate": getattr(args, f"{key}_error_rate"),
+        "throttle_rate": getattr(args, f"{key}_throttle_rate")
+    }
+
+def prepare_environment(data_dir: str):
+    """Environment default agar benchmark tidak menyentuh data atau kredensial asli"""
+    for name in ("TELEGRAM_BOT_TOKEN", "TELEGRAM_CHAT_ID", "GEMINI_API_KEY", "GEMINI_API_URL",
+                 "OPENAI_API_KEY", "VERIFY_TOKEN"):
+        os.environ.setdefault(name, "benchmark")
+    os.environ.setdefault("LEDGER_ENABLED", "true")
+    os.environ.setdefault("LEDGER_PATH", os.path.join(data_dir, "ledger.db"))
+    # Benchmark mengukur mode host yang berjalan terus (antrian webhook aktif)
+    os.environ.setdefault("WEBHOOK_WORKERS", "4")
+    for name, value in (("OPENAI_RPM", "100000"), ("OPENAI_TPM", "100000000"),
+                        ("GEMINI_RPM", "100000"), ("SHEETS_WRITES_PER_MINUTE", "6000")):
+        os.environ.setdefault(name, value)
+    os.environ["DEDUP_PERSIST_PATH"] = ""
+    os.environ["EXTRACTION_CACHE_PATH"] = ""
+    os.environ["CATEGORY_INDEX_PATH"] = os.path.join(data_dir, "category_index.db")
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+async def run(args) -> dict:
+    import httpx
+    import main
+    from fakes import FakeUpstreams
+
+    fakes = FakeUpstreams(
+        telegram=upstream_config(args, "telegram"),
+        openai=upstream_config(args, "openai"),
+        gemini=upstream_config(args, "gemini"),
+        sheets=upstream_config(args, "sheets")
+    )
+    fakes.install(main.finance_bot)
+
+    # Catat kapan setiap update selesai diproses (inline maupun lewat antrian)
+    sent_at: Dict[int, float] = {}
+    finished_at: Dict[int, float] = {}
+    failed: List[int] = []
+    handle_update = main.handle_update
+
+    async def timed_handle_update(data):
+        try:
+            await handle_update(data)
+        except Exception:
+            failed.append(data["update_id"])
+            raise
+        finally:
+            finished_at[data["update_id"]] = time.perf_counter()
+
+    main.handle_update = timed_handle_update
+
+    statuses: Dict[int, int] = {}
+    total = int(args.rate * args.duration)
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            async def post(index: int):
+                update = build_update(index, args)
+                sent_at[index] = time.perf_counter()
+                response = await client.post("/webhook", content=json.dumps(update))
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            started = time.perf_counter()
+            tasks = []
+            for index in range(total):
+                # Laju konstan: update ke-i dikirim pada detik i / rate
+                delay = started + index / args.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(post(index)))
+            await asyncio.gather(*tasks)
+
+            # Tunggu antrian selesai diproses
+            accepted = statuses.get(200, 0)
+            deadline = time.perf_counter() + args.drain_timeout
+            while len(finished_at) < accepted and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)
+            elapsed = time.perf_counter() - started
+
+            metrics_text = (await client.get("/metrics")).text if args.metrics_out else None
+
+    latencies = [(finished_at[index] - sent_at[index]) * 1000 for index in finished_at if index in sent_at]
+    report = {
+        "sent": total,
+        "http_status": statuses,
+        "completed": len(finished_at),
+        "failed": len(failed),
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_per_second": round(len(finished_at) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else None
+        },
+        "upstreams": fakes.stats(),
+        "replies_sent": len(fakes.telegram.messages),
+        "replies_edited": len(fakes.telegram.edits),
+        "fast_path": main.finance_bot.fast_path.stats(),
+        "extraction_cache": main.finance_bot.cache.stats(),
+        "rate_limits": main.rate_limiter.stats()
+    }
+    if metrics_text is not None:
+        with open(args.metrics_out, "w") as output:
+            output.write(metrics_text)
+    return report
+
+def print_report(report: dict):
+    latency = report["latency_ms"]
+    print("\n📊 Hasil load test")
+    print(f"  dikirim       : {report['sent']} update, status HTTP {report['http_status']}")
+    print(f"  selesai       : {report['completed']} ({report['failed']} gagal) dalam {report['elapsed_seconds']} detik")
+    print(f"  throughput    : {report['throughput_per_second']} update/detik")
+    if latency["p50"] is not None:
+        print(
+            f"  latency       : p50 {latency['p50']:.0f}ms  p95 {latency['p95']:.0f}ms  "
+            f"p99 {latency['p99']:.0f}ms  max {latency['max']:.0f}ms"
+        )
+    print(f"  balasan       : {report['replies_sent']} sendMessage, {report['replies_edited']} editMessageText")
+    print("  upstream      :")
+    for name, stats in report["upstreams"].items():
+        calls = ", ".join(f"{operation}={count}" for operation, count in sorted(stats["calls"].items())) or "-"
+        injected = ", ".join(f"{kind}={count}" for kind, count in stats["injected"].items())
+        print(f"    {name:<9} {calls}{f'  (injeksi: {injected})' if injected else ''}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /webhook dengan upstream palsu")
+    parser.add_argument("--rate", type=float, default=20, help="update per detik")
+    parser.add_argument("--duration", type=float, default=10, help="lama pengiriman (detik)")
+    parser.add_argument("--chats", type=int, default=200, help="jumlah chat berbeda")
+    parser.add_argument("--photo-ratio", type=float, default=0.2, help="proporsi update foto")
+    parser.add_argument("--fast-path-ratio", type=float, default=0.3, help="proporsi teks yang lolos fast path")
+    parser.add_argument("--no-unique", dest="unique", action="store_false",
+                        help="ulangi teks/foto yang sama (mengukur cache ekstraksi)")
+    parser.add_argument("--provider", choices=["chatgpt", "gemini"], default=None, help="AI provider aktif")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="batas tunggu antrian selesai (detik)")
+    parser.add_argument("--seed", type=int, default=1, help="seed random untuk campuran update")
+    parser.add_argument("--json", action="store_true", help="cetak hasil sebagai JSON")
+    parser.add_argument("--metrics-out", default=None, help="simpan /metrics (Prometheus) ke file ini")
+    upstream_options(parser, "telegram", 0.05)
+    upstream_options(parser, "openai", 1.0)
+    upstream_options(parser, "gemini", 0.8)
+    upstream_options(parser, "sheets", 0.3)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory(prefix="finance-bot-benchmark-") as data_dir:
+        prepare_environment(data_dir)
+        if args.provider:
+            os.environ["AI_PROVIDER"] = args.provider
+        report = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark waktu cold start aplikasi.
+
+Setiap skenario dijalankan di proses Python baru (seperti cold start di
+Vercel), lalu median waktunya dibandingkan:
+
+- lazy:  `import main` saja (SDK berat baru dimuat saat pertama kali dipakai)
+- eager: `import main` lalu memuat semua SDK dan membuat semua service
+         seperti sebelumnya (dua client OpenAI, dua kali genai.configure)
+
+Cara menjalankan dari root repository:
+
+    python benchmarks/startup_benchmark.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["openai", "google.generativeai", "gspread", "PIL.Image"]
+
+LAZY = """
+import main
+"""
+
+EAGER = """
+import main
+from services.chatgpt_service import ChatGPTService
+from services.gemini_service import GeminiService
+from services.google_sheets_service import GoogleSheetsService
+from services.image_preprocessor_service import ImagePreprocessorService
+# Perilaku lama: setiap service dibuat di main.py dan di FinanceBotService
+for _ in range(2):
+    ChatGPTService()
+    GeminiService()
+    GoogleSheetsService()
+ImagePreprocessorService()
+"""
+
+MEASURE = """
+import json, sys, time
+started = time.perf_counter()
+exec(compile({code!r}, "<scenario>", "exec"))
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "loaded": [name for name in {modules!r} if name in sys.modules]
+}}))
+"""
+
+def run_scenario(code: str) -> dict:
+    """Menjalankan satu skenario di proses baru dan mengembalikan hasil ukurnya"""
+    env = dict(os.environ)
+    # Nilai dummy agar config bisa dimuat tanpa .env
+    for name in ("TELEGRAM_BOT_TOKEN", "TELEGRAM_CHAT_ID", "GEMINI_API_KEY", "GEMINI_API_URL",
+                 "OPENAI_API_KEY", "VERIFY_TOKEN"):
+        env.setdefault(name, "benchmark")
+    env.setdefault("WEBHOOK_WORKERS", "0")
+    script = MEASURE.format(code=code, modules=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", script],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure(name: str, code: str, runs: int) -> dict:
+    results = [run_scenario(code) for _ in range(runs)]
+    timings = [result["seconds"] * 1000 for result in results]
+    return {
+        "name": name,
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "max_ms": max(timings),
+        "loaded": results[-1]["loaded"]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold start (lazy vs eager import)")
+    parser.add_argument("--runs", type=int, default=5, help="jumlah proses per skenario")
+    args = parser.parse_args()
+
+    lazy = measure("lazy", LAZY, args.runs)
+    eager = measure("eager", EAGER, args.runs)
+
+    print(f"{'skenario':<8} {'median':>10} {'min':>10} {'max':>10}  SDK dimuat")
+    for result in (lazy, eager):
+        print(
+            f"{result['name']:<8} {result['median_ms']:>8.0f}ms {result['min_ms']:>8.0f}ms "
+            f"{result['max_ms']:>8.0f}ms  {', '.join(result['loaded']) or '-'}"
+        )
+    saved = eager["median_ms"] - lazy["median_ms"]
+    print(f"\n⚡ Hemat {saved:.0f}ms ({saved / eager['median_ms'] * 100:.0f}%) per cold start")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+CLI import riwayat transaksi dari export chat Telegram (JSON) atau CSV bank.
+
+Contoh:
+
+    python bulk_import.py result.json --chat-id 123456789
+    python bulk_import.py mutasi_bca.csv --chat-id 123456789 --payment-method bca
+    python bulk_import.py result.json --chat-id 123456789 --from-id 123456789
+
+Menjalankan ulang perintah yang sama melanjutkan import dari checkpoint.
+"""
+import argparse
+import asyncio
+from config import settings
+from services.finance_bot_service import FinanceBotService
+from services.bulk_import_service import BulkImportService
+from services.thread_pool_service import thread_pool
+
+async def run(args):
+    finance_bot = FinanceBotService()
+    importer = BulkImportService(finance_bot)
+    try:
+        job = await importer.run_import(
+            args.path, args.chat_id, args.format, args.payment_method,
+            from_id=args.from_id, encoding=args.encoding
+        )
+
+        if settings.ledger_enabled and not args.no_sync:
+            # Salin baris baru ke Google Sheets dalam batch besar sebelum keluar
+            print("🔄 Sinkronisasi ke Google Sheets...")
+            await finance_bot.replicator.start()
+            await finance_bot.replicator.stop()
+            print(f"📊 Replikasi: {finance_bot.replicator.stats()}")
+    finally:
+        await finance_bot.telegram.close()
+        thread_pool.shutdown()
+        finance_bot.cache.close()
+        finance_bot.ledger.close()
+
+    print(
+        f"\n✅ Import {job['import_id']} {job['status']}: {job['imported']} transaksi tersimpan "
+        f"(terstruktur {job['structured']}, fast path {job['fast_path']}, LLM {job['llm']}, "
+        f"dilewati {job['skipped']}, gagal {job['failed']})"
+    )
+    if job["error"]:
+        print(f"❌ {job['error']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Import riwayat transaksi (Telegram JSON / CSV bank)")
+    parser.add_argument("path", help="file result.json export Telegram atau CSV")
+    parser.add_argument("--chat-id", type=int, required=True, help="chat Telegram pemilik transaksi")
+    parser.add_argument("--format", choices=["auto", "telegram", "csv"], default="auto")
+    parser.add_argument("--payment-method", default=None, help="metode pembayaran default untuk CSV bank")
+    parser.add_argument("--from-id", default=None,
+                        help="hanya import pesan dari pengirim ini (export Telegram, mis. 123456789)")
+    parser.add_argument("--encoding", default=None, help="encoding CSV (default deteksi otomatis)")
+    parser.add_argument("--no-sync", action="store_true", help="jangan sinkron ke Google Sheets setelah import")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
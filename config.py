@@ -1,8 +1,10 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     google_sheet_name: str = "Keuangan Telegram"
+    google_sheet_id: Optional[str] = None  # Jika diisi, spreadsheet langsung dibuka dengan ID
     
     TELEGRAM_BOT_TOKEN: str
     TELEGRAM_CHAT_ID: str
@@ -17,6 +19,130 @@ class Settings(BaseSettings):
     # AI Provider setting - default menggunakan chatgpt
     ai_provider: str = "chatgpt"  # "chatgpt" atau "gemini"
     
+    # Antrian webhook - 0 worker berarti update diproses langsung di request.
+    # Default 0 karena di serverless (Vercel) kerja setelah response 200 bisa dibekukan
+    # atau hilang; aktifkan worker hanya di host yang berjalan terus (VPS, container)
+    webhook_workers: int = 0
+    webhook_queue_size: int = 100
+    webhook_enqueue_timeout: float = 2.0  # detik menunggu slot antrian sebelum menolak
+    webhook_drain_timeout: float = 30.0  # detik menyelesaikan job tersisa saat shutdown
+    webhook_url: Optional[str] = None  # contoh: "https://bot.example.com/webhook"
+    
+    # Mode ingest update: "webhook" atau "polling" (getUpdates, tanpa HTTP masuk)
+    telegram_mode: str = "webhook"
+    polling_timeout: int = 30  # detik long-poll getUpdates
+    polling_limit: int = 100  # update per getUpdates (maks 100)
+    polling_concurrency: int = 16  # update diproses bersamaan (urutan per chat tetap)
+    polling_offset_path: str = "data/telegram_offset.json"
+    
+    # Dedup update Telegram berdasarkan update_id
+    dedup_max_size: int = 10000
+    dedup_ttl: float = 86400.0  # Telegram menyimpan update maksimal 24 jam
+    dedup_persist_path: Optional[str] = None  # contoh: "data/seen_updates.json"
+    
+    # Cache hasil ekstraksi AI (LRU + TTL, SQLite opsional)
+    extraction_cache_enabled: bool = True
+    extraction_cache_max_size: int = 2000  # entry di memori
+    extraction_cache_disk_max_size: int = 50000  # entry di SQLite
+    extraction_cache_ttl: float = 604800.0  # 7 hari
+    extraction_cache_path: Optional[str] = None  # contoh: "data/extraction_cache.db"
+    
+    # Fast path parser lokal untuk teks transaksi sederhana (tanpa LLM)
+    fast_path_enabled: bool = True
+    fast_path_min_confidence: float = 0.8
+    fast_path_max_words: int = 12
+    
+    # Indeks merchant/item -> kategori & metode pembayaran dari transaksi tersimpan
+    category_index_enabled: bool = True
+    # Default di memori saja; isi path (mis. data/category_index.db) di host dengan disk
+    # persisten agar indeks tetap hangat setelah restart (bukan di Vercel/serverless)
+    category_index_path: Optional[str] = None
+    category_index_min_support: int = 2  # transaksi minimal sebelum label dipakai
+    category_index_min_share: float = 0.75  # porsi minimal label dominan untuk satu frasa
+    
+    # Preprocessing gambar struk sebelum dikirim ke AI provider
+    image_preprocess_enabled: bool = True
+    image_min_long_edge: int = 1000  # ukuran foto Telegram terkecil yang masih terbaca
+    image_target_long_edge: int = 1280
+    image_grayscale: bool = True
+    image_jpeg_quality: int = 80
+    image_max_download_bytes: int = 10 * 1024 * 1024
+    
+    # Album foto (media_group_id): foto dikumpulkan lalu diproses bersamaan dengan satu balasan
+    album_enabled: bool = True
+    album_window: float = 1.0  # detik menunggu foto berikutnya dari album yang sama
+    album_max_size: int = 10  # Telegram membatasi album maksimal 10 media
+    
+    # Micro-batching ekstraksi teks ke satu request LLM (per provider)
+    llm_batching_enabled: bool = False
+    llm_batch_window: float = 0.25  # detik mengumpulkan teks sebelum dikirim
+    llm_batch_max_size: int = 8
+    
+    # Structured output: JSON schema native provider + perbaikan lokal sebelum bertanya ulang
+    structured_output_enabled: bool = True
+    structured_output_reask: bool = True  # minta provider memperbaiki JSON jika perbaikan lokal gagal
+    
+    # Router AI provider: failover, circuit breaker dan hedging
+    router_failover: bool = True  # coba provider lain jika provider aktif gagal
+    router_latency_window: int = 100  # jumlah request terakhir untuk statistik latency
+    router_hedging_enabled: bool = False
+    router_hedge_min_samples: int = 20  # hedging aktif setelah cukup data latency
+    router_hedge_min_delay: float = 2.0  # detik minimal sebelum request hedging
+    breaker_failure_threshold: int = 5  # gagal berturut-turut sebelum circuit dibuka
+    breaker_cooldown: float = 30.0  # detik sebelum provider dicoba lagi
+    
+    # Ledger SQLite lokal sebagai system of record, Google Sheets sebagai replika.
+    # Butuh disk persisten (VPS, container dengan volume); default mati karena
+    # filesystem serverless (Vercel) read-only atau hilang setiap deploy
+    ledger_enabled: bool = False
+    ledger_path: str = "data/ledger.db"
+    replication_interval: float = 5.0  # detik antar sinkronisasi saat idle
+    replication_batch_size: int = 500
+    replication_max_backoff: float = 300.0
+    
+    # Bulk import riwayat (export chat Telegram JSON / CSV bank)
+    import_concurrency: int = 8  # ekstraksi paralel per import
+    import_batch_size: int = 200  # baris per batch tulis + checkpoint
+    import_dir: str = "data/imports"  # file upload dan checkpoint import
+    
+    # Telegram HTTP client - satu connection pool keep-alive untuk semua request
+    telegram_timeout: float = 30.0
+    telegram_connect_timeout: float = 5.0
+    telegram_max_connections: int = 50
+    telegram_max_keepalive_connections: int = 20
+    
+    # Status pemrosesan: "typing" (sendChatAction) atau "placeholder" (satu pesan yang diedit)
+    status_message_mode: str = "typing"
+    # Detik antar sendChatAction ulang selama proses berjalan; 0 = kirim sekali saja
+    # (pengiriman ulang ikut memakai kuota global Telegram)
+    status_typing_interval: float = 0.0
+    
+    # AI provider - timeout per panggilan dan ukuran thread pool untuk SDK yang blocking
+    llm_timeout: float = 60.0
+    blocking_pool_size: int = 8
+    
+    # Google Sheets write-behind buffer
+    sheets_batch_size: int = 50  # maksimal baris per batch
+    sheets_flush_interval: float = 2.0  # detik mengumpulkan baris sebelum flush
+    sheets_sort_interval: float = 10.0  # detik antar pengurutan ulang (terbaru di atas)
+    sheets_cache_ttl: float = 600.0  # detik sebelum handle worksheet divalidasi ulang
+    sheets_shard_mode: str = "none"  # "none", "chat", "month" atau "chat_month" (worksheet per shard)
+    sheets_shard_rows: int = 1000  # ukuran awal worksheet shard baru
+    
+    # Rate limit & konkurensi per upstream (request diantrikan, bukan ditolak)
+    openai_rpm: int = 500
+    openai_tpm: int = 30000
+    openai_max_concurrency: int = 16
+    gemini_rpm: int = 15
+    gemini_max_concurrency: int = 8
+    sheets_writes_per_minute: int = 60
+    sheets_max_concurrency: int = 2
+    telegram_global_per_second: float = 30.0
+    telegram_chat_per_second: float = 1.0
+    telegram_group_per_minute: int = 20
+    rate_limit_max_retries: int = 5
+    rate_limit_default_backoff: float = 5.0  # detik jeda jika upstream tidak memberi retry_after
+    
     class Config:
         env_file = ".env"
 
@@ -1,24 +1,63 @@
-from fastapi import FastAPI, Request, HTTPException
+import codecs
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException, UploadFile, File, Form
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional, List
 from config import settings
 from services.finance_bot_service import FinanceBotService
-from services.telegram_service import TelegramService
-from services.gemini_service import GeminiService
-from services.chatgpt_service import ChatGPTService
-from services.google_sheets_service import GoogleSheetsService
+from services.job_queue_service import JobQueueService
+from services.thread_pool_service import thread_pool
+from services.rate_limiter_service import rate_limiter
+from services.metrics_service import metrics
+from services.prompt_service import prompts
+from services.update_dedup_service import UpdateDedupService
+from services.bulk_import_service import BulkImportService
+from services.telegram_polling_service import TelegramPollingService
 import os
 from datetime import datetime
 import pytz
 
-app = FastAPI()
-
 # Initialize services
+# Satu container untuk semua service; SDK berat (OpenAI, Gemini, gspread, Pillow)
+# baru diimport saat pertama kali dipakai agar cold start cepat
 finance_bot = FinanceBotService()
-telegram_service = TelegramService()
-gemini_service = GeminiService()
-chatgpt_service = ChatGPTService()
-google_sheets_service = GoogleSheetsService()
+telegram_service = finance_bot.telegram  # Berbagi connection pool yang sama
+job_queue = JobQueueService()
+update_dedup = UpdateDedupService()
+bulk_importer = BulkImportService(finance_bot)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Menjalankan worker antrian dan connection pool saat startup, menutupnya saat shutdown"""
+    await telegram_service.start()
+    # Muat indeks kategori (atau bangun dari ledger) sebelum pesan pertama
+    await thread_pool.run(finance_bot.category_index.load)
+    if settings.ledger_enabled:
+        await finance_bot.replicator.start()
+    else:
+        # Tanpa ledger, transaksi ditulis langsung lewat write-behind buffer Sheets
+        await finance_bot.sheets.start()
+    if settings.webhook_workers > 0:
+        await job_queue.start()
+    if settings.telegram_mode == "polling":
+        await polling_runner.start()
+    yield
+    await polling_runner.stop()
+    await bulk_importer.stop()
+    await job_queue.stop()
+    await finance_bot.albums.stop()
+    await finance_bot.replicator.stop()
+    if finance_bot.is_loaded("sheets"):
+        await finance_bot.sheets.stop()
+    await telegram_service.close()
+    thread_pool.shutdown()
+    update_dedup.save()
+    finance_bot.cache.close()
+    finance_bot.category_index.close()
+    finance_bot.ledger.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Models untuk Telegram webhook
 class TelegramPhotoSize(BaseModel):
@@ -51,7 +90,7 @@ class TelegramUpdate(BaseModel):
 # Models untuk response data keuangan
 class FinancialItem(BaseModel):
     name: str
-    quantity: Optional[int] = 1
+    quantity: Optional[float] = 1
     price: Optional[float] = 0.0
 
 class FinancialData(BaseModel):
@@ -72,69 +111,121 @@ class AIProviderRequest(BaseModel):
 def read_root():
     return {"message": "Telegram Finance Bot is running (Modular Version)"}
 
+async def handle_update(data: dict):
+    """Memproses update yang sudah diklaim, lalu menandainya selesai"""
+    update_id = data.get("update_id")
+    try:
+        await finance_bot.process_update(data)
+    except Exception:
+        update_dedup.release(update_id)
+        raise
+    update_dedup.mark_processed(update_id)
+
+async def process_polled_update(data: dict):
+    """Memproses update dari getUpdates lewat pipeline yang sama dengan webhook"""
+    update_id = data.get("update_id")
+    if update_id is not None and not update_dedup.claim(update_id):
+        return
+    await handle_update(data)
+
+polling_runner = TelegramPollingService(telegram_service, process_polled_update)
+
 @app.post("/webhook")
 async def telegram_webhook(request: Request):
     """Endpoint untuk menerima webhook dari Telegram"""
     try:
         # Mendapatkan data dari webhook
         data = await request.json()
-        
-        # Cek apakah ada pesan dalam update
-        if "message" in data:
-            message = data["message"]
-            chat_id = message["chat"]["id"]
-            user_name = message["from"].get("first_name", "User")
-            message_timestamp = message.get("date", 0)  # Unix timestamp dari Telegram
-            
-            # Menangani pesan teks
-            if "text" in message:
-                user_text = message["text"]
-                await finance_bot.process_text_message(chat_id, user_name, user_text, message_timestamp)
-            
-            # Menangani pesan gambar
-            elif "photo" in message:
-                photos = message["photo"]
-                largest_photo = photos[-1]
-                file_id = largest_photo["file_id"]
-                caption = message.get("caption", "")
-                
-                await finance_bot.process_image_message(chat_id, user_name, file_id, message_timestamp, caption)
-            
-            # Menangani jenis pesan lainnya
-            else:
-                finance_bot.process_unsupported_message(chat_id, user_name)
-            
+    except Exception as e:
+        print(f"Error processing webhook: {e}")
+        raise HTTPException(status_code=400, detail="Error processing webhook")
+    
+    # Buang update yang sudah/sedang diproses sebelum ada kerja LLM atau Sheets
+    update_id = data.get("update_id")
+    if update_id is not None and not update_dedup.claim(update_id):
+        return {"status": "duplicate"}
+    
+    # Jika antrian aktif, langsung balas 200 dan proses update di worker
+    if job_queue.is_running:
+        accepted = await job_queue.submit(lambda: handle_update(data))
+        if not accepted:
+            # Telegram akan mengirim ulang update saat menerima non-2xx
+            update_dedup.release(update_id)
+            raise HTTPException(status_code=503, detail="Antrian penuh, coba lagi nanti")
+        return {"status": "queued"}
+    
+    try:
+        await handle_update(data)
         return {"status": "ok"}
         
     except Exception as e:
         print(f"Error processing webhook: {e}")
         raise HTTPException(status_code=400, detail="Error processing webhook")
 
+@app.post("/import")
+async def bulk_import(
+    file: UploadFile = File(...),
+    chat_id: int = Form(...),
+    format: str = Form("auto"),
+    payment_method: Optional[str] = Form(None),
+    from_id: Optional[str] = Form(None),
+    encoding: Optional[str] = Form(None)
+):
+    """
+    Import riwayat transaksi (export chat Telegram JSON atau CSV bank) di background.
+    
+    Mengirim ulang file yang sama melanjutkan import dari checkpoint terakhir.
+    `from_id` hanya mengimport pesan dari satu pengirim (export Telegram),
+    `encoding` memaksa encoding CSV (default dideteksi otomatis).
+    """
+    if format not in ("auto", "telegram", "csv"):
+        raise HTTPException(status_code=400, detail="Format harus auto, telegram atau csv")
+    if encoding:
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            raise HTTPException(status_code=400, detail=f"Encoding tidak dikenal: {encoding}")
+    
+    path = await bulk_importer.save_upload(file)
+    return await bulk_importer.start_import(path, chat_id, format, payment_method, from_id, encoding)
+
+@app.get("/import/{import_id}")
+def get_import_status(import_id: str):
+    """Progres import riwayat"""
+    job = bulk_importer.get_job(import_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import tidak ditemukan")
+    return job
+
 @app.post("/set-webhook")
-def set_webhook():
-    """Endpoint untuk mengatur webhook Telegram (untuk testing)"""
-    webhook_url = "https://yourdomain.com/webhook"  # Ganti dengan URL domain Anda
-    result = telegram_service.set_webhook(webhook_url)
+async def set_webhook(url: Optional[str] = None):
+    """Endpoint untuk mengatur webhook Telegram (URL dari parameter atau WEBHOOK_URL)"""
+    webhook_url = url or settings.webhook_url
+    if not webhook_url:
+        raise HTTPException(status_code=400, detail="WEBHOOK_URL belum dikonfigurasi")
+    if polling_runner.is_running:
+        raise HTTPException(status_code=409, detail="Bot sedang berjalan dalam mode polling")
+    result = await telegram_service.set_webhook(webhook_url)
     return result
 
 @app.get("/webhook-info")
-def get_webhook_info():
+async def get_webhook_info():
     """Mendapatkan informasi webhook yang sudah diset"""
-    return telegram_service.get_webhook_info()
+    return await telegram_service.get_webhook_info()
 
 @app.post("/test-send")
-def test_send_message(chat_id: int, message: str):
+async def test_send_message(chat_id: int, message: str):
     """Endpoint untuk testing pengiriman pesan (untuk development)"""
     try:
-        result = telegram_service.send_message(chat_id, message)
+        result = await telegram_service.send_message(chat_id, message)
         return {"status": "sent", "result": result}
     except Exception as e:
         return {"error": str(e)}
 
 @app.get("/bot-info")
-def get_bot_info():
+async def get_bot_info():
     """Mendapatkan informasi bot"""
-    return telegram_service.get_bot_info()
+    return await telegram_service.get_bot_info()
 
 @app.post("/test-gemini")
 async def test_gemini(text: str = None):
@@ -143,7 +234,7 @@ async def test_gemini(text: str = None):
         if not text:
             return {"error": "Text parameter is required"}
             
-        result = await gemini_service.process_financial_data(text_content=text)
+        result = await finance_bot.gemini.process_financial_data(text_content=text)
         return {"status": "processed", "result": result}
     except Exception as e:
         return {"error": str(e)}
@@ -152,7 +243,7 @@ async def test_gemini(text: str = None):
 def test_google_sheets():
     """Endpoint untuk testing koneksi Google Sheets"""
     try:
-        result = google_sheets_service.test_connection()
+        result = finance_bot.sheets.test_connection()
         return result
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -173,15 +264,36 @@ def health_check():
             "gemini_ai": "configured" if settings.GEMINI_API_KEY else "not_configured",
             "chatgpt_ai": "configured" if settings.OPENAI_API_KEY else "not_configured",
             "google_sheets": "configured" if os.path.exists('credentials.json') else "not_configured"
-        }
+        },
+        "loaded_services": {
+            name: finance_bot.is_loaded(name) for name in ("chatgpt", "gemini", "sheets", "images")
+        },
+        "telegram_mode": settings.telegram_mode,
+        "polling": polling_runner.stats() if settings.telegram_mode == "polling" else None,
+        "queue": job_queue.stats(),
+        "dedup": update_dedup.stats(),
+        "extraction_cache": finance_bot.cache.stats(),
+        "fast_path": finance_bot.fast_path.stats(),
+        "category_index": finance_bot.category_index.stats(),
+        "llm_batching": finance_bot.batcher.stats(),
+        "albums": finance_bot.albums.stats(),
+        "prompt": prompts.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "replication": finance_bot.replicator.stats() if settings.ledger_enabled else None
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Metrics latency per tahap dan pemakaian token dalam format teks Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/ai-provider")
 def get_ai_provider():
     """Mendapatkan AI provider yang sedang aktif"""
     return {
         "current_provider": settings.ai_provider,
-        "available_providers": ["chatgpt", "gemini"]
+        "available_providers": ["chatgpt", "gemini"],
+        "routing": finance_bot.router.state()
     }
 
 @app.post("/ai-provider")
@@ -224,7 +336,7 @@ async def test_chatgpt(text: str = None):
         if not text:
             return {"error": "Text parameter is required"}
             
-        result = await chatgpt_service.process_financial_data(text_content=text)
+        result = await finance_bot.chatgpt.process_financial_data(text_content=text)
         return {"status": "processed", "result": result}
     except Exception as e:
         return {"error": str(e)}
@@ -0,0 +1,29 @@
+"""
+Menjalankan bot dalam mode long-polling getUpdates tanpa server HTTP.
+
+Contoh:
+
+    TELEGRAM_MODE=polling python polling.py
+
+Startup dan shutdown memakai lifespan aplikasi yang sama (antrian, ledger,
+replikasi Sheets), jadi update diproses persis seperti lewat webhook.
+"""
+import asyncio
+import signal
+from config import settings
+
+async def run():
+    settings.telegram_mode = "polling"
+    import main
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with main.lifespan(main.app):
+        await stop.wait()
+        print("🛑 Menghentikan bot...")
+
+if __name__ == "__main__":
+    asyncio.run(run())
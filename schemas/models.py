@@ -1,11 +1,71 @@
-from typing import Optional, List
-from pydantic import BaseModel
+import re
+from typing import Any, Optional, List, Literal
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 
+# Akhiran nominal yang umum di pesan berbahasa Indonesia ("25rb", "2,5jt"),
+# dipakai juga oleh fast path parser
+AMOUNT_MULTIPLIERS = {
+    "rb": 1_000,
+    "ribu": 1_000,
+    "k": 1_000,
+    "jt": 1_000_000,
+    "juta": 1_000_000
+}
+
+TRANSACTION_TYPES = {
+    "pengeluaran": "expense",
+    "pemasukan": "income",
+    "pendapatan": "income",
+}
+
+def coerce_number(value: Any) -> Any:
+    """
+    Mengubah angka berbentuk string dari LLM menjadi angka.
+
+    Contoh: "2" -> 2, "Rp 50.000" -> 50000, "12,5" -> 12.5, "1,250,000.00" -> 1250000,
+    "25rb" -> 25000, "2,5jt" -> 2500000, "Rp -5.000" -> -5000.
+    Nilai selain string, atau string dengan lebih dari satu angka, dikembalikan
+    apa adanya untuk divalidasi (dan ditolak) pydantic.
+    """
+    if not isinstance(value, str):
+        return value
+    text = value.strip().lower()
+    numbers = list(re.finditer(r"\d[\d.,]*", text))
+    if len(numbers) != 1:
+        return value
+    match = numbers[0]
+    digits = match.group(0).strip(".,")
+    # Pemisah terakhir dengan 1-2 digit di belakangnya adalah desimal, sisanya ribuan
+    decimal = re.fullmatch(r"(.*\d)[.,](\d{1,2})", digits)
+    if decimal:
+        number = float(re.sub(r"[.,]", "", decimal.group(1)) + "." + decimal.group(2))
+    else:
+        number = float(re.sub(r"[.,]", "", digits))
+    # Akhiran nominal (rb/k/jt)
+    suffix = re.match(r"\s*([a-z]+)", text[match.end():])
+    if suffix and suffix.group(1) in AMOUNT_MULTIPLIERS:
+        number *= AMOUNT_MULTIPLIERS[suffix.group(1)]
+    # Tanda minus boleh di mana saja sebelum angka ("-5000", "Rp -5.000", "- Rp 5.000")
+    if "-" in text[:match.start()]:
+        number = -number
+    return int(number) if number.is_integer() else number
+
 class TransactionItem(BaseModel):
-    name: str
-    quantity: Optional[int] = 1
-    price: Optional[float] = 0
+    name: str = Field(description="nama item")
+    quantity: Optional[float] = Field(1, description="jumlah item (angka, boleh desimal seperti 1.5 kg)")
+    price: Optional[float] = Field(0, description="harga per item (angka)")
+
+    @field_validator("quantity", "price", mode="before")
+    @classmethod
+    def parse_number(cls, value: Any) -> Any:
+        return coerce_number(value)
+
+    @field_validator("quantity")
+    @classmethod
+    def whole_quantity(cls, value: Optional[float]) -> Any:
+        # Jumlah bulat tetap ditampilkan "x2", bukan "x2.0"
+        return int(value) if value is not None and value.is_integer() else value
 
 class Transaction(BaseModel):
     timestamp: str
@@ -16,4 +76,50 @@ class Transaction(BaseModel):
     category: str
     payment_method: str  # cash/debit/credit/ewallet/transfer/other
     items: Optional[List[TransactionItem]] = []  # Detail items untuk nota belanja
-    image_url: Optional[str] = None  # URL gambar yang diupload ke Google Drive
\ No newline at end of file
+    image_url: Optional[str] = None  # URL gambar yang diupload ke Google Drive
+
+class TransactionExtraction(BaseModel):
+    """Hasil ekstraksi AI untuk satu transaksi (skema structured output LLM)"""
+    prompt_text: str = Field("", description="teks yang diberikan atau deskripsi gambar")
+    category: str = Field(
+        "", description="kategori transaksi (entertainment, transfer, billings, food, shopping, transport, dll)"
+    )
+    amount: float = Field(description="total jumlah uang (angka saja, tanpa mata uang)")
+    payment_method: str = Field(
+        "", description="metode pembayaran (cash, dana, gopay, shopeepay, ovo, bca, bni, dll)"
+    )
+    type: Literal["income", "expense", "transfer"] = Field(description="jenis transaksi")
+    summary: str = Field("", description="ringkasan singkat transaksi")
+    items: List[TransactionItem] = Field(
+        default_factory=list, description="daftar pembelian, hanya jika ada (seperti struk belanja)"
+    )
+
+    @field_validator("amount", mode="before")
+    @classmethod
+    def parse_amount(cls, value: Any) -> Any:
+        return coerce_number(value)
+
+    @field_validator("type", mode="before")
+    @classmethod
+    def parse_type(cls, value: Any) -> Any:
+        if isinstance(value, str):
+            value = value.strip().lower()
+            return TRANSACTION_TYPES.get(value, value)
+        return value
+
+    @field_validator("items", mode="before")
+    @classmethod
+    def parse_items(cls, value: Any) -> Any:
+        return [] if value is None else value
+
+class IndexedTransactionExtraction(TransactionExtraction):
+    index: int = Field(description="nomor teks sesuai urutan input")
+
+    @field_validator("index", mode="before")
+    @classmethod
+    def parse_index(cls, value: Any) -> Any:
+        return coerce_number(value)
+
+class TransactionExtractionBatch(BaseModel):
+    """Hasil ekstraksi AI untuk beberapa teks sekaligus"""
+    transactions: List[IndexedTransactionExtraction]
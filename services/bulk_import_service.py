@@ -0,0 +1,488 @@
+import asyncio
+import codecs
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+from config import settings
+from .thread_pool_service import thread_pool
+from .fast_path_parser_service import INFERRED_FIELDS
+
+ImportRecord = Dict[str, Any]
+
+class BulkImportService:
+    """
+    Service import riwayat transaksi dalam jumlah besar.
+
+    Mendukung export chat Telegram Desktop (JSON) dan CSV bank/mutasi. File
+    dibaca secara streaming, baris yang sudah terstruktur (tanggal + nominal)
+    langsung dikonversi tanpa LLM, sisanya diekstrak paralel dengan batas
+    `import_concurrency`. Hasil ditulis per batch (satu transaksi ledger atau
+    satu append Google Sheets) bersama checkpoint, sehingga import yang
+    terputus bisa dilanjutkan dengan mengirim file yang sama.
+    """
+
+    # Nama kolom CSV yang dikenali (huruf kecil)
+    DATE_COLUMNS = ["date", "tanggal", "tgl", "tanggal transaksi", "transaction date", "posting date", "timestamp"]
+    AMOUNT_COLUMNS = ["amount", "jumlah", "nominal", "mutasi", "nilai"]
+    DEBIT_COLUMNS = ["debit", "debet", "keluar", "pengeluaran", "withdrawal"]
+    CREDIT_COLUMNS = ["credit", "kredit", "masuk", "pemasukan", "deposit"]
+    DESCRIPTION_COLUMNS = ["description", "keterangan", "deskripsi", "uraian", "remark", "catatan", "prompt_text", "summary"]
+    CATEGORY_COLUMNS = ["category", "kategori"]
+    PAYMENT_COLUMNS = ["payment_method", "metode", "metode pembayaran"]
+    TYPE_COLUMNS = ["type", "tipe", "jenis"]
+
+    # Encoding CSV yang dicoba berurutan: export Excel Windows sering cp1252, latin-1 selalu berhasil
+    CSV_ENCODINGS = ["utf-8-sig", "cp1252", "latin-1"]
+
+    DATE_FORMATS = [
+        "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d",
+        "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d %b %Y"
+    ]
+
+    def __init__(self, finance_bot):
+        self.bot = finance_bot
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def detect_format(self, path: str) -> str:
+        """"telegram" untuk export JSON Telegram, selain itu "csv" """
+        # Dibaca sebagai bytes: CSV non-UTF-8 tidak boleh gagal di sini
+        with open(path, "rb") as stream:
+            head = stream.read(4096).removeprefix(codecs.BOM_UTF8).lstrip()
+        return "telegram" if head.startswith(b"{") else "csv"
+
+    def detect_encoding(self, path: str) -> str:
+        """Encoding pertama dari CSV_ENCODINGS yang bisa membaca seluruh file"""
+        for encoding in self.CSV_ENCODINGS:
+            decoder = codecs.getincrementaldecoder(encoding)()
+            try:
+                with open(path, "rb") as stream:
+                    for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+                        decoder.decode(chunk)
+                    decoder.decode(b"", final=True)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+        return self.CSV_ENCODINGS[-1]
+
+    def sender_id(self, from_id: Optional[str]) -> Optional[str]:
+        """Normalisasi id pengirim ("123" atau "user123") ke format `from_id` export Telegram"""
+        if not from_id:
+            return None
+        from_id = str(from_id).strip()
+        return from_id if from_id.startswith(("user", "channel")) else f"user{from_id}"
+
+    def iter_json_array(self, stream: TextIO, key: str = "messages", chunk_size: int = 65536) -> Iterator[Any]:
+        """Membaca elemen array `key` satu per satu tanpa memuat seluruh file"""
+        decoder = json.JSONDecoder()
+        buffer = ""
+        start = re.compile(rf'"{re.escape(key)}"\s*:\s*\[')
+
+        # Cari awal array
+        while True:
+            match = start.search(buffer)
+            if match:
+                buffer = buffer[match.end():]
+                break
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return
+            buffer = buffer[-(len(key) + 16):] + chunk
+
+        eof = False
+        while True:
+            buffer = buffer.lstrip(" \t\r\n,")
+            if buffer.startswith("]"):
+                return
+            if buffer:
+                try:
+                    item, end = decoder.raw_decode(buffer)
+                    buffer = buffer[end:]
+                    yield item
+                    continue
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            elif eof:
+                return
+
+            # Elemen belum lengkap: baca chunk berikutnya
+            chunk = stream.read(chunk_size)
+            if chunk:
+                buffer += chunk
+            else:
+                eof = True
+
+    def message_text(self, message: Dict[str, Any]) -> str:
+        """Teks pesan export Telegram (bisa berupa string atau list entity)"""
+        text = message.get("text", "")
+        if isinstance(text, list):
+            text = "".join(part if isinstance(part, str) else part.get("text", "") for part in text)
+        return text.strip()
+
+    def iter_telegram_export(self, path: str, from_id: Optional[str] = None) -> Iterator[Optional[ImportRecord]]:
+        """
+        Record teks dari export chat Telegram Desktop (result.json).
+
+        Pesan layanan, perintah, foto (file lokal export) dan teks tanpa angka
+        dilewati (None) agar obrolan biasa tidak ikut dikirim ke LLM. Balasan
+        bot ini sendiri (berisi nominal yang sama) selalu dilewati; jika
+        `from_id` diisi, hanya pesan dari pengirim tersebut yang diimport.
+        """
+        bot_sender = self.sender_id(settings.TELEGRAM_BOT_TOKEN.split(":")[0])
+        sender = self.sender_id(from_id)
+        with open(path, encoding="utf-8-sig") as stream:
+            for message in self.iter_json_array(stream):
+                if not isinstance(message, dict) or message.get("type") != "message":
+                    yield None
+                    continue
+                message_sender = str(message.get("from_id", ""))
+                if message_sender == bot_sender or (sender and message_sender != sender):
+                    yield None
+                    continue
+                text = self.message_text(message)
+                if not text or text.startswith("/") or not re.search(r"\d", text):
+                    yield None
+                    continue
+
+                if message.get("date_unixtime"):
+                    timestamp = self.bot.get_timestamp_from_unix(int(message["date_unixtime"]))
+                else:
+                    timestamp = self.parse_date(message.get("date", "")) or ""
+                yield {"text": text, "timestamp": timestamp}
+
+    def iter_csv(self, path: str, chat_id: int, payment_method: Optional[str] = None,
+                 encoding: str = "utf-8-sig") -> Iterator[Optional[ImportRecord]]:
+        """Record dari CSV bank/mutasi; baris dengan tanggal dan nominal tidak perlu LLM"""
+        with open(path, encoding=encoding, newline="") as stream:
+            sample = stream.read(4096)
+            stream.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+            except csv.Error:
+                dialect = csv.excel
+
+            reader = csv.reader(stream, dialect)
+            header = next(reader, None)
+            if header is None:
+                return
+            columns = [column.strip().lower() for column in header]
+
+            for values in reader:
+                row = {column: value.strip() for column, value in zip(columns, values) if column}
+                if not any(row.values()):
+                    yield None
+                    continue
+                yield self.csv_record(row, chat_id, payment_method)
+
+    def iter_records(self, path: str, file_format: str, chat_id: int, payment_method: Optional[str] = None,
+                     from_id: Optional[str] = None, encoding: str = "utf-8-sig") -> Iterator[Optional[ImportRecord]]:
+        if file_format == "telegram":
+            return self.iter_telegram_export(path, from_id)
+        return self.iter_csv(path, chat_id, payment_method, encoding)
+
+    def pick(self, row: Dict[str, str], names: List[str]) -> str:
+        for name in names:
+            if row.get(name):
+                return row[name]
+        return ""
+
+    def parse_number(self, value: str) -> Optional[float]:
+        """
+        Parse nominal CSV: "Rp 1.250.000,00", "1,250,000.00", "-50000", "50,000.00 DB".
+
+        Hasil negatif berarti uang keluar (tanda minus atau akhiran DB/D).
+        """
+        if not value:
+            return None
+        text = value.strip().upper().replace("RP", "").replace("IDR", "").strip()
+        negative = text.startswith("-") or text.startswith("(") or bool(re.search(r"\b(DB|D)$", text))
+        text = re.sub(r"[^\d.,]", "", text)
+        if not text:
+            return None
+
+        # Pemisah terakhir dengan 1-2 digit di belakangnya adalah desimal
+        decimal = re.fullmatch(r"(.*\d)[.,](\d{1,2})", text)
+        if decimal:
+            number = float(re.sub(r"[.,]", "", decimal.group(1)) + "." + decimal.group(2))
+        else:
+            number = float(re.sub(r"[.,]", "", text))
+        return -number if negative else number
+
+    def parse_date(self, value: str) -> Optional[str]:
+        """Tanggal CSV ke format ledger "YYYY-MM-DD HH:MM:SS" """
+        value = value.strip()
+        for date_format in self.DATE_FORMATS:
+            try:
+                return datetime.strptime(value, date_format).strftime("%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                continue
+        return None
+
+    def csv_record(self, row: Dict[str, str], chat_id: int, payment_method: Optional[str]) -> ImportRecord:
+        """Baris CSV menjadi financial_data (terstruktur) atau teks untuk diekstrak LLM"""
+        fast_path = self.bot.fast_path
+        description = self.pick(row, self.DESCRIPTION_COLUMNS)
+        timestamp = self.parse_date(self.pick(row, self.DATE_COLUMNS))
+
+        amount = self.parse_number(self.pick(row, self.AMOUNT_COLUMNS))
+        transaction_type = self.pick(row, self.TYPE_COLUMNS).lower()
+        debit = self.parse_number(self.pick(row, self.DEBIT_COLUMNS))
+        credit = self.parse_number(self.pick(row, self.CREDIT_COLUMNS))
+        if amount is None and debit:
+            amount = -abs(debit)
+        elif amount is None and credit:
+            amount = abs(credit)
+
+        if timestamp is None or not amount:
+            # Tidak cukup terstruktur: serahkan seluruh baris ke fast path / LLM
+            text = description or " ".join(value for value in row.values() if value)
+            return {"text": text, "timestamp": timestamp or ""}
+
+        normalized = description.lower()
+        labels = {label.lower(): name for name, label in fast_path.TYPE_LABELS.items()}
+        transaction_type = labels.get(transaction_type, transaction_type)
+        if transaction_type not in fast_path.TYPE_LABELS:
+            if any(fast_path._contains(normalized, keyword) for keyword in fast_path.TRANSFER_KEYWORDS):
+                transaction_type = "transfer"
+            elif amount > 0 and (credit or any(fast_path._contains(normalized, keyword) for keyword in fast_path.INCOME_KEYWORDS)):
+                transaction_type = "income"
+            else:
+                transaction_type = "expense"
+
+        categories = fast_path.match_keywords(normalized, fast_path.CATEGORY_KEYWORDS)
+        payments = fast_path.match_keywords(normalized, fast_path.PAYMENT_KEYWORDS)
+        learned = self.bot.category_index.lookup(chat_id, description) if not categories or not payments else {}
+        # Field dari indeks atau default tidak dipelajari ulang oleh indeks kategori
+        inferred = []
+        category = self.pick(row, self.CATEGORY_COLUMNS) or (categories[0] if categories else None)
+        if category is None:
+            category = learned.get("category", "other")
+            inferred.append("category")
+        method = self.pick(row, self.PAYMENT_COLUMNS) or (payments[0] if payments else payment_method)
+        if method is None:
+            method = learned.get("payment_method", "bank")
+            inferred.append("payment_method")
+        amount = abs(amount)
+
+        return {
+            "timestamp": timestamp,
+            "financial_data": {
+                "prompt_text": description,
+                "category": category,
+                "amount": int(amount) if amount.is_integer() else amount,
+                "payment_method": method,
+                "type": transaction_type,
+                "summary": f"{fast_path.TYPE_LABELS[transaction_type]} {description}".strip(),
+                "items": [],
+                INFERRED_FIELDS: inferred
+            }
+        }
+
+    def checkpoint_name(self, import_id: str) -> str:
+        return f"import:{import_id}"
+
+    def checkpoint_path(self, import_id: str) -> str:
+        return os.path.join(settings.import_dir, f"{import_id}.checkpoint.json")
+
+    def load_checkpoint(self, import_id: str) -> int:
+        """Jumlah record yang sudah selesai ditulis pada run sebelumnya"""
+        if settings.ledger_enabled:
+            return self.bot.ledger.get_high_water_mark(self.checkpoint_name(import_id))
+        try:
+            with open(self.checkpoint_path(import_id)) as checkpoint:
+                return int(json.load(checkpoint).get("position", 0))
+        except (OSError, ValueError):
+            return 0
+
+    def save_file_checkpoint(self, import_id: str, position: int):
+        os.makedirs(settings.import_dir, exist_ok=True)
+        path = self.checkpoint_path(import_id)
+        with open(path + ".tmp", "w") as checkpoint:
+            json.dump({"position": position, "updated_at": time.time()}, checkpoint)
+        os.replace(path + ".tmp", path)
+
+    async def commit_batch(self, import_id: str, entries: List[Tuple[int, Dict[str, Any]]], position: int):
+        """Tulis satu batch hasil import beserta checkpoint-nya"""
+        if settings.ledger_enabled:
+            # Baris dan checkpoint dalam satu transaksi SQLite: tidak ada duplikat saat resume
+            await thread_pool.run(
+                self.bot.ledger.record_many, entries, (self.checkpoint_name(import_id), position)
+            )
+            self.bot.replicator.notify()
+        else:
+            sheets = self.bot.sheets
+            for shard, rows in sheets.group_rows(entries).items():
+                await sheets.write_rows(rows, shard)
+            await thread_pool.run(self.save_file_checkpoint, import_id, position)
+
+        # Riwayat yang diimport ikut menghangatkan indeks kategori
+        await thread_pool.run(self.bot.category_index.learn_many, entries)
+
+    def file_digest(self, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as stream:
+            for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def make_import_id(self, chat_id: int, digest: str) -> str:
+        """File yang sama untuk chat yang sama selalu mendapat id (dan checkpoint) yang sama"""
+        return f"{chat_id}-{digest[:16]}"
+
+    async def extract(self, job: Dict[str, Any], record: ImportRecord, semaphore: asyncio.Semaphore) -> Optional[Dict[str, Any]]:
+        """financial_data untuk satu record, atau None jika gagal/bukan transaksi"""
+        if "financial_data" in record:
+            job["structured"] += 1
+            financial_data = dict(record["financial_data"])
+        else:
+            financial_data = self.bot.fast_path.try_parse(record["text"], job["chat_id"])
+            if financial_data is not None:
+                job["fast_path"] += 1
+            else:
+                async with semaphore:
+                    job["llm"] += 1
+                    financial_data = await self.bot.extract_text_data(self.bot.get_ai_service(), record["text"])
+                    financial_data = dict(financial_data)
+
+        if "error" in financial_data or not financial_data.get("amount"):
+            job["failed"] += 1
+            return None
+
+        financial_data["timestamp"] = record.get("timestamp") or self.bot.get_timestamp_from_unix(int(time.time()))
+        financial_data.setdefault("prompt_text", record.get("text", ""))
+        return financial_data
+
+    async def run_import(self, path: str, chat_id: int, file_format: str = "auto",
+                         payment_method: Optional[str] = None, import_id: Optional[str] = None,
+                         from_id: Optional[str] = None, encoding: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Menjalankan import sampai selesai (melanjutkan dari checkpoint jika ada).
+
+        `from_id` membatasi export Telegram ke satu pengirim; `encoding` CSV
+        dideteksi otomatis jika tidak diisi.
+        """
+        if import_id is None:
+            import_id = self.make_import_id(chat_id, await thread_pool.run(self.file_digest, path))
+        if file_format == "auto":
+            file_format = self.detect_format(path)
+        if file_format == "csv" and not encoding:
+            encoding = await thread_pool.run(self.detect_encoding, path)
+
+        resume_from = await thread_pool.run(self.load_checkpoint, import_id)
+        job = self.jobs.setdefault(import_id, {})
+        job.update({
+            "import_id": import_id,
+            "chat_id": chat_id,
+            "format": file_format,
+            "encoding": encoding if file_format == "csv" else None,
+            "status": "running",
+            "resumed_from": resume_from,
+            "position": resume_from,
+            "imported": 0,
+            "structured": 0,
+            "fast_path": 0,
+            "llm": 0,
+            "skipped": 0,
+            "failed": 0,
+            "started_at": time.time(),
+            "finished_at": None,
+            "error": None
+        })
+        if resume_from:
+            print(f"📥 Import {import_id} dilanjutkan dari record ke-{resume_from}")
+
+        semaphore = asyncio.Semaphore(settings.import_concurrency)
+
+        async def flush(batch: List[ImportRecord], position: int):
+            results = await asyncio.gather(*[self.extract(job, record, semaphore) for record in batch])
+            entries = [(chat_id, financial_data) for financial_data in results if financial_data is not None]
+            await self.commit_batch(import_id, entries, position)
+            job["imported"] += len(entries)
+            job["position"] = position
+            print(f"📥 Import {import_id}: {position} record dibaca, {job['imported']} transaksi tersimpan")
+
+        try:
+            batch: List[ImportRecord] = []
+            position = 0
+            for record in self.iter_records(path, file_format, chat_id, payment_method,
+                                            from_id, encoding or "utf-8-sig"):
+                position += 1
+                if position <= resume_from:
+                    continue
+                if record is None:
+                    job["skipped"] += 1
+                else:
+                    batch.append(record)
+                if len(batch) >= settings.import_batch_size:
+                    await flush(batch, position)
+                    batch = []
+                    # Beri kesempatan request lain diproses di antara batch
+                    await asyncio.sleep(0)
+            if batch or position > job["position"]:
+                await flush(batch, position)
+            job["status"] = "completed"
+        except asyncio.CancelledError:
+            job["status"] = "interrupted"
+            raise
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            print(f"❌ Import {import_id} gagal pada record ke-{job['position']}: {e}")
+        finally:
+            job["finished_at"] = time.time()
+        return job
+
+    async def save_upload(self, upload) -> str:
+        """Menyimpan file upload (UploadFile) ke `import_dir` secara streaming, mengembalikan path"""
+        os.makedirs(settings.import_dir, exist_ok=True)
+        temporary = os.path.join(settings.import_dir, f"upload-{time.time_ns()}.tmp")
+        with open(temporary, "wb") as output:
+            while True:
+                chunk = await upload.read(1024 * 1024)
+                if not chunk:
+                    break
+                await thread_pool.run(output.write, chunk)
+        return temporary
+
+    async def start_import(self, path: str, chat_id: int, file_format: str = "auto",
+                           payment_method: Optional[str] = None, from_id: Optional[str] = None,
+                           encoding: Optional[str] = None) -> Dict[str, Any]:
+        """Memulai import di background; file yang sama tidak diimport dua kali secara bersamaan"""
+        digest = await thread_pool.run(self.file_digest, path)
+        import_id = self.make_import_id(chat_id, digest)
+
+        task = self._tasks.get(import_id)
+        if task is not None and not task.done():
+            os.remove(path)
+            return self.jobs[import_id]
+
+        extension = ".json" if file_format == "telegram" or (
+            file_format == "auto" and self.detect_format(path) == "telegram"
+        ) else ".csv"
+        stored_path = os.path.join(settings.import_dir, f"{import_id}{extension}")
+        os.replace(path, stored_path)
+
+        self.jobs[import_id] = {"import_id": import_id, "chat_id": chat_id, "status": "queued"}
+        task = asyncio.create_task(
+            self.run_import(stored_path, chat_id, file_format, payment_method, import_id=import_id,
+                            from_id=from_id, encoding=encoding)
+        )
+        self._tasks[import_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(import_id, None))
+        return self.jobs[import_id]
+
+    def get_job(self, import_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(import_id)
+
+    async def stop(self):
+        """Hentikan import yang berjalan; progres aman karena checkpoint per batch"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
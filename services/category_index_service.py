@@ -0,0 +1,293 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config import settings
+from .fast_path_parser_service import FastPathParserService, INFERRED_FIELDS
+from .metrics_service import metrics
+
+class CategoryIndexService:
+    """
+    Indeks merchant/item -> kategori dan metode pembayaran per chat.
+
+    Nama item dan deskripsi transaksi ("indomaret", "kopi susu") dinormalisasi
+    menjadi token lalu disimpan di trie milik chat tersebut beserta hitungan
+    label kategori dan metode pembayarannya. Lookup mencari frasa terpanjang
+    yang cocok di teks, sehingga fast path bisa mengklasifikasikan merchant
+    yang sudah dikenal tanpa LLM dan hasil LLM yang kosong bisa dilengkapi.
+    Hanya label yang dinyatakan pengguna atau LLM yang dipelajari; nilai
+    default dan isian indeks sendiri (`INFERRED_FIELDS`) dilewati. Hitungan
+    disimpan di SQLite dan diperbarui setiap kali transaksi disimpan.
+
+    `lookup` berjalan di event loop, jadi `_lock` hanya melindungi trie di
+    memori; I/O SQLite memakai `_db_lock` tersendiri agar lookup tidak
+    menunggu commit dari thread pool.
+    """
+
+    FIELDS = ["category", "payment_method"]
+
+    # Label yang tidak memberi informasi, tidak dipelajari dan boleh ditimpa indeks
+    UNKNOWN_LABELS = {"", "other", "others", "lainnya", "unknown", "-"}
+
+    STOPWORDS = {
+        "di", "ke", "dari", "untuk", "buat", "dan", "yang", "beli", "bayar", "rp",
+        "rb", "ribu", "k", "jt", "juta", "pcs", "x"
+    }
+
+    # Kata umum yang bukan nama merchant/item, tidak pernah jadi frasa sendiri
+    GENERIC_WORDS = {
+        "pagi", "siang", "sore", "malam", "tadi", "hari", "ini", "kemarin", "besok",
+        "makan", "minum", "jajan", "belanja", "bayar", "beli", "isi", "tambah"
+    }
+
+    MAX_PHRASE_TOKENS = 6
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path if db_path is not None else settings.category_index_path
+        self._roots: Dict[int, Dict[str, Any]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()  # trie di memori
+        self._db_lock = threading.Lock()  # koneksi SQLite
+        self._loaded = False
+        self._phrases = 0
+        self._learned = 0
+        self._hits = 0
+        self._misses = 0
+
+        # Kata pembayaran dan penghubung bukan petunjuk merchant/item
+        self._ignored = set(self.STOPWORDS) | set(FastPathParserService.FILLER_WORDS)
+        for _, keywords in FastPathParserService.PAYMENT_KEYWORDS:
+            self._ignored.update(keyword for keyword in keywords if " " not in keyword)
+
+    def _new_node(self) -> Dict[str, Any]:
+        return {"next": {}, "category": {}, "payment_method": {}}
+
+    # Normalisasi
+
+    def tokenize(self, text: Optional[str]) -> List[str]:
+        """Token huruf kecil tanpa angka, nominal, kata pembayaran dan kata penghubung"""
+        tokens = re.sub(r"[^\w]+", " ", (text or "").lower()).split()
+        return [token for token in tokens if not re.search(r"\d", token) and token not in self._ignored]
+
+    def phrases_for(self, financial_data: Dict[str, Any]) -> List[Tuple[str, ...]]:
+        """
+        Frasa yang dipelajari dari satu transaksi: nama item dan deskripsi teks
+        pendek, masing-masing utuh. Frasa satu kata umum ("siang") dilewati.
+        """
+        texts = [item.get("name") for item in financial_data.get("items") or [] if isinstance(item, dict)]
+        # Deskripsi gambar dari LLM terlalu panjang untuk dijadikan nama merchant
+        texts.append(financial_data.get("prompt_text"))
+
+        phrases = []
+        for text in texts:
+            tokens = self.tokenize(text)
+            if not 0 < len(tokens) <= self.MAX_PHRASE_TOKENS:
+                continue
+            if all(token in self.GENERIC_WORDS for token in tokens):
+                continue
+            phrases.append(tuple(tokens))
+        return list(dict.fromkeys(phrases))
+
+    def _labels_for(self, financial_data: Dict[str, Any]) -> Dict[str, str]:
+        """Label yang boleh dipelajari: bukan default/isian indeks dan bukan label kosong"""
+        inferred = set(financial_data.get(INFERRED_FIELDS) or [])
+        labels = {}
+        for field in self.FIELDS:
+            label = str(financial_data.get(field) or "").strip().lower()
+            if field not in inferred and label not in self.UNKNOWN_LABELS:
+                labels[field] = label
+        return labels
+
+    # Trie
+
+    def _add(self, chat_id: int, phrase: Tuple[str, ...], field: str, label: str, count: int):
+        node = self._roots.setdefault(chat_id, self._new_node())
+        for token in phrase:
+            node = node["next"].setdefault(token, self._new_node())
+        if not node["category"] and not node["payment_method"]:
+            self._phrases += 1
+        node[field][label] = node[field].get(label, 0) + count
+
+    def _dominant(self, counts: Dict[str, int]) -> Optional[Tuple[str, int]]:
+        """Label dominan jika dukungannya cukup (`category_index_min_support`/`min_share`)"""
+        if not counts:
+            return None
+        label, count = max(counts.items(), key=lambda entry: entry[1])
+        if count < settings.category_index_min_support or count / sum(counts.values()) < settings.category_index_min_share:
+            return None
+        return label, count
+
+    def lookup(self, chat_id: Optional[int], text: Optional[str]) -> Dict[str, str]:
+        """
+        Kategori dan metode pembayaran yang dipelajari chat ini untuk teks.
+
+        Dari setiap posisi diambil frasa terpanjang yang dikenal; frasa lebih
+        panjang memberi bobot lebih besar. Field hanya dikembalikan jika
+        semua frasa yang cocok tidak saling bertentangan.
+        """
+        if not settings.category_index_enabled or chat_id is None:
+            return {}
+        self.load()
+
+        tokens = self.tokenize(text)
+        votes: Dict[str, Dict[str, int]] = {field: {} for field in self.FIELDS}
+        with self._lock:
+            root = self._roots.get(chat_id)
+            position = 0
+            while root is not None and position < len(tokens):
+                node, match, length = root, None, 0
+                for offset, token in enumerate(tokens[position:]):
+                    node = node["next"].get(token)
+                    if node is None:
+                        break
+                    if node["category"] or node["payment_method"]:
+                        match, length = node, offset + 1
+                if match is None:
+                    position += 1
+                    continue
+                for field in self.FIELDS:
+                    dominant = self._dominant(match[field])
+                    if dominant is not None:
+                        votes[field][dominant[0]] = votes[field].get(dominant[0], 0) + length
+                position += length
+
+        result = {}
+        for field, labels in votes.items():
+            if len(labels) == 1:
+                result[field] = next(iter(labels))
+        if result:
+            self._hits += 1
+        else:
+            self._misses += 1
+        return result
+
+    # Persistensi
+
+    def get_db(self) -> Optional[sqlite3.Connection]:
+        """Membuka database indeks saat pertama kali dibutuhkan"""
+        if not self.db_path:
+            return None
+        if self._db is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS chat_category_index ("
+                "chat_id INTEGER NOT NULL, phrase TEXT NOT NULL, field TEXT NOT NULL, "
+                "label TEXT NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (chat_id, phrase, field, label))"
+            )
+            self._db.commit()
+        return self._db
+
+    def load(self):
+        """Memuat indeks dari SQLite (sekali, dipanggil di thread pool saat startup)"""
+        if self._loaded or not settings.category_index_enabled:
+            return
+        with self._db_lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            try:
+                db = self.get_db()
+                rows = db.execute(
+                    "SELECT chat_id, phrase, field, label, count FROM chat_category_index"
+                ).fetchall() if db else []
+            except Exception as e:
+                print(f"⚠️ Error membaca indeks kategori: {e}")
+                rows = []
+        with self._lock:
+            for chat_id, phrase, field, label, count in rows:
+                self._add(chat_id, tuple(phrase.split(" ")), field, label, count)
+
+    def learn_many(self, entries: Iterable[Tuple[int, Dict[str, Any]]]):
+        """
+        Menambahkan transaksi tersimpan (chat_id, financial_data) ke indeks
+        dalam satu transaksi SQLite. Blocking: panggil lewat thread pool.
+        """
+        if not settings.category_index_enabled:
+            return
+        self.load()
+
+        updates: Dict[Tuple[int, Tuple[str, ...], str, str], int] = {}
+        for chat_id, financial_data in entries:
+            labels = self._labels_for(financial_data)
+            if not labels:
+                continue
+            for phrase in self.phrases_for(financial_data):
+                for field, label in labels.items():
+                    key = (chat_id, phrase, field, label)
+                    updates[key] = updates.get(key, 0) + 1
+        if not updates:
+            return
+
+        with self._lock:
+            for (chat_id, phrase, field, label), count in updates.items():
+                self._add(chat_id, phrase, field, label, count)
+            self._learned += len(updates)
+
+        # Commit di luar `_lock` agar lookup di event loop tidak ikut menunggu disk
+        with self._db_lock:
+            try:
+                db = self.get_db()
+                if db is not None:
+                    with db:
+                        db.executemany(
+                            "INSERT INTO chat_category_index (chat_id, phrase, field, label, count) "
+                            "VALUES (?, ?, ?, ?, ?) ON CONFLICT(chat_id, phrase, field, label) "
+                            "DO UPDATE SET count = count + excluded.count",
+                            [(chat_id, " ".join(phrase), field, label, count)
+                             for (chat_id, phrase, field, label), count in updates.items()]
+                        )
+            except Exception as e:
+                print(f"⚠️ Error menulis indeks kategori: {e}")
+
+    # Pemakaian
+
+    def apply(self, chat_id: int, financial_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validasi hasil ekstraksi LLM dengan indeks chat (teks pesan dan nama item).
+
+        Field yang kosong atau "other" diisi dari indeks dan ditandai sebagai
+        isian (tidak dipelajari ulang); perbedaan dengan label yang sudah diisi
+        LLM hanya dicatat di metrics karena LLM melihat konteks lengkap pesan.
+        """
+        if "error" in financial_data:
+            return financial_data
+        names = [item.get("name") or "" for item in financial_data.get("items") or [] if isinstance(item, dict)]
+        learned = self.lookup(chat_id, "\n".join([financial_data.get("prompt_text") or ""] + names))
+        for field, label in learned.items():
+            current = str(financial_data.get(field) or "").strip().lower()
+            if current in self.UNKNOWN_LABELS:
+                financial_data[field] = label
+                financial_data.setdefault(INFERRED_FIELDS, []).append(field)
+                metrics.inc("category_index_total", field=field, outcome="filled")
+            elif current == label:
+                metrics.inc("category_index_total", field=field, outcome="agree")
+            else:
+                metrics.inc("category_index_total", field=field, outcome="disagree")
+        return financial_data
+
+    def close(self):
+        """Menutup koneksi database indeks"""
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistik indeks untuk monitoring"""
+        lookups = self._hits + self._misses
+        return {
+            "enabled": settings.category_index_enabled,
+            "backend": "memory+sqlite" if self.db_path else "memory",
+            "chats": len(self._roots),
+            "phrases": self._phrases,
+            "learned": self._learned,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0
+        }
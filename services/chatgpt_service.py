@@ -1,10 +1,13 @@
-import json
+import asyncio
 import base64
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 import pytz
 import openai
 from config import settings
+from .rate_limiter_service import rate_limiter
+from .prompt_service import prompts
+from .structured_output_service import structured_output
 
 class ChatGPTService:
     """
@@ -14,8 +17,15 @@ class ChatGPTService:
     Note: GPT-5 belum tersedia secara publik dari OpenAI (September 2025)
     """
     
+    provider_name = "chatgpt"
+    
     def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            timeout=settings.llm_timeout,
+            # Retry 429 hanya di satu tempat (loop rate limit di bawah), bukan juga di SDK
+            max_retries=0
+        )
         self.model_name = "gpt-4o"  # Model terbaru yang available
     
     def get_current_timestamp(self) -> str:
@@ -28,131 +38,150 @@ class ChatGPTService:
         """Mengconvert image data ke base64 untuk OpenAI"""
         return base64.b64encode(image_data).decode('utf-8')
     
-    def create_prompt(self) -> str:
-        """Membuat prompt untuk ChatGPT"""
-        return """
-Saya akan memberikan Anda teks atau gambar yang berkaitan dengan transaksi keuangan. 
-Tolong analisis dan ekstrak informasi berikut dalam format JSON yang VALID:
-
-{
-  "prompt_text": "teks yang diberikan atau deskripsi gambar",
-  "category": "kategori transaksi (entertainment, transfer, billings, food, shopping, transport, dll)",
-  "amount": "total jumlah uang (angka saja, tanpa mata uang)",
-  "payment_method": "metode pembayaran (cash, dana, gopay, shopeepay, ovo, bca, bni, dll)",
-  "type": "jenis transaksi (income/expense/transfer)",
-  "summary": "ringkasan singkat transaksi",
-  "items": [
-    {
-      "name": "nama item",
-      "quantity": "jumlah item (angka)",
-      "price": "harga per item (angka)"
-    }
-  ]
-}
-
-Aturan penting:
-1. Berikan HANYA JSON yang valid, tanpa penjelasan tambahan
-2. Untuk amount, gunakan angka saja (contoh: 50000, bukan "Rp 50.000")
-3. Jika tidak ada informasi spesifik, gunakan nilai default yang masuk akal
-4. Items hanya diisi jika ada daftar pembelian yang jelas (seperti struk belanja)
-5. Category harus spesifik (contoh: food, transport, entertainment, shopping, transfer, billings)
-6. Type: "expense" untuk pengeluaran, "income" untuk pemasukan, "transfer" untuk transfer antar akun
-
-Analisis data berikut:
-"""
+    def build_messages(self, content: Any) -> List[Dict[str, Any]]:
+        """Instruksi statis sebagai system message (prefix yang bisa di-cache), konten pengguna di akhir"""
+        return [
+            {"role": "system", "content": prompts.system_prompt()},
+            {"role": "user", "content": content}
+        ]
+    
+    def estimate_tokens(self, messages: List[Dict[str, Any]], max_tokens: int) -> int:
+        """Perkiraan kasar token untuk bucket TPM (±4 karakter per token, gambar ±800 token)"""
+        total = max_tokens
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, str):
+                total += len(content) // 4
+                continue
+            for part in content:
+                total += len(part.get("text", "")) // 4 if part["type"] == "text" else 800
+        return total
+    
+    async def create_completion(self, messages: List[Dict[str, Any]], max_tokens: int,
+                                response_format: Optional[Dict[str, Any]] = None):
+        """
+        Memanggil chat completions melalui rate limiter.
+        
+        Header `x-ratelimit-*` dari setiap response dipakai untuk menyesuaikan
+        bucket, dan 429 diantrikan ulang sesuai `retry-after`.
+        """
+        estimated_tokens = self.estimate_tokens(messages, max_tokens)
+        options = {"response_format": response_format} if response_format else {}
+        for attempt in range(settings.rate_limit_max_retries + 1):
+            try:
+                async with rate_limiter.limit("openai", tokens=estimated_tokens):
+                    raw_response = await self.client.chat.completions.with_raw_response.create(
+                        model=self.model_name,  # GPT-4o (model terbaru, GPT-5 belum tersedia)
+                        messages=messages,
+                        temperature=0.1,  # Low temperature for consistent financial data extraction
+                        max_tokens=max_tokens,
+                        top_p=0.9,       # Slightly focused responses
+                        frequency_penalty=0.0,
+                        presence_penalty=0.0,
+                        **options
+                    )
+                rate_limiter.update_from_headers("openai", raw_response.headers)
+                response = raw_response.parse()
+                if response.usage is not None:
+                    details = getattr(response.usage, "prompt_tokens_details", None)
+                    prompts.record_usage(
+                        self.provider_name, response.usage.prompt_tokens, response.usage.completion_tokens,
+                        cached_tokens=getattr(details, "cached_tokens", None)
+                    )
+                return response
+            except openai.RateLimitError as e:
+                # Kuota habis tidak akan pulih dengan menunggu
+                if attempt == settings.rate_limit_max_retries or getattr(e, "code", None) == "insufficient_quota":
+                    raise
+                retry_after = rate_limiter.parse_duration(e.response.headers.get("retry-after"))
+                rate_limiter.penalize("openai", retry_after)
+    
+    def response_format(self, batch: bool = False) -> Optional[Dict[str, Any]]:
+        """JSON schema structured output (None jika dinonaktifkan)"""
+        return structured_output.openai_response_format(batch) if settings.structured_output_enabled else None
     
-    async def process_financial_data(self, text_content: str = None, image_data: bytes = None) -> Dict[str, Any]:
+    def response_text(self, response) -> str:
+        """Isi response; penolakan model dilaporkan sebagai error, bukan JSON rusak"""
+        message = response.choices[0].message
+        if getattr(message, "refusal", None):
+            raise RuntimeError(f"ChatGPT menolak permintaan: {message.refusal}")
+        return (message.content or "").strip()
+    
+    async def reask(self, prompt: str) -> str:
+        """Meminta ChatGPT memperbaiki response JSON sebelumnya"""
+        response = await self.create_completion(
+            self.build_messages(prompt), max_tokens=1500, response_format=self.response_format()
+        )
+        return self.response_text(response)
+    
+    async def process_financial_data(self, text_content: str = None, image_data: bytes = None,
+                                     mime_type: str = "image/jpeg") -> Dict[str, Any]:
         """Memproses teks atau gambar dengan ChatGPT"""
+        response_text = ""
         try:
-            prompt = self.create_prompt()
-            messages = []
-            
-            if image_data and text_content:
-                # Jika ada gambar dan teks
-                image_base64 = self.encode_image_to_base64(image_data)
-                prompt += f"\n\nTeks: {text_content}\nGambar: [Gambar terlampir]"
-                
-                messages = [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
-                                }
-                            }
-                        ]
-                    }
-                ]
-                
-            elif image_data:
-                # Hanya gambar
+            if image_data:
+                # Gambar (dengan caption jika ada)
                 image_base64 = self.encode_image_to_base64(image_data)
-                prompt += "\n\nGambar: [Gambar terlampir]"
-                
-                messages = [
+                messages = self.build_messages([
+                    {"type": "text", "text": prompts.image_prompt(text_content)},
                     {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
-                                }
-                            }
-                        ]
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:{mime_type};base64,{image_base64}"
+                        }
                     }
-                ]
+                ])
                 
             elif text_content:
                 # Hanya teks
-                prompt += f"\n\nTeks: {text_content}"
-                messages = [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
+                messages = self.build_messages(prompts.text_prompt(text_content))
                 
             else:
                 return {"error": "Tidak ada teks atau gambar yang diberikan"}
             
-            # Panggil OpenAI API dengan model terbaru
-            response = self.client.chat.completions.create(
-                model=self.model_name,  # GPT-4o (model terbaru, GPT-5 belum tersedia)
-                messages=messages,
-                temperature=0.1,  # Low temperature for consistent financial data extraction
+            # Panggil OpenAI API dengan model terbaru (async, tidak memblokir event loop)
+            response = await self.create_completion(
+                messages,
                 max_tokens=1500,  # Increased for detailed transaction analysis
-                top_p=0.9,       # Slightly focused responses
-                frequency_penalty=0.0,
-                presence_penalty=0.0
+                response_format=self.response_format()
             )
             
-            # Parse response JSON
-            response_text = response.choices[0].message.content.strip()
-            
-            # Membersihkan response jika ada markdown formatting
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-            
-            # Parse JSON
-            financial_data = json.loads(response_text)
+            # Validasi dengan schema; angka string dikonversi, JSON rusak diperbaiki dulu
+            response_text = self.response_text(response)
             
             # Timestamp akan ditambahkan di level service yang lebih tinggi
             # berdasarkan waktu pesan dari user
+            return await structured_output.parse_or_reask(self.provider_name, response_text, self.reask)
             
-            return financial_data
-            
-        except json.JSONDecodeError as e:
+        except (asyncio.TimeoutError, openai.APITimeoutError):
+            print(f"ChatGPT timeout setelah {settings.llm_timeout} detik")
+            return {"error": f"ChatGPT tidak merespons dalam {settings.llm_timeout:.0f} detik"}
+        except ValueError as e:
             print(f"JSON decode error: {e}")
             print(f"Response text: {response_text}")
-            return {"error": f"Invalid JSON response from ChatGPT: {str(e)}"}
+            return {"error": str(e)}
         except Exception as e:
             print(f"Error processing with ChatGPT: {e}")
             return {"error": str(e)}
+    
+    async def process_financial_data_batch(self, texts: List[str]) -> Optional[List[Any]]:
+        """
+        Memproses beberapa teks dalam satu request ChatGPT.
+        
+        Mengembalikan JSON array hasil parse, atau None jika response tidak valid
+        sehingga pemanggil bisa fallback ke request satu per satu.
+        """
+        response_text = ""
+        try:
+            response = await self.create_completion(
+                self.build_messages(prompts.batch_prompt(texts)),
+                max_tokens=min(1500 + 500 * len(texts), 8000),
+                response_format=self.response_format(batch=True)
+            )
+            
+            response_text = self.response_text(response)
+            return structured_output.parse_batch(self.provider_name, response_text)
+            
+        except Exception as e:
+            print(f"Error processing batch with ChatGPT: {e}")
+            return None
@@ -0,0 +1,128 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+from config import settings
+
+PendingRequest = Tuple[str, asyncio.Future]
+
+class ExtractionBatcherService:
+    """
+    Service micro-batching untuk ekstraksi teks.
+
+    Request teks dikumpulkan per provider selama `llm_batch_window` detik
+    (atau sampai `llm_batch_max_size`), lalu dikirim sebagai satu prompt yang
+    meminta JSON array. Hasil dipetakan kembali ke setiap pesan; jika parsing
+    gagal, teks yang bermasalah diproses satu per satu seperti biasa.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, List[PendingRequest]] = {}
+        self._timers: Dict[str, asyncio.Task] = {}
+        self._running: Set[asyncio.Task] = set()
+        self._batches = 0
+        self._batched_requests = 0
+        self._single_requests = 0
+        self._fallbacks = 0
+
+    async def extract(self, ai_service, text_content: str) -> Dict[str, Any]:
+        """Ekstraksi teks, digabung dengan request lain jika batching aktif"""
+        if not settings.llm_batching_enabled or not hasattr(ai_service, "process_financial_data_batch"):
+            return await ai_service.process_financial_data(text_content=text_content)
+
+        provider = ai_service.provider_name
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending.setdefault(provider, [])
+        pending.append((text_content, future))
+
+        if len(pending) >= settings.llm_batch_max_size:
+            self._dispatch(provider, ai_service)
+        elif provider not in self._timers:
+            self._timers[provider] = asyncio.create_task(self._dispatch_after_window(provider, ai_service))
+
+        return await future
+
+    async def _dispatch_after_window(self, provider: str, ai_service):
+        await asyncio.sleep(settings.llm_batch_window)
+        self._timers.pop(provider, None)
+        self._dispatch(provider, ai_service)
+
+    def _dispatch(self, provider: str, ai_service):
+        """Kirim semua request yang terkumpul untuk provider ini"""
+        timer = self._timers.pop(provider, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._pending.pop(provider, [])
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._run_batch(ai_service, batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    def map_results(self, results: Optional[List[Any]], count: int) -> List[Optional[Dict[str, Any]]]:
+        """
+        Memetakan JSON array dari LLM ke urutan request.
+
+        Memakai field "index" jika ada, jika tidak memakai urutan array.
+        Posisi yang tidak punya hasil valid bernilai None.
+        """
+        mapped: List[Optional[Dict[str, Any]]] = [None] * count
+        if not results:
+            return mapped
+
+        indexed = all(isinstance(item, dict) and isinstance(item.get("index"), int) for item in results)
+        if not indexed and len(results) != count:
+            return mapped
+
+        for position, item in enumerate(results):
+            if not isinstance(item, dict):
+                continue
+            index = item.pop("index", None) if indexed else position + 1
+            if not isinstance(index, int) or not 1 <= index <= count:
+                continue
+            if "error" not in item and "amount" in item:
+                mapped[index - 1] = item
+        return mapped
+
+    async def _run_batch(self, ai_service, batch: List[PendingRequest]):
+        texts = [text for text, _ in batch]
+        try:
+            if len(batch) == 1:
+                self._single_requests += 1
+                results = [await ai_service.process_financial_data(text_content=texts[0])]
+            else:
+                self._batches += 1
+                self._batched_requests += len(batch)
+                results = self.map_results(await ai_service.process_financial_data_batch(texts), len(texts))
+
+                # Fallback satu per satu untuk teks yang tidak mendapat hasil valid
+                missing = [index for index, result in enumerate(results) if result is None]
+                if missing:
+                    self._fallbacks += len(missing)
+                    print(f"⚠️ Batch {ai_service.provider_name}: {len(missing)}/{len(texts)} hasil tidak valid, fallback satu per satu")
+                    retried = await asyncio.gather(*[
+                        ai_service.process_financial_data(text_content=texts[index])
+                        for index in missing
+                    ])
+                    for index, result in zip(missing, retried):
+                        results[index] = result
+        except Exception as e:
+            print(f"Error processing batch: {e}")
+            results = [{"error": str(e)} for _ in batch]
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistik batching untuk monitoring"""
+        return {
+            "enabled": settings.llm_batching_enabled,
+            "window_seconds": settings.llm_batch_window,
+            "max_size": settings.llm_batch_max_size,
+            "batches": self._batches,
+            "batched_requests": self._batched_requests,
+            "single_requests": self._single_requests,
+            "fallbacks": self._fallbacks,
+            "avg_batch_size": round(self._batched_requests / self._batches, 2) if self._batches else 0.0
+        }
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from config import settings
+from .thread_pool_service import thread_pool
+
+class ExtractionCacheService:
+    """
+    Service cache hasil ekstraksi AI berdasarkan isi pesan.
+
+    Key dibentuk dari teks yang dinormalisasi (atau `file_unique_id` / hash
+    gambar) ditambah provider dan versi prompt. Cache di memori memakai
+    LRU + TTL, dengan backend SQLite opsional agar tetap hangat setelah restart.
+    Akses SQLite berjalan di thread pool, dan `last_access` untuk hit dari disk
+    dicatat di memori lalu ditulis berkelompok, bukan satu commit per hit.
+    """
+
+    # Jumlah last_access yang ditampung sebelum ditulis ke SQLite
+    ACCESS_BATCH_SIZE = 100
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None,
+                 db_path: Optional[str] = None):
+        self.max_size = max_size or settings.extraction_cache_max_size
+        self.ttl = ttl or settings.extraction_cache_ttl
+        self.db_path = db_path if db_path is not None else settings.extraction_cache_path
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._accessed: Dict[str, float] = {}  # key -> last_access yang belum ditulis
+        self._hits_memory = 0
+        self._hits_disk = 0
+        self._misses = 0
+        self._writes = 0
+
+    # Key
+
+    def normalize_text(self, text: str) -> str:
+        """Normalisasi teks agar variasi spasi/kapitalisasi menghasilkan key yang sama"""
+        return re.sub(r"\s+", " ", text or "").strip().lower()
+
+    def _make_key(self, *parts: str) -> str:
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def text_key(self, provider: str, prompt_version: str, text: str) -> str:
+        """Key untuk pesan teks"""
+        return self._make_key("text", provider, prompt_version, self.normalize_text(text))
+
+    def image_key(self, provider: str, prompt_version: str, file_unique_id: Optional[str] = None,
+                  image_data: Optional[bytes] = None, caption: Optional[str] = None) -> Optional[str]:
+        """Key untuk gambar: file_unique_id dari Telegram, atau hash isi gambar"""
+        if file_unique_id:
+            image_ref = f"tg:{file_unique_id}"
+        elif image_data:
+            image_ref = f"sha256:{hashlib.sha256(image_data).hexdigest()}"
+        else:
+            return None
+        return self._make_key("image", provider, prompt_version, image_ref, self.normalize_text(caption))
+
+    # Backend SQLite
+
+    def get_db(self) -> Optional[sqlite3.Connection]:
+        """Membuka database cache saat pertama kali dibutuhkan"""
+        if not self.db_path:
+            return None
+        if self._db is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_access "
+                "ON extraction_cache (last_access)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        db = self.get_db()
+        if db is None:
+            return None
+        with self._db_lock:
+            row = db.execute(
+                "SELECT value, expires_at FROM extraction_cache WHERE key = ?", (key,)
+            ).fetchone()
+            # Entry kedaluwarsa dihapus oleh pembersihan berkala di _disk_set
+            if row is None or row[1] <= now:
+                return None
+            self._accessed[key] = now
+            if len(self._accessed) >= self.ACCESS_BATCH_SIZE:
+                self._flush_access(db)
+                db.commit()
+        return row[0], row[1]
+
+    def _flush_access(self, db: sqlite3.Connection):
+        """Tulis last_access yang tertampung (dipanggil dengan _db_lock, commit oleh pemanggil)"""
+        if not self._accessed:
+            return
+        db.executemany(
+            "UPDATE extraction_cache SET last_access = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self._accessed.items()]
+        )
+        self._accessed.clear()
+
+    def _disk_set(self, key: str, value: str, expires_at: float, now: float):
+        db = self.get_db()
+        if db is None:
+            return
+        with self._db_lock:
+            db.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, value, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now)
+            )
+            self._flush_access(db)
+            # Bersihkan entry kedaluwarsa dan yang paling jarang dipakai secara berkala
+            if self._writes % 100 == 0:
+                db.execute("DELETE FROM extraction_cache WHERE expires_at <= ?", (now,))
+                db.execute(
+                    "DELETE FROM extraction_cache WHERE key IN ("
+                    "SELECT key FROM extraction_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (settings.extraction_cache_disk_max_size,)
+                )
+            db.commit()
+
+    # API
+
+    async def get(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Mengambil hasil ekstraksi dari cache (salinan baru setiap pemanggilan)"""
+        if not key or not settings.extraction_cache_enabled:
+            return None
+
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self._memory.move_to_end(key)
+                self._hits_memory += 1
+                return json.loads(entry[0])
+            del self._memory[key]
+
+        try:
+            entry = await thread_pool.run(self._disk_get, key, now) if self.db_path else None
+        except Exception as e:
+            print(f"⚠️ Error membaca extraction cache: {e}")
+            entry = None
+
+        if entry is not None:
+            self._remember(key, entry[0], entry[1])
+            self._hits_disk += 1
+            return json.loads(entry[0])
+
+        self._misses += 1
+        return None
+
+    async def set(self, key: Optional[str], financial_data: Dict[str, Any]):
+        """Menyimpan hasil ekstraksi yang valid ke cache"""
+        if not key or not settings.extraction_cache_enabled or "error" in financial_data:
+            return
+
+        now = time.time()
+        value = json.dumps(
+            {k: v for k, v in financial_data.items() if k != "timestamp"},
+            ensure_ascii=False
+        )
+        expires_at = now + self.ttl
+        self._remember(key, value, expires_at)
+        self._writes += 1
+
+        if not self.db_path:
+            return
+        try:
+            await thread_pool.run(self._disk_set, key, value, expires_at, now)
+        except Exception as e:
+            print(f"⚠️ Error menulis extraction cache: {e}")
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def close(self):
+        """Menulis last_access yang tertampung lalu menutup koneksi database cache"""
+        with self._db_lock:
+            if self._db is not None:
+                try:
+                    self._flush_access(self._db)
+                    self._db.commit()
+                except Exception as e:
+                    print(f"⚠️ Error menulis extraction cache: {e}")
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistik hit/miss cache untuk monitoring"""
+        hits = self._hits_memory + self._hits_disk
+        lookups = hits + self._misses
+        return {
+            "enabled": settings.extraction_cache_enabled,
+            "backend": "memory+sqlite" if self.db_path else "memory",
+            "size": len(self._memory),
+            "max_size": self.max_size,
+            "hits": hits,
+            "hits_memory": self._hits_memory,
+            "hits_disk": self._hits_disk,
+            "misses": self._misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "writes": self._writes
+        }
@@ -0,0 +1,271 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from config import settings
+from schemas.models import AMOUNT_MULTIPLIERS
+
+# Field financial_data yang diisi dari default atau indeks kategori, bukan dari
+# pengguna/LLM. Field ini tidak dipelajari ulang oleh indeks kategori.
+INFERRED_FIELDS = "_inferred"
+
+class FastPathParserService:
+    """
+    Parser lokal untuk transaksi teks sederhana seperti "makan siang 25rb gopay".
+
+    Mengenali nominal dengan akhiran rb/k/jt, kata kunci metode pembayaran dan
+    kategori, lalu memberi skor keyakinan. Merchant/item yang tidak ada di
+    daftar kata kunci dicari di indeks kategori hasil transaksi sebelumnya.
+    Pesan yang ambigu dikembalikan ke AI provider seperti biasa.
+    """
+
+    AMOUNT_PATTERN = re.compile(
+        r"(?<![\w.,])(?:rp\.?\s?)?(\d+(?:[.,]\d+)*)\s?(rb|ribu|k|jt|juta)?(?![\w.,])"
+    )
+
+    MULTIPLIERS = AMOUNT_MULTIPLIERS
+
+    # Kata kunci -> metode pembayaran (urutan menentukan prioritas)
+    PAYMENT_KEYWORDS: List[Tuple[str, List[str]]] = [
+        ("gopay", ["gopay", "go-pay"]),
+        ("ovo", ["ovo"]),
+        ("dana", ["dana"]),
+        ("shopeepay", ["shopeepay", "spay"]),
+        ("linkaja", ["linkaja"]),
+        ("qris", ["qris"]),
+        ("bca", ["bca"]),
+        ("bni", ["bni"]),
+        ("bri", ["bri"]),
+        ("mandiri", ["mandiri"]),
+        ("jago", ["jago"]),
+        ("seabank", ["seabank"]),
+        ("credit card", ["kartu kredit", "cc", "kredit"]),
+        ("debit", ["debit", "kartu debit"]),
+        ("cash", ["cash", "tunai", "kes"])
+    ]
+
+    # Kata kunci -> kategori
+    CATEGORY_KEYWORDS: List[Tuple[str, List[str]]] = [
+        ("food", [
+            "makan", "minum", "sarapan", "makan siang", "makan malam", "lunch", "dinner",
+            "kopi", "nasi", "bakso", "mie", "soto", "ayam", "jajan", "snack", "cemilan",
+            "gofood", "grabfood", "shopeefood", "warteg", "resto", "restoran", "teh", "roti"
+        ]),
+        ("transport", [
+            "bensin", "pertalite", "pertamax", "parkir", "tol", "ojek", "ojol", "gojek",
+            "goride", "grabbike", "grabcar", "gocar", "taksi", "taxi", "krl", "mrt",
+            "lrt", "busway", "transjakarta", "kereta", "angkot", "bus"
+        ]),
+        ("billings", [
+            "listrik", "pln", "token listrik", "pulsa", "kuota", "paket data", "internet",
+            "wifi", "indihome", "pdam", "bpjs", "tagihan", "cicilan", "sewa", "kos", "kost",
+            "asuransi", "langganan"
+        ]),
+        ("shopping", [
+            "belanja", "baju", "celana", "sepatu", "tas", "shopee", "tokopedia", "lazada",
+            "indomaret", "alfamart", "supermarket", "sabun", "sampo", "skincare"
+        ]),
+        ("entertainment", [
+            "nonton", "bioskop", "netflix", "spotify", "youtube premium", "game", "karaoke",
+            "konser", "liburan", "hiburan"
+        ]),
+        ("health", ["obat", "apotek", "dokter", "klinik", "rumah sakit", "vitamin"]),
+        ("education", ["buku", "kursus", "les", "spp", "kuliah", "sekolah"]),
+        ("salary", ["gaji", "gajian", "thr", "bonus"]),
+        ("transfer", ["transfer", "tf", "top up", "topup", "tarik tunai"])
+    ]
+
+    INCOME_KEYWORDS = [
+        "gaji", "gajian", "thr", "bonus", "pemasukan", "terima", "diterima", "dapat",
+        "masuk", "jual", "refund", "cashback", "dividen", "bunga", "komisi", "freelance"
+    ]
+    TRANSFER_KEYWORDS = ["transfer", "tf", "top up", "topup", "tarik tunai", "kirim ke"]
+
+    # Kategori yang wajar untuk pemasukan; kategori lain + kata pemasukan dianggap konflik
+    INCOME_CATEGORIES = {"salary", "transfer", "other"}
+
+    # Pesan dengan negasi/pembatalan selalu diserahkan ke LLM
+    NEGATION_KEYWORDS = [
+        "tidak", "tdk", "gak", "ga", "nggak", "ngga", "enggak", "engga", "gk", "batal",
+        "cancel", "belum", "bukan"
+    ]
+
+    # Kata penghubung yang dibuang dari ringkasan
+    FILLER_WORDS = ["pakai", "pake", "pakek", "via", "dengan", "dgn", "bayar", "pembayaran"]
+
+    TYPE_LABELS = {
+        "expense": "Pengeluaran",
+        "income": "Pemasukan",
+        "transfer": "Transfer"
+    }
+
+    def __init__(self, index=None):
+        self.index = index  # CategoryIndexService (opsional)
+        self._hits = 0
+        self._fallbacks = 0
+
+    def _contains(self, text: str, keyword: str) -> bool:
+        return re.search(rf"(?<!\w){re.escape(keyword)}(?!\w)", text) is not None
+
+    def _remove(self, text: str, keyword: str) -> str:
+        return re.sub(rf"(?<!\w){re.escape(keyword)}(?!\w)", " ", text)
+
+    def parse_amount(self, number: str, suffix: Optional[str]) -> Optional[float]:
+        """Mengubah "25rb", "2,5jt" atau "50.000" menjadi angka"""
+        if suffix:
+            # "2,5jt" / "1.5jt": satu pemisah diikuti 1-2 digit dianggap desimal
+            decimal = re.fullmatch(r"(\d+)[.,](\d{1,2})", number)
+            if decimal:
+                value = float(f"{decimal.group(1)}.{decimal.group(2)}")
+            else:
+                value = float(re.sub(r"[.,]", "", number))
+            return value * self.MULTIPLIERS[suffix]
+
+        if re.fullmatch(r"\d+", number):
+            value = float(number)
+        elif re.fullmatch(r"\d{1,3}(?:[.,]\d{3})+", number):
+            value = float(re.sub(r"[.,]", "", number))
+        else:
+            return None
+
+        # Nominal tanpa akhiran yang terlalu kecil kemungkinan bukan rupiah
+        if value < 100:
+            return None
+        return value
+
+    def match_keywords(self, text: str, table: List[Tuple[str, List[str]]]) -> List[str]:
+        """Semua label yang kata kuncinya muncul di teks (tanpa duplikat)"""
+        labels = []
+        for label, keywords in table:
+            if any(self._contains(text, keyword) for keyword in keywords) and label not in labels:
+                labels.append(label)
+        return labels
+
+    def parse(self, text: str, chat_id: Optional[int] = None) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        Parse teks transaksi sederhana.
+
+        Mengembalikan (financial_data, confidence). financial_data bernilai None
+        jika teks tidak bisa diparse dengan aman. `chat_id` memilih indeks
+        kategori milik chat tersebut.
+        """
+        if not text or text.startswith("/") or "\n" in text.strip():
+            return None, 0.0
+
+        normalized = re.sub(r"\s+", " ", text).strip().lower()
+        words = normalized.split(" ")
+        if len(words) > settings.fast_path_max_words:
+            return None, 0.0
+
+        # Harus ada tepat satu nominal dan tidak ada angka lain (qty, tanggal, dll)
+        amounts = list(self.AMOUNT_PATTERN.finditer(normalized))
+        if len(amounts) != 1:
+            return None, 0.0
+        match = amounts[0]
+        amount = self.parse_amount(match.group(1), match.group(2))
+        if amount is None:
+            return None, 0.0
+
+        remainder = (normalized[:match.start()] + " " + normalized[match.end():]).strip()
+        if re.search(r"\d", remainder):
+            return None, 0.0
+
+        # "gak jadi beli kopi 25rb", "batal bayar parkir 5rb": bukan transaksi sederhana
+        if any(self._contains(remainder, keyword) for keyword in self.NEGATION_KEYWORDS):
+            return None, 0.0
+
+        confidence = 0.4
+        inferred = []
+
+        categories = self.match_keywords(remainder, self.CATEGORY_KEYWORDS)
+        payments = self.match_keywords(remainder, self.PAYMENT_KEYWORDS)
+        learned = self.index.lookup(chat_id, remainder) if self.index is not None else {}
+        learned_category = learned.get("category")
+
+        if len(categories) == 1:
+            category = categories[0]
+            confidence += 0.3
+        elif learned_category and (not categories or learned_category in categories):
+            # Merchant/item yang sudah dikenal dari transaksi sebelumnya
+            category = learned_category
+            inferred.append("category")
+            confidence += 0.3
+        elif categories:
+            category = categories[0]
+            confidence += 0.1
+        else:
+            category = "other"
+
+        if len(payments) == 1:
+            payment_method = payments[0]
+            confidence += 0.2
+        elif payments:
+            payment_method = payments[0]
+        elif "payment_method" in learned:
+            payment_method = learned["payment_method"]
+            inferred.append("payment_method")
+            confidence += 0.1
+        else:
+            # Metode pembayaran default tidak boleh cukup untuk melewati ambang keyakinan
+            payment_method = "cash"
+            inferred.append("payment_method")
+            confidence -= 0.1
+
+        if len(words) <= 6:
+            confidence += 0.1
+
+        if any(self._contains(remainder, keyword) for keyword in self.TRANSFER_KEYWORDS):
+            transaction_type = "transfer"
+        elif any(self._contains(remainder, keyword) for keyword in self.INCOME_KEYWORDS):
+            transaction_type = "income"
+        else:
+            transaction_type = "expense"
+
+        # "jual baju 100rb": kata pemasukan dengan kategori pengeluaran, biar LLM yang memutuskan
+        if transaction_type == "income" and category not in self.INCOME_CATEGORIES:
+            confidence -= 0.3
+
+        # Ringkasan dari sisa teks tanpa metode pembayaran dan kata penghubung
+        description = remainder
+        for _, keywords in self.PAYMENT_KEYWORDS:
+            for keyword in keywords:
+                description = self._remove(description, keyword)
+        for word in self.FILLER_WORDS:
+            description = self._remove(description, word)
+        description = re.sub(r"\s+", " ", description).strip() or category
+
+        summary = f"{self.TYPE_LABELS[transaction_type]} {description} via {payment_method}"
+
+        financial_data = {
+            "prompt_text": text.strip(),
+            "category": category,
+            "amount": int(amount) if float(amount).is_integer() else amount,
+            "payment_method": payment_method,
+            "type": transaction_type,
+            "summary": summary,
+            "items": [],
+            INFERRED_FIELDS: inferred
+        }
+        return financial_data, round(min(max(confidence, 0.0), 1.0), 2)
+
+    def try_parse(self, text: str, chat_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Hasil parse hanya jika keyakinannya di atas ambang `fast_path_min_confidence`"""
+        if not settings.fast_path_enabled:
+            return None
+
+        financial_data, confidence = self.parse(text, chat_id)
+        if financial_data is None or confidence < settings.fast_path_min_confidence:
+            self._fallbacks += 1
+            return None
+
+        self._hits += 1
+        return financial_data
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistik fast path untuk monitoring"""
+        total = self._hits + self._fallbacks
+        return {
+            "enabled": settings.fast_path_enabled,
+            "min_confidence": settings.fast_path_min_confidence,
+            "hits": self._hits,
+            "fallbacks": self._fallbacks,
+            "hit_ratio": round(self._hits / total, 4) if total else 0.0
+        }
@@ -1,22 +1,83 @@
-from typing import Dict, Any, Optional
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import time
 import pytz
-from .gemini_service import GeminiService
-from .chatgpt_service import ChatGPTService
-from .google_sheets_service import GoogleSheetsService
 from .telegram_service import TelegramService
 from .message_formatter_service import MessageFormatterService
+from .extraction_cache_service import ExtractionCacheService
+from .fast_path_parser_service import FastPathParserService
+from .category_index_service import CategoryIndexService
+from .media_group_service import MediaGroupService
+from .extraction_batcher_service import ExtractionBatcherService
+from .provider_router_service import ProviderRouterService
+from .ledger_service import LedgerService
+from .sheets_replicator_service import SheetsReplicatorService
+from .thread_pool_service import thread_pool
+from .metrics_service import metrics
+from .prompt_service import prompts
 from config import settings
 
 class FinanceBotService:
-    """Service utama yang menggabungkan semua service"""
+    """
+    Service utama yang menggabungkan semua service.
+    
+    Service yang membutuhkan SDK berat (OpenAI, Gemini, gspread, Pillow) dibuat
+    saat pertama kali dipakai, sehingga cold start hanya memuat yang ringan dan
+    setiap client hanya dibuat sekali.
+    """
     
     def __init__(self):
-        self.gemini = GeminiService()
-        self.chatgpt = ChatGPTService()
-        self.sheets = GoogleSheetsService()
+        self._gemini = None
+        self._chatgpt = None
+        self._sheets = None
+        self._images = None
         self.telegram = TelegramService()
         self.formatter = MessageFormatterService()
+        self.cache = ExtractionCacheService()
+        self.ledger = LedgerService()
+        self.category_index = CategoryIndexService()
+        self.fast_path = FastPathParserService(self.category_index)
+        self.batcher = ExtractionBatcherService()
+        self.router = ProviderRouterService({"chatgpt": lambda: self.chatgpt, "gemini": lambda: self.gemini})
+        self.replicator = SheetsReplicatorService(self.ledger, lambda: self.sheets)
+        self.albums = MediaGroupService(self.process_album)
+    
+    @property
+    def gemini(self):
+        """GeminiService (google.generativeai diimport saat pertama kali dipakai)"""
+        if self._gemini is None:
+            from .gemini_service import GeminiService
+            self._gemini = GeminiService()
+        return self._gemini
+    
+    @property
+    def chatgpt(self):
+        """ChatGPTService (openai diimport saat pertama kali dipakai)"""
+        if self._chatgpt is None:
+            from .chatgpt_service import ChatGPTService
+            self._chatgpt = ChatGPTService()
+        return self._chatgpt
+    
+    @property
+    def sheets(self):
+        """GoogleSheetsService (gspread diimport saat pertama kali dipakai)"""
+        if self._sheets is None:
+            from .google_sheets_service import GoogleSheetsService
+            self._sheets = GoogleSheetsService()
+        return self._sheets
+    
+    @property
+    def images(self):
+        """ImagePreprocessorService (Pillow diimport saat gambar pertama diterima)"""
+        if self._images is None:
+            from .image_preprocessor_service import ImagePreprocessorService
+            self._images = ImagePreprocessorService()
+        return self._images
+    
+    def is_loaded(self, name: str) -> bool:
+        """Apakah service berat sudah dibuat (untuk endpoint /health)"""
+        return getattr(self, f"_{name}") is not None
     
     def get_ai_service(self):
         """Mendapatkan AI service yang aktif berdasarkan konfigurasi"""
@@ -30,86 +91,384 @@ class FinanceBotService:
         jakarta_tz = pytz.timezone('Asia/Jakarta')
         dt = datetime.fromtimestamp(unix_timestamp, tz=jakarta_tz)
         return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+    async def process_update(self, update: Dict[str, Any]):
+        """Memproses satu update dari Telegram (webhook maupun antrian)"""
+        # Cek apakah ada pesan dalam update
+        if "message" not in update:
+            return
+
+        message = update["message"]
+        chat_id = message["chat"]["id"]
+        user_name = message["from"].get("first_name", "User")
+        message_timestamp = message.get("date", 0)  # Unix timestamp dari Telegram
+        started = time.perf_counter()
+        kind = "unsupported"
+        outcome = "success"
+
+        try:
+            # Menangani perintah bot (/summary, /report, ...)
+            if "text" in message and message["text"].startswith("/"):
+                kind = "command"
+                await self.process_command(chat_id, user_name, message["text"], message_timestamp)
+
+            # Menangani pesan teks
+            elif "text" in message:
+                kind = "text"
+                user_text = message["text"]
+                await self.process_text_message(chat_id, user_name, user_text, message_timestamp)
+
+            # Foto album dikumpulkan dulu, lalu diproses sekaligus oleh process_album
+            elif "photo" in message and message.get("media_group_id") and settings.album_enabled:
+                kind = "album_photo"
+                self.albums.add(message)
+
+            # Menangani pesan gambar
+            elif "photo" in message:
+                kind = "image"
+                photos = message["photo"]
+                selected_photo = self.images.select_photo(photos)
+                file_id = selected_photo["file_id"]
+                file_unique_id = selected_photo.get("file_unique_id")
+                caption = message.get("caption", "")
+
+                await self.process_image_message(
+                    chat_id, user_name, file_id, message_timestamp, caption, file_unique_id=file_unique_id
+                )
+
+            # Menangani jenis pesan lainnya
+            else:
+                await self.process_unsupported_message(chat_id, user_name)
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            metrics.observe("message_duration_seconds", time.perf_counter() - started, kind=kind, outcome=outcome)
+
+    def resolve_period(self, argument: str, message_timestamp: int) -> Optional[Tuple[str, str, str]]:
+        """
+        Menerjemahkan argumen periode perintah menjadi (period, bucket, label).
+        
+        Mendukung "hari"/"today", "kemarin"/"yesterday", "bulan"/"month",
+        "bulanlalu"/"lastmonth", "YYYY-MM" dan "YYYY-MM-DD". None jika tidak dikenal.
+        """
+        jakarta_tz = pytz.timezone('Asia/Jakarta')
+        now = datetime.fromtimestamp(message_timestamp, tz=jakarta_tz) if message_timestamp else datetime.now(jakarta_tz)
+        argument = argument.strip().lower().replace(" ", "")
+        
+        if argument in ("hari", "hariini", "today"):
+            return "day", now.strftime("%Y-%m-%d"), f"Hari ini ({now.strftime('%Y-%m-%d')})"
+        if argument in ("kemarin", "yesterday"):
+            day = now - timedelta(days=1)
+            return "day", day.strftime("%Y-%m-%d"), f"Kemarin ({day.strftime('%Y-%m-%d')})"
+        if argument in ("", "bulan", "bulanini", "month"):
+            return "month", now.strftime("%Y-%m"), f"Bulan ini ({now.strftime('%Y-%m')})"
+        if argument in ("bulanlalu", "lastmonth"):
+            month = now.replace(day=1) - timedelta(days=1)
+            return "month", month.strftime("%Y-%m"), f"Bulan lalu ({month.strftime('%Y-%m')})"
+        
+        for period, date_format in (("day", "%Y-%m-%d"), ("month", "%Y-%m")):
+            try:
+                datetime.strptime(argument, date_format)
+                return period, argument, argument
+            except ValueError:
+                continue
+        return None
     
-    async def process_text_message(self, chat_id: int, user_name: str, text_content: str, message_timestamp: int):
-        """Memproses pesan teks"""
-        # Kirim pesan sedang memproses
-        self.telegram.send_message(chat_id, self.formatter.format_processing_message())
+    async def process_command(self, chat_id: int, user_name: str, text: str, message_timestamp: int):
+        """Memproses perintah bot; ringkasan dibaca dari agregat ledger, bukan memindai transaksi"""
+        parts = text.strip().split(maxsplit=1)
+        # Di grup perintah bisa berbentuk /summary@nama_bot
+        command = parts[0].split("@")[0].lower()
+        argument = parts[1] if len(parts) > 1 else ""
         
-        # Proses dengan AI service yang aktif
-        ai_service = self.get_ai_service()
-        financial_data = await ai_service.process_financial_data(text_content=text_content)
+        if command not in ("/summary", "/report"):
+            await self.telegram.send_message(chat_id, self.formatter.format_command_help())
+            return
         
-        if "error" in financial_data:
-            # Kirim pesan error
-            error_msg = self.formatter.format_error_message(financial_data['error'])
-            self.telegram.send_message(chat_id, error_msg)
+        if not settings.ledger_enabled:
+            await self.telegram.send_message(chat_id, self.formatter.format_ledger_required_message())
+            return
+        
+        if command == "/summary" and not argument:
+            periods = [self.resolve_period("hari", message_timestamp), self.resolve_period("bulan", message_timestamp)]
         else:
-            # Tambahkan timestamp berdasarkan waktu pesan user
-            financial_data["timestamp"] = self.get_timestamp_from_unix(message_timestamp)
+            periods = [self.resolve_period(argument, message_timestamp)]
+        
+        if None in periods:
+            error_msg = self.formatter.format_error_message(f"Periode tidak dikenal: {argument}")
+            await self.telegram.send_message(chat_id, error_msg + "\n\n" + self.formatter.format_command_help())
+            return
+        
+        results = []
+        for period, bucket, label in periods:
+            aggregates = await thread_pool.run(self.ledger.get_aggregates, chat_id, period, bucket)
+            results.append((label, aggregates))
+        
+        if command == "/summary":
+            reply_text = self.formatter.format_summary(user_name, results)
+        else:
+            label, aggregates = results[0]
+            reply_text = self.formatter.format_report(user_name, label, aggregates)
+        await self.telegram.send_message(chat_id, reply_text)
+    
+    async def extract_text_data(self, ai_service, text_content: str) -> Dict[str, Any]:
+        """Ekstraksi teks dengan AI service, memakai cache jika teks yang sama sudah pernah dianalisis"""
+        cache_key = self.cache.text_key(ai_service.provider_name, prompts.version, text_content)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            metrics.inc("extractions_total", source="cache", kind="text")
+            return cached
+        
+        metrics.inc("extractions_total", source="llm", kind="text")
+        # Router memilih provider berdasarkan circuit breaker, failover dan hedging
+        provider, financial_data = await self.router.call_with_provider(
+            lambda service: self.batcher.extract(service, text_content)
+        )
+        # Simpan di bawah provider yang benar-benar menjawab (bisa provider cadangan)
+        await self.cache.set(self.cache.text_key(provider, prompts.version, text_content), financial_data)
+        return financial_data
+    
+    async def save_transaction(self, chat_id: int, financial_data: Dict[str, Any]) -> Optional[str]:
+        """
+        Menyimpan transaksi dan mengembalikan tujuan penyimpanannya.
+        
+        "ledger": tersimpan di ledger lokal, disalin ke Google Sheets di latar belakang.
+        "sheets": tersimpan langsung ke Google Sheets. None jika gagal.
+        """
+        return await self.save_transactions(chat_id, [financial_data])
+    
+    async def save_transactions(self, chat_id: int, transactions: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        Menyimpan beberapa transaksi sekaligus (satu transaksi ledger, atau satu
+        flush buffer Google Sheets). Transaksi yang tersimpan ikut dipelajari
+        indeks kategori.
+        """
+        with metrics.timer("save") as timing:
+            storage = None
+            if settings.ledger_enabled:
+                try:
+                    # Commit SQLite di thread pool agar tidak memblokir event loop
+                    await thread_pool.run(
+                        self.ledger.record_many, [(chat_id, financial_data) for financial_data in transactions]
+                    )
+                    self.replicator.notify()
+                    timing["provider"] = "ledger"
+                    storage = "ledger"
+                except Exception as e:
+                    print(f"❌ Error menyimpan ke ledger, fallback ke Google Sheets: {e}")
             
-            # Simpan ke Google Sheets
-            sheet_saved = self.sheets.save_financial_data(financial_data)
+            if storage is None:
+                timing["provider"] = "sheets"
+                saved = await asyncio.gather(*[
+                    self.sheets.save_financial_data_async(financial_data, chat_id)
+                    for financial_data in transactions
+                ])
+                if not all(saved):
+                    timing["outcome"] = "error"
+                    return None
+                storage = "sheets"
+        
+        # Indeks kategori ditulis ke SQLite di thread pool, bukan di event loop
+        await thread_pool.run(
+            self.category_index.learn_many, [(chat_id, financial_data) for financial_data in transactions]
+        )
+        return storage
+    
+    async def process_text_message(self, chat_id: int, user_name: str, text_content: str, message_timestamp: int):
+        """Memproses pesan teks"""
+        async with self.telegram.status(chat_id, self.formatter.format_processing_message()) as status:
+            # Transaksi sederhana langsung diparse lokal tanpa LLM
+            financial_data = self.fast_path.try_parse(text_content, chat_id)
             
-            # Format dan kirim pesan hasil analisis
-            analysis_msg = self.formatter.format_financial_analysis(
-                financial_data, user_name, sheet_saved, is_image=False
-            )
-            self.telegram.send_message(chat_id, analysis_msg)
+            if financial_data is not None:
+                metrics.inc("extractions_total", source="fast_path", kind="text")
+            else:
+                # Tampilkan status sedang memproses (typing atau placeholder)
+                await status.start()
+                
+                # Proses dengan AI service yang aktif
+                ai_service = self.get_ai_service()
+                financial_data = await self.extract_text_data(ai_service, text_content)
+                # Lengkapi kategori/metode pembayaran yang kosong dari merchant yang dikenal
+                financial_data = self.category_index.apply(chat_id, financial_data)
             
-            # Kirim JSON response
-            # json_msg = self.formatter.format_json_response(financial_data)
-            # self.telegram.send_message(chat_id, json_msg)
+            if "error" in financial_data:
+                # Kirim pesan error
+                error_msg = self.formatter.format_error_message(financial_data['error'])
+                await status.reply(error_msg)
+            else:
+                # Tambahkan timestamp berdasarkan waktu pesan user
+                financial_data["timestamp"] = self.get_timestamp_from_unix(message_timestamp)
+                
+                # Simpan ke ledger lokal (Google Sheets direplikasi di latar belakang)
+                storage = await self.save_transaction(chat_id, financial_data)
+                
+                # Format hasil analisis dan ganti status dengan hasilnya
+                analysis_msg = self.formatter.format_financial_analysis(
+                    financial_data, user_name, storage is not None, is_image=False,
+                    sync_pending=storage == "ledger"
+                )
+                await status.reply(analysis_msg)
+                
+                # Kirim JSON response
+                # json_msg = self.formatter.format_json_response(financial_data)
+                # await self.telegram.send_message(chat_id, json_msg)
     
-    async def process_image_message(self, chat_id: int, user_name: str, file_id: str, message_timestamp: int, caption: str = ""):
-        """Memproses pesan gambar"""
-        # Kirim pesan sedang memproses
-        self.telegram.send_message(chat_id, self.formatter.format_processing_message(is_image=True))
+    async def extract_image_data(self, chat_id: int, ai_service, file_id: str, caption: str = "",
+                                 file_unique_id: Optional[str] = None, status=None) -> Dict[str, Any]:
+        """
+        Ekstraksi satu gambar: cache (file_unique_id), unduh, cache (hash isi),
+        preprocessing lalu AI provider. `status` ditampilkan hanya jika gambar
+        benar-benar perlu diunduh dan dianalisis.
+        """
+        # Foto yang sama (file_unique_id) tidak perlu diunduh dan dianalisis ulang
+        key_source = {"file_unique_id": file_unique_id}
+        cache_key = self.cache.image_key(ai_service.provider_name, prompts.version, caption=caption, **key_source)
+        financial_data = await self.cache.get(cache_key)
         
-        # Mendapatkan URL file dan mengunduh gambar
-        file_url = self.telegram.get_file_url(file_id)
+        if financial_data is not None:
+            metrics.inc("extractions_total", source="cache", kind="image")
+            return self.category_index.apply(chat_id, financial_data)
         
-        if not file_url:
-            error_msg = f"❌ Gagal mendapatkan URL gambar dari {user_name}"
-            self.telegram.send_message(chat_id, error_msg)
-            return
+        if status is not None:
+            # Tampilkan status sedang memproses (typing atau placeholder)
+            await status.start()
         
-        image_data = self.telegram.download_image(file_url)
+        # Mendapatkan URL file dan mengunduh gambar
+        file_url = await self.telegram.get_file_url(file_id)
+        if not file_url:
+            return {"error": "Gagal mendapatkan URL gambar"}
         
+        image_data = await self.telegram.download_image(file_url)
         if not image_data:
-            error_msg = f"❌ Gagal mengunduh gambar dari {user_name}"
-            self.telegram.send_message(chat_id, error_msg)
-            return
+            return {"error": "Gagal mengunduh gambar"}
+        
+        # Tanpa file_unique_id, gunakan hash isi gambar sebagai key
+        if cache_key is None:
+            key_source = {"image_data": image_data}
+            cache_key = self.cache.image_key(ai_service.provider_name, prompts.version, caption=caption, **key_source)
+            financial_data = await self.cache.get(cache_key)
+            if financial_data is not None:
+                metrics.inc("extractions_total", source="cache", kind="image")
+                return self.category_index.apply(chat_id, financial_data)
+        
+        metrics.inc("extractions_total", source="llm", kind="image")
         
-        # Proses dengan AI service yang aktif
-        ai_service = self.get_ai_service()
-        financial_data = await ai_service.process_financial_data(
-            text_content=caption if caption else None,
-            image_data=image_data
+        # Kecilkan/grayscale gambar di thread pool agar tidak memblokir event loop
+        with metrics.timer("preprocess_image", provider="local"):
+            image_data, mime_type = await thread_pool.run(self.images.preprocess, image_data)
+        
+        # Proses dengan AI service terbaik yang tersedia
+        provider, financial_data = await self.router.call_with_provider(
+            lambda service: service.process_financial_data(
+                text_content=caption if caption else None,
+                image_data=image_data,
+                mime_type=mime_type
+            )
+        )
+        # Key memakai provider yang benar-benar menjawab (bisa provider cadangan)
+        await self.cache.set(
+            self.cache.image_key(provider, prompts.version, caption=caption, **key_source), financial_data
         )
         
-        if "error" in financial_data:
-            # Kirim pesan error
-            error_msg = self.formatter.format_error_message(financial_data['error'])
-            self.telegram.send_message(chat_id, error_msg)
-        else:
-            # Tambahkan timestamp berdasarkan waktu pesan user
-            financial_data["timestamp"] = self.get_timestamp_from_unix(message_timestamp)
-            
-            # Simpan ke Google Sheets
-            sheet_saved = self.sheets.save_financial_data(financial_data)
-            
-            # Format dan kirim pesan hasil analisis
-            analysis_msg = self.formatter.format_financial_analysis(
-                financial_data, user_name, sheet_saved, is_image=True, caption=caption
+        # Lengkapi kategori/metode pembayaran yang kosong dari item yang dikenal
+        return self.category_index.apply(chat_id, financial_data)
+    
+    async def process_image_message(self, chat_id: int, user_name: str, file_id: str, message_timestamp: int,
+                                    caption: str = "", file_unique_id: Optional[str] = None):
+        """Memproses pesan gambar"""
+        async with self.telegram.status(chat_id, self.formatter.format_processing_message(is_image=True)) as status:
+            financial_data = await self.extract_image_data(
+                chat_id, self.get_ai_service(), file_id, caption, file_unique_id=file_unique_id, status=status
             )
-            self.telegram.send_message(chat_id, analysis_msg)
             
-            # Kirim JSON response
-            # json_msg = self.formatter.format_json_response(financial_data)
-            # self.telegram.send_message(chat_id, json_msg)
+            if "error" in financial_data:
+                # Kirim pesan error
+                error_msg = self.formatter.format_error_message(financial_data['error'])
+                await status.reply(error_msg)
+            else:
+                # Tambahkan timestamp berdasarkan waktu pesan user
+                financial_data["timestamp"] = self.get_timestamp_from_unix(message_timestamp)
+                
+                # Simpan ke ledger lokal (Google Sheets direplikasi di latar belakang)
+                storage = await self.save_transaction(chat_id, financial_data)
+                
+                # Format hasil analisis dan ganti status dengan hasilnya
+                analysis_msg = self.formatter.format_financial_analysis(
+                    financial_data, user_name, storage is not None, is_image=True, caption=caption,
+                    sync_pending=storage == "ledger"
+                )
+                await status.reply(analysis_msg)
+                
+                # Kirim JSON response
+                # json_msg = self.formatter.format_json_response(financial_data)
+                # await self.telegram.send_message(chat_id, json_msg)
+    
+    async def process_album(self, messages: List[Dict[str, Any]]):
+        """
+        Memproses satu album foto (beberapa struk sekaligus).
+        
+        Semua foto diunduh, di-preprocess dan diekstrak bersamaan, transaksi
+        yang berhasil disimpan dalam satu batch, lalu dibalas dengan satu
+        ringkasan gabungan. Update album sudah ditandai selesai saat foto
+        dikumpulkan, jadi Telegram tidak mengirimnya ulang; jika album gagal
+        diproses, pengguna mendapat balasan error agar bisa mengirim ulang.
+        """
+        first = messages[0]
+        chat_id = first["chat"]["id"]
+        user_name = first["from"].get("first_name", "User")
+        # Caption album biasanya hanya ada di salah satu foto (ditampilkan di ringkasan)
+        caption = next((message["caption"] for message in messages if message.get("caption")), "")
+        started = time.perf_counter()
+        outcome = "success"
+        
+        try:
+            placeholder = self.formatter.format_processing_message(is_image=True, count=len(messages))
+            async with self.telegram.status(chat_id, placeholder) as status:
+                try:
+                    await status.start()
+                    
+                    ai_service = self.get_ai_service()
+                    photos = [self.images.select_photo(message["photo"]) for message in messages]
+                    # Caption hanya untuk foto yang membawanya, bukan struk lain di album
+                    results = await asyncio.gather(*[
+                        self.extract_image_data(
+                            chat_id, ai_service, photo["file_id"], message.get("caption", ""),
+                            file_unique_id=photo.get("file_unique_id")
+                        )
+                        for message, photo in zip(messages, photos)
+                    ], return_exceptions=True)
+                    results = [
+                        {"error": str(result)} if isinstance(result, BaseException) else result
+                        for result in results
+                    ]
+                    
+                    transactions = []
+                    for message, financial_data in zip(messages, results):
+                        if "error" not in financial_data:
+                            financial_data["timestamp"] = self.get_timestamp_from_unix(message.get("date", 0))
+                            transactions.append(financial_data)
+                    
+                    storage = await self.save_transactions(chat_id, transactions) if transactions else None
+                    
+                    album_msg = self.formatter.format_album_analysis(
+                        results, user_name, storage is not None, caption=caption,
+                        sync_pending=storage == "ledger"
+                    )
+                    await status.reply(album_msg)
+                except Exception as e:
+                    await status.reply(self.formatter.format_error_message(
+                        f"Gagal memproses album {len(messages)} foto: {e}\nSilakan kirim ulang fotonya."
+                    ))
+                    raise
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            metrics.observe("message_duration_seconds", time.perf_counter() - started, kind="album", outcome=outcome)
     
-    def process_unsupported_message(self, chat_id: int, user_name: str):
+    async def process_unsupported_message(self, chat_id: int, user_name: str):
         """Memproses pesan yang tidak didukung"""
         unsupported_msg = self.formatter.format_unsupported_message(user_name)
-        self.telegram.send_message(chat_id, unsupported_msg)
+        await self.telegram.send_message(chat_id, unsupported_msg)
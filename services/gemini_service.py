@@ -1,17 +1,25 @@
-import json
+import asyncio
 import base64
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 import pytz
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from config import settings
+from .rate_limiter_service import rate_limiter
+from .prompt_service import prompts
+from .thread_pool_service import thread_pool
+from .structured_output_service import structured_output
 
 class GeminiService:
     """Service untuk mengelola Gemini AI"""
     
+    provider_name = "gemini"
+    
     def __init__(self):
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        # Instruksi statis sebagai system_instruction agar prefix prompt selalu sama
+        self.model = genai.GenerativeModel('gemini-1.5-flash', system_instruction=prompts.system_prompt())
     
     def get_current_timestamp(self) -> str:
         """Mendapatkan timestamp saat ini dalam timezone Jakarta"""
@@ -23,100 +31,103 @@ class GeminiService:
         """Mengconvert image data ke base64 untuk Gemini AI"""
         return base64.b64encode(image_data).decode('utf-8')
     
-    def create_prompt(self) -> str:
-        """Membuat prompt untuk Gemini AI"""
-        return """
-Saya akan memberikan Anda teks atau gambar yang berkaitan dengan transaksi keuangan. 
-Tolong analisis dan ekstrak informasi berikut dalam format JSON yang VALID:
-
-{
-  "prompt_text": "teks yang diberikan atau deskripsi gambar",
-  "category": "kategori transaksi (entertainment, transfer, billings, food, shopping, transport, dll)",
-  "amount": "total jumlah uang (angka saja, tanpa mata uang)",
-  "payment_method": "metode pembayaran (cash, dana, gopay, shopeepay, ovo, bca, bni, dll)",
-  "type": "jenis transaksi (income/expense/transfer)",
-  "summary": "ringkasan singkat transaksi",
-  "items": [
-    {
-      "name": "nama item",
-      "quantity": "jumlah item (angka)",
-      "price": "harga per item (angka)"
-    }
-  ]
-}
-
-Aturan penting:
-1. Berikan HANYA JSON yang valid, tanpa penjelasan tambahan
-2. Untuk amount, gunakan angka saja (contoh: 50000, bukan "Rp 50.000")
-3. Jika tidak ada informasi spesifik, gunakan nilai default yang masuk akal
-4. Items hanya diisi jika ada daftar pembelian yang jelas (seperti struk belanja)
-5. Category harus spesifik (contoh: food, transport, entertainment, shopping, transfer, billings)
-6. Type: "expense" untuk pengeluaran, "income" untuk pemasukan, "transfer" untuk transfer antar akun
+    async def generate_content(self, contents, generation_config: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Memanggil Gemini tanpa memblokir event loop.
 
-Analisis data berikut:
-"""
+        Menggunakan generate_content_async jika tersedia di SDK,
+        jika tidak dijalankan di thread pool bersama. Keduanya dibatasi timeout
+        dan rate limiter; 429 (ResourceExhausted) dicoba ulang dengan backoff.
+        """
+        request_options = {"timeout": settings.llm_timeout}
+        options = {"generation_config": generation_config} if generation_config else {}
+        for attempt in range(settings.rate_limit_max_retries + 1):
+            try:
+                # Antri di rate limiter Gemini (RPM + konkurensi) sebelum memanggil API
+                async with rate_limiter.limit("gemini"):
+                    if hasattr(self.model, "generate_content_async"):
+                        call = self.model.generate_content_async(contents, request_options=request_options, **options)
+                    else:
+                        call = thread_pool.run(
+                            self.model.generate_content, contents, request_options=request_options, **options
+                        )
+                    response = await asyncio.wait_for(call, timeout=settings.llm_timeout)
+                usage = getattr(response, "usage_metadata", None)
+                if usage is not None:
+                    prompts.record_usage(
+                        self.provider_name, usage.prompt_token_count, usage.candidates_token_count,
+                        cached_tokens=getattr(usage, "cached_content_token_count", None)
+                    )
+                return response
+            except google_exceptions.ResourceExhausted:
+                if attempt == settings.rate_limit_max_retries:
+                    raise
+                rate_limiter.penalize("gemini", settings.rate_limit_default_backoff * (attempt + 1))
     
-    async def process_financial_data(self, text_content: str = None, image_data: bytes = None) -> Dict[str, Any]:
+    def generation_config(self, batch: bool = False) -> Optional[Dict[str, Any]]:
+        """Response schema structured output (None jika dinonaktifkan)"""
+        return structured_output.gemini_generation_config(batch) if settings.structured_output_enabled else None
+    
+    async def reask(self, prompt: str) -> str:
+        """Meminta Gemini memperbaiki response JSON sebelumnya"""
+        response = await self.generate_content(prompt, self.generation_config())
+        return response.text.strip()
+    
+    async def process_financial_data(self, text_content: str = None, image_data: bytes = None,
+                                     mime_type: str = "image/jpeg") -> Dict[str, Any]:
         """Memproses teks atau gambar dengan Gemini AI"""
+        response_text = ""
         try:
-            prompt = self.create_prompt()
-            
-            if image_data and text_content:
-                # Jika ada gambar dan teks
+            if image_data:
+                # Gambar (dengan caption jika ada)
                 image_base64 = self.encode_image_to_base64(image_data)
-                prompt += f"\n\nTeks: {text_content}\nGambar: [Gambar terlampir]"
-                
-                response = self.model.generate_content([
-                    prompt,
+                response = await self.generate_content([
+                    prompts.image_prompt(text_content),
                     {
-                        "mime_type": "image/jpeg",
+                        "mime_type": mime_type,
                         "data": image_base64
                     }
-                ])
-                
-            elif image_data:
-                # Hanya gambar
-                image_base64 = self.encode_image_to_base64(image_data)
-                prompt += "\n\nGambar: [Gambar terlampir]"
-                
-                response = self.model.generate_content([
-                    prompt,
-                    {
-                        "mime_type": "image/jpeg", 
-                        "data": image_base64
-                    }
-                ])
+                ], self.generation_config())
                 
             elif text_content:
                 # Hanya teks
-                prompt += f"\n\nTeks: {text_content}"
-                response = self.model.generate_content(prompt)
+                response = await self.generate_content(prompts.text_prompt(text_content), self.generation_config())
                 
             else:
                 return {"error": "Tidak ada teks atau gambar yang diberikan"}
             
-            # Parse response JSON
+            # Validasi dengan schema; angka string dikonversi, JSON rusak diperbaiki dulu
             response_text = response.text.strip()
             
-            # Membersihkan response jika ada markdown formatting
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-            
-            # Parse JSON
-            financial_data = json.loads(response_text)
-            
             # Timestamp akan ditambahkan di level service yang lebih tinggi
             # berdasarkan waktu pesan dari user
+            return await structured_output.parse_or_reask(self.provider_name, response_text, self.reask)
             
-            return financial_data
-            
-        except json.JSONDecodeError as e:
+        except asyncio.TimeoutError:
+            print(f"Gemini timeout setelah {settings.llm_timeout} detik")
+            return {"error": f"Gemini tidak merespons dalam {settings.llm_timeout:.0f} detik"}
+        except ValueError as e:
             print(f"JSON decode error: {e}")
             print(f"Response text: {response_text}")
-            return {"error": f"Invalid JSON response from Gemini: {str(e)}"}
+            return {"error": str(e)}
         except Exception as e:
             print(f"Error processing with Gemini: {e}")
             return {"error": str(e)}
+    
+    async def process_financial_data_batch(self, texts: List[str]) -> Optional[List[Any]]:
+        """
+        Memproses beberapa teks dalam satu request Gemini.
+        
+        Mengembalikan JSON array hasil parse, atau None jika response tidak valid
+        sehingga pemanggil bisa fallback ke request satu per satu.
+        """
+        response_text = ""
+        try:
+            response = await self.generate_content(prompts.batch_prompt(texts), self.generation_config(batch=True))
+            
+            response_text = response.text.strip()
+            return structured_output.parse_batch(self.provider_name, response_text)
+            
+        except Exception as e:
+            print(f"Error processing batch with Gemini: {e}")
+            return None
@@ -1,9 +1,17 @@
+import asyncio
 import json
-from typing import Dict, Any
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import pytz
 import gspread
-from gspread.exceptions import SpreadsheetNotFound
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
 from google.oauth2.service_account import Credentials
 from config import settings
+from .rate_limiter_service import rate_limiter
+from .thread_pool_service import thread_pool
 
 class GoogleSheetsService:
     """Service untuk mengelola Google Sheets"""
@@ -15,6 +23,23 @@ class GoogleSheetsService:
         ]
         self.service_account_file = 'credentials.json'
         self._client = None
+        
+        # Cache spreadsheet/worksheet agar write path tidak mencari per judul setiap kali
+        self._spreadsheet_id = settings.google_sheet_id
+        self._spreadsheet = None
+        self._spreadsheet_cached_at = 0.0
+        # Handle worksheet per shard (None = sheet pertama) dan shard yang header-nya sudah dicek
+        self._worksheets: Dict[Optional[str], Any] = {}
+        self._headers_verified: set = set()
+        
+        self._write_queue = None
+        self._flush_task = None
+        self._last_sort: Dict[Optional[str], float] = {}
+        self._sort_pending: set = set()
+        # Baris terakhir yang terisi per shard (dari response append), untuk range sort
+        self._last_row: Dict[Optional[str], int] = {}
+        # Cache dan status shard diubah dari beberapa thread (`sheets_max_concurrency`)
+        self._lock = threading.RLock()
     
     def get_client(self):
         """Membuat koneksi ke Google Sheets"""
@@ -45,6 +70,116 @@ class GoogleSheetsService:
             
             return spreadsheet
     
+    def get_spreadsheet(self):
+        """
+        Mendapatkan spreadsheet dari cache.
+        
+        Lookup per judul hanya dilakukan sekali, setelah itu spreadsheet selalu
+        dibuka dengan ID, juga jika judulnya diganti. Handle di-refresh setiap
+        `sheets_cache_ttl` detik; pencarian per judul (dan pembuatan spreadsheet
+        baru) hanya terjadi jika ID tersebut sudah tidak ada.
+        """
+        with self._lock:
+            if self._spreadsheet is not None and time.monotonic() - self._spreadsheet_cached_at < settings.sheets_cache_ttl:
+                return self._spreadsheet
+        
+            client = self.get_client()
+            spreadsheet = None
+        
+            if self._spreadsheet_id:
+                try:
+                    spreadsheet = client.open_by_key(self._spreadsheet_id)
+                    if spreadsheet.title != settings.google_sheet_name and not settings.google_sheet_id:
+                        print(f"ℹ️ Spreadsheet diganti nama menjadi '{spreadsheet.title}', tetap dipakai lewat ID")
+                except SpreadsheetNotFound:
+                    print(f"⚠️ Spreadsheet dengan ID {self._spreadsheet_id} tidak ditemukan, mencari ulang per judul")
+        
+            if spreadsheet is None:
+                # Buat atau buka spreadsheet
+                spreadsheet = self.create_spreadsheet_if_not_exists(client)
+                self._spreadsheet_id = spreadsheet.id
+        
+            # Handle worksheet (dan jumlah barisnya) ikut di-refresh bersama spreadsheet
+            if self._spreadsheet is None or self._spreadsheet.id != spreadsheet.id:
+                self._headers_verified = set()
+            self._worksheets = {}
+            self._last_row = {}
+            self._spreadsheet = spreadsheet
+            self._spreadsheet_cached_at = time.monotonic()
+            return spreadsheet
+    
+    def get_worksheet(self, shard: Optional[str] = None):
+        """
+        Mendapatkan worksheet untuk satu shard dari cache.
+        
+        Tanpa shard dipakai sheet pertama. Worksheet shard yang belum ada
+        dibuat saat pertama kali ditulis, lengkap dengan header.
+        """
+        with self._lock:
+            spreadsheet = self.get_spreadsheet()
+            worksheet = self._worksheets.get(shard)
+            if worksheet is not None:
+                return worksheet
+        
+            if shard is None:
+                worksheet = spreadsheet.sheet1  # Menggunakan sheet pertama
+            else:
+                try:
+                    worksheet = spreadsheet.worksheet(shard)
+                except WorksheetNotFound:
+                    print(f"📄 Membuat worksheet '{shard}'")
+                    worksheet = spreadsheet.add_worksheet(
+                        title=shard, rows=settings.sheets_shard_rows, cols=len(self.get_headers())
+                    )
+                    worksheet.append_row(self.get_headers())
+                    self._headers_verified.add(shard)
+        
+            self._worksheets[shard] = worksheet
+            return worksheet
+    
+    def shard_for(self, chat_id: Optional[int], timestamp: Optional[str]) -> Optional[str]:
+        """
+        Judul worksheet tujuan sesuai `sheets_shard_mode`.
+        
+        "chat" -> "chat_123", "month" -> "2025-09", "chat_month" -> "chat_123_2025-09",
+        "none" -> None (sheet pertama, perilaku lama).
+        """
+        mode = settings.sheets_shard_mode
+        if mode not in ("chat", "month", "chat_month"):
+            return None
+        
+        parts = []
+        if mode in ("chat", "chat_month"):
+            parts.append(f"chat_{chat_id}" if chat_id is not None else "chat_unknown")
+        if mode in ("month", "chat_month"):
+            if timestamp and len(timestamp) >= 7:
+                parts.append(timestamp[:7])
+            else:
+                parts.append(datetime.now(pytz.timezone('Asia/Jakarta')).strftime("%Y-%m"))
+        return "_".join(parts)
+    
+    def group_rows(self, entries: Iterable[Tuple[Optional[int], Dict[str, Any]]]) -> Dict[Optional[str], List[List[Any]]]:
+        """Kelompokkan (chat_id, financial_data) menjadi baris per shard, urutan tetap"""
+        groups: Dict[Optional[str], List[List[Any]]] = {}
+        for chat_id, financial_data in entries:
+            shard = self.shard_for(chat_id, financial_data.get("timestamp"))
+            groups.setdefault(shard, []).append(self.build_row(financial_data))
+        return groups
+    
+    def invalidate_cache(self):
+        """
+        Hapus cache handle spreadsheet/worksheet, misalnya saat worksheet dihapus.
+        
+        ID spreadsheet tetap disimpan sehingga dibuka ulang dengan ID, bukan
+        dicari per judul (yang bisa membuat spreadsheet baru jika judulnya diganti).
+        """
+        with self._lock:
+            self._spreadsheet = None
+            self._spreadsheet_cached_at = 0.0
+            self._worksheets = {}
+            self._headers_verified = set()
+            self._last_row = {}
+    
     def test_connection(self) -> Dict[str, Any]:
         """Test koneksi ke Google Sheets"""
         try:
@@ -56,6 +191,7 @@ class GoogleSheetsService:
             try:
                 # Coba akses spreadsheet utama
                 spreadsheet = client.open(settings.google_sheet_name)
+                self._spreadsheet_id = spreadsheet.id
                 return {
                     "status": "success",
                     "message": f"Berhasil mengakses spreadsheet '{settings.google_sheet_name}'",
@@ -74,50 +210,245 @@ class GoogleSheetsService:
                 "message": f"Error testing connection: {str(e)}"
             }
     
-    def save_financial_data(self, financial_data: Dict[str, Any]) -> bool:
-        """Menyimpan data keuangan ke Google Sheets"""
+    def get_headers(self) -> List[str]:
+        """Header kolom sesuai urutan field JSON"""
+        return [
+            'timestamp',
+            'prompt_text', 
+            'category',
+            'amount',
+            'payment_method',
+            'type',
+            'summary',
+            'items'
+        ]
+    
+    def build_row(self, financial_data: Dict[str, Any]) -> List[Any]:
+        """Siapkan data untuk disimpan sesuai urutan kolom JSON"""
+        return [
+            financial_data.get('timestamp', ''),
+            financial_data.get('prompt_text', ''),
+            financial_data.get('category', ''),
+            financial_data.get('amount', 0),
+            financial_data.get('payment_method', ''),
+            financial_data.get('type', ''),
+            financial_data.get('summary', ''),
+            json.dumps(financial_data.get('items', []), ensure_ascii=False)  # Items sebagai JSON string
+        ]
+    
+    def ensure_headers(self, worksheet, shard: Optional[str] = None):
+        """Cek apakah ada header, jika tidak ada maka buat header (sekali per worksheet)"""
+        with self._lock:
+            if shard in self._headers_verified:
+                return
+            # Baris 1 kosong berarti belum ada header; error lain (429/5xx) dilempar
+            # agar tidak menulis header kedua ke sheet yang sudah berisi
+            if not worksheet.row_values(1):
+                worksheet.append_row(self.get_headers())
+            self._headers_verified.add(shard)
+    
+    def sort_latest_on_top(self, shard: Optional[str] = None):
+        """
+        Urutkan blok data berdasarkan timestamp, terbaru di atas.
+        
+        Range eksplisit mulai baris 2 sehingga header tidak ikut diurutkan, dan
+        baris terakhir diambil dari append terakhir (bukan `row_count` handle
+        yang di-cache, yang tidak ikut bertambah saat sheet membesar).
+        """
+        worksheet = self.get_worksheet(shard)
+        with self._lock:
+            last_row = self._last_row.get(shard)
+        if last_row is None:
+            last_row = len(worksheet.col_values(1))
+        if last_row > 2:
+            end_column = gspread.utils.rowcol_to_a1(last_row, len(self.get_headers()))
+            worksheet.sort((1, 'des'), range=f"A2:{end_column}")
+        with self._lock:
+            self._last_sort[shard] = time.monotonic()
+            self._sort_pending.discard(shard)
+    
+    def sort_due(self, shard: Optional[str] = None) -> bool:
+        """Apakah shard perlu diurutkan sekarang (sudah lewat `sheets_sort_interval`)"""
+        with self._lock:
+            return (shard in self._sort_pending
+                    and time.monotonic() - self._last_sort.get(shard, 0.0) >= settings.sheets_sort_interval)
+    
+    def append_rows(self, rows: List[List[Any]], shard: Optional[str] = None):
+        """
+        Menambahkan banyak baris sekaligus dengan satu panggilan values append.
+        
+        Baris ditambahkan di bawah; pengurutan dilakukan terpisah (lihat
+        `write_rows`) agar retry 429 pada sort tidak menulis ulang baris.
+        Dengan sharding, hanya worksheet milik `shard` yang ditulis.
+        """
         try:
-            client = self.get_client()
+            response = self._append_to_worksheet(rows, shard)
+        except (APIError, SpreadsheetNotFound, WorksheetNotFound) as e:
+            # Sheet dihapus/diganti: kosongkan cache lalu coba sekali lagi
+            if isinstance(e, APIError) and e.code not in (400, 404):
+                raise
+            print(f"⚠️ Cache Google Sheets tidak valid ({e}), mencoba ulang")
+            self.invalidate_cache()
+            response = self._append_to_worksheet(rows, shard)
+        
+        # "Sheet1!A5:H7" -> baris terakhir 7
+        updated_range = ((response or {}).get("updates") or {}).get("updatedRange", "")
+        match = re.search(r"(\d+)$", updated_range)
+        with self._lock:
+            if match:
+                self._last_row[shard] = max(self._last_row.get(shard, 0), int(match.group(1)))
+            else:
+                self._last_row.pop(shard, None)
+            self._sort_pending.add(shard)
+    
+    def _append_to_worksheet(self, rows: List[List[Any]], shard: Optional[str] = None):
+        """Satu panggilan append ke worksheet yang sudah di-cache"""
+        worksheet = self.get_worksheet(shard)
+        self.ensure_headers(worksheet, shard)
+        return worksheet.append_rows(rows, value_input_option='RAW', table_range='A1')
+    
+    def sort_if_pending(self):
+        """Jalankan pengurutan yang tertunda (saat writer sedang idle)"""
+        with self._lock:
+            shards = list(self._sort_pending)
+        for shard in shards:
+            self.sort_latest_on_top(shard)
+    
+    def save_financial_data(self, financial_data: Dict[str, Any], chat_id: Optional[int] = None) -> bool:
+        """Menyimpan satu data keuangan ke Google Sheets secara langsung (tanpa buffer)"""
+        shard = self.shard_for(chat_id, financial_data.get("timestamp"))
+        try:
+            self.append_rows([self.build_row(financial_data)], shard)
+        except Exception as e:
+            print(f"❌ Error menyimpan ke Google Sheets: {e}")
+            return False
+        
+        # Data baru langsung diurutkan agar tetap paling atas setelah header
+        try:
+            self.sort_latest_on_top(shard)
+        except Exception as e:
+            print(f"⚠️ Gagal mengurutkan Google Sheets: {e}")
+        return True
+    
+    async def start(self):
+        """Menjalankan write-behind buffer (dipanggil saat startup aplikasi)"""
+        if self._flush_task is not None:
+            return
+        self._write_queue = asyncio.Queue()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def stop(self):
+        """Flush semua baris yang tersisa lalu hentikan buffer"""
+        if self._flush_task is None:
+            return
+        await self._write_queue.put(None)
+        await self._flush_task
+        self._flush_task = None
+        try:
+            await self.run_write(self.sort_if_pending)
+        except Exception as e:
+            print(f"⚠️ Gagal mengurutkan Google Sheets saat shutdown: {e}")
+    
+    async def save_financial_data_async(self, financial_data: Dict[str, Any], chat_id: Optional[int] = None) -> bool:
+        """
+        Menyimpan data keuangan lewat write-behind buffer.
+        
+        Baris dikumpulkan selama `sheets_flush_interval` detik atau sampai
+        `sheets_batch_size` baris, lalu ditulis dalam satu batch. Pemanggil tetap
+        menerima status tersimpan/gagal untuk transaksinya sendiri.
+        """
+        if self._flush_task is None:
+            async with rate_limiter.limit("sheets"):
+                return await thread_pool.run(self.save_financial_data, financial_data, chat_id)
+        
+        future = asyncio.get_running_loop().create_future()
+        shard = self.shard_for(chat_id, financial_data.get("timestamp"))
+        await self._write_queue.put((shard, self.build_row(financial_data), future))
+        return await future
+    
+    async def run_write(self, func, *args):
+        """
+        Menjalankan operasi tulis gspread lewat rate limiter Sheets.
+        
+        Jika kuota per menit habis (429), operasi dijeda lalu dicoba ulang.
+        """
+        for attempt in range(settings.rate_limit_max_retries + 1):
+            try:
+                async with rate_limiter.limit("sheets"):
+                    return await thread_pool.run(func, *args)
+            except APIError as e:
+                if e.code != 429 or attempt == settings.rate_limit_max_retries:
+                    raise
+                retry_after = rate_limiter.parse_duration(e.response.headers.get("retry-after"))
+                rate_limiter.penalize("sheets", retry_after)
+    
+    async def write_rows(self, rows: List[List[Any]], shard: Optional[str] = None, sort: bool = False):
+        """
+        Append lalu (jika sudah waktunya) sort, sebagai dua operasi terpisah.
+        
+        Hanya append yang menentukan berhasil/gagal; sort yang gagal tetap
+        tertunda dan dicoba lagi saat writer idle.
+        """
+        await self.run_write(self.append_rows, rows, shard)
+        if sort or self.sort_due(shard):
+            try:
+                await self.run_write(self.sort_latest_on_top, shard)
+            except Exception as e:
+                print(f"⚠️ Gagal mengurutkan Google Sheets: {e}")
+    
+    async def _flush_loop(self):
+        """Loop yang mengumpulkan baris dan menulisnya per batch"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        
+        while not stopping:
+            # Saat idle, manfaatkan waktu tunggu untuk mengurutkan sheet
+            try:
+                timeout = settings.sheets_sort_interval if self._sort_pending else None
+                entry = await asyncio.wait_for(self._write_queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                try:
+                    await self.run_write(self.sort_if_pending)
+                except Exception as e:
+                    # Tetap tertunda, dicoba lagi pada idle berikutnya
+                    print(f"⚠️ Gagal mengurutkan Google Sheets: {e}")
+                continue
             
-            # Buat atau buka spreadsheet
-            spreadsheet = self.create_spreadsheet_if_not_exists(client)
-            worksheet = spreadsheet.sheet1  # Menggunakan sheet pertama
+            if entry is None:
+                break
             
-            # Siapkan data untuk disimpan sesuai urutan kolom JSON
-            row_data = [
-                financial_data.get('timestamp', ''),
-                financial_data.get('prompt_text', ''),
-                financial_data.get('category', ''),
-                financial_data.get('amount', 0),
-                financial_data.get('payment_method', ''),
-                financial_data.get('type', ''),
-                financial_data.get('summary', ''),
-                json.dumps(financial_data.get('items', []), ensure_ascii=False)  # Items sebagai JSON string
-            ]
+            batch = [entry]
+            deadline = loop.time() + settings.sheets_flush_interval
+            while len(batch) < settings.sheets_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._write_queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
             
-            # Cek apakah ada header, jika tidak ada maka buat header
+            await self._flush(batch)
+    
+    async def _flush(self, batch: List[Tuple[Optional[str], List[Any], asyncio.Future]]):
+        """Menulis satu batch (satu append per shard) dan mengabarkan hasilnya ke setiap pemanggil"""
+        groups: Dict[Optional[str], List[Tuple[List[Any], asyncio.Future]]] = {}
+        for shard, row, future in batch:
+            groups.setdefault(shard, []).append((row, future))
+        
+        for shard, entries in groups.items():
+            rows = [row for row, _ in entries]
             try:
-                existing_headers = worksheet.row_values(1)
-                if not existing_headers:
-                    raise Exception("No headers found")
-            except:
-                headers = [
-                    'timestamp',
-                    'prompt_text', 
-                    'category',
-                    'amount',
-                    'payment_method',
-                    'type',
-                    'summary',
-                    'items'
-                ]
-                worksheet.append_row(headers)
+                await self.write_rows(rows, shard)
+                saved = True
+            except Exception as e:
+                print(f"❌ Error menyimpan {len(rows)} baris ke Google Sheets: {e}")
+                saved = False
             
-            # Tambahkan data baru di paling atas setelah header (baris ke-2)
-            worksheet.insert_row(row_data, 2)
-            
-            return True
-            
-        except Exception as e:
-            print(f"❌ Error menyimpan ke Google Sheets: {e}")
-            return False
+            for _, future in entries:
+                if not future.done():
+                    future.set_result(saved)
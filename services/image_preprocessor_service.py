@@ -0,0 +1,95 @@
+import io
+from typing import Any, Dict, List, Tuple
+from PIL import Image, ImageChops, ImageOps
+from config import settings
+
+class ImagePreprocessorService:
+    """
+    Service untuk menyiapkan gambar struk sebelum dikirim ke AI provider.
+
+    Memilih ukuran foto Telegram yang cukup terbaca, memotong tepi polos,
+    mengecilkan ke sisi panjang target, mengubah ke grayscale dan
+    mengompres ulang sehingga request dan token vision lebih kecil.
+    """
+
+    # Magic bytes -> MIME type
+    SIGNATURES = [
+        (b"\xff\xd8\xff", "image/jpeg"),
+        (b"\x89PNG\r\n\x1a\n", "image/png"),
+        (b"GIF87a", "image/gif"),
+        (b"GIF89a", "image/gif"),
+    ]
+
+    def select_photo(self, photos: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Pilih ukuran foto terkecil yang sisi panjangnya masih >= `image_min_long_edge`.
+
+        Jika tidak ada yang cukup besar, gunakan ukuran terbesar.
+        """
+        def long_edge(photo: Dict[str, Any]) -> int:
+            return max(photo.get("width", 0), photo.get("height", 0))
+
+        ordered = sorted(photos, key=long_edge)
+        for photo in ordered:
+            if long_edge(photo) >= settings.image_min_long_edge:
+                return photo
+        return ordered[-1]
+
+    def detect_mime_type(self, image_data: bytes) -> str:
+        """Deteksi MIME type sebenarnya dari magic bytes"""
+        for signature, mime_type in self.SIGNATURES:
+            if image_data.startswith(signature):
+                return mime_type
+        if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+            return "image/webp"
+        return "image/jpeg"
+
+    def crop_borders(self, image: Image.Image) -> Image.Image:
+        """Potong tepi yang warnanya seragam dengan piksel pojok (meja, latar belakang)"""
+        background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+        diff = ImageChops.difference(image, background)
+        if diff.mode != "L":
+            diff = diff.convert("L")
+        bbox = diff.point(lambda value: 255 if value > 24 else 0).getbbox()
+        if not bbox:
+            return image
+
+        # Abaikan hasil crop yang terlalu kecil (kemungkinan salah deteksi)
+        cropped_area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+        if cropped_area < 0.3 * image.size[0] * image.size[1]:
+            return image
+        return image.crop(bbox)
+
+    def preprocess(self, image_data: bytes) -> Tuple[bytes, str]:
+        """
+        Menyiapkan gambar untuk AI provider.
+
+        Mengembalikan (image_bytes, mime_type). Jika pemrosesan gagal,
+        gambar asli dikembalikan dengan MIME type hasil deteksi.
+        """
+        mime_type = self.detect_mime_type(image_data)
+        if not settings.image_preprocess_enabled:
+            return image_data, mime_type
+
+        try:
+            image = Image.open(io.BytesIO(image_data))
+            image = ImageOps.exif_transpose(image)
+
+            if settings.image_grayscale:
+                image = image.convert("L")
+            elif image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+
+            image = self.crop_borders(image)
+
+            target = settings.image_target_long_edge
+            if max(image.size) > target:
+                image.thumbnail((target, target), Image.LANCZOS)
+
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=settings.image_jpeg_quality, optimize=True)
+            return output.getvalue(), "image/jpeg"
+
+        except Exception as e:
+            print(f"⚠️ Gagal preprocessing gambar, memakai gambar asli: {e}")
+            return image_data, mime_type
@@ -0,0 +1,106 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from config import settings
+
+Job = Callable[[], Awaitable[Any]]
+
+class JobQueueService:
+    """Service untuk antrian job in-process yang dikerjakan oleh pool worker async"""
+
+    def __init__(self, workers: Optional[int] = None, max_size: Optional[int] = None):
+        self.worker_count = workers if workers is not None else settings.webhook_workers
+        self.max_size = max_size if max_size is not None else settings.webhook_queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._accepting = False
+        self._in_flight = 0
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    @property
+    def is_running(self) -> bool:
+        """Apakah antrian sedang menerima job"""
+        return self._accepting
+
+    async def start(self):
+        """Menjalankan pool worker"""
+        if self._accepting:
+            return
+
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._workers = [
+            asyncio.create_task(self._worker(index))
+            for index in range(self.worker_count)
+        ]
+        self._accepting = True
+        print(f"🧵 Job queue berjalan dengan {self.worker_count} worker")
+
+    async def submit(self, job: Job, timeout: Optional[float] = None) -> bool:
+        """
+        Memasukkan job ke antrian.
+
+        Jika antrian penuh, menunggu maksimal `timeout` detik (backpressure)
+        lalu mengembalikan False agar pemanggil bisa menolak request.
+        """
+        if not self._accepting:
+            return False
+
+        if timeout is None:
+            timeout = settings.webhook_enqueue_timeout
+
+        try:
+            await asyncio.wait_for(self._queue.put(job), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            print(f"⚠️ Job queue penuh ({self._queue.qsize()}/{self.max_size}), job ditolak")
+            return False
+
+    async def _worker(self, index: int):
+        """Loop worker yang mengambil job dari antrian"""
+        while True:
+            job = await self._queue.get()
+            self._in_flight += 1
+            try:
+                await job()
+                self._processed += 1
+            except Exception as e:
+                self._failed += 1
+                print(f"Error processing job di worker {index}: {e}")
+            finally:
+                self._in_flight -= 1
+                self._queue.task_done()
+
+    async def stop(self, timeout: Optional[float] = None):
+        """Berhenti menerima job, selesaikan job yang tersisa, lalu matikan worker"""
+        if not self._accepting:
+            return
+
+        self._accepting = False
+        if timeout is None:
+            timeout = settings.webhook_drain_timeout
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Drain job queue timeout, {self._queue.qsize() + self._in_flight} job dibatalkan")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        print("🧵 Job queue dihentikan")
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistik antrian untuk monitoring"""
+        return {
+            "running": self._accepting,
+            "depth": self._queue.qsize() if self._queue else 0,
+            "max_size": self.max_size,
+            "workers": self.worker_count,
+            "in_flight": self._in_flight,
+            "processed": self._processed,
+            "failed": self._failed,
+            "rejected": self._rejected
+        }
@@ -0,0 +1,255 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from config import settings
+
+class LedgerService:
+    """
+    Ledger transaksi lokal (SQLite, mode WAL) sebagai system of record.
+
+    Setiap transaksi disimpan di sini lebih dulu; Google Sheets hanya
+    replika yang disinkronkan di latar belakang oleh SheetsReplicatorService.
+    """
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            prompt_text TEXT,
+            category TEXT,
+            amount REAL NOT NULL DEFAULT 0,
+            payment_method TEXT,
+            type TEXT,
+            summary TEXT,
+            items TEXT,
+            created_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_transactions_chat_timestamp ON transactions (chat_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_chat_category ON transactions (chat_id, category)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_chat_type ON transactions (chat_id, type)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions (timestamp)",
+        """
+        CREATE TABLE IF NOT EXISTS aggregates (
+            chat_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (chat_id, period, bucket, dimension, key)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS replication_state (
+            name TEXT PRIMARY KEY,
+            high_water_mark INTEGER NOT NULL
+        )
+        """
+    ]
+
+    # Agregat per chat yang diperbarui saat transaksi ditulis
+    PERIODS = {"day": 10, "month": 7}  # panjang prefix timestamp "YYYY-MM-DD HH:MM:SS"
+    DIMENSIONS = ["type", "category", "payment_method"]
+    # Dimensi yang juga dipecah per tipe, disimpan sebagai "category:expense" dst.
+    TYPED_DIMENSIONS = ["category", "payment_method"]
+
+    COLUMNS = [
+        "id", "chat_id", "timestamp", "prompt_text", "category", "amount",
+        "payment_method", "type", "summary", "items"
+    ]
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or settings.ledger_path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def get_db(self) -> sqlite3.Connection:
+        """Membuka database ledger saat pertama kali dibutuhkan"""
+        if self._db is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.db_path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.SCHEMA:
+                db.execute(statement)
+            db.commit()
+            self._db = db
+            self._backfill_aggregates(db)
+            self._backfill_typed_aggregates(db)
+        return self._db
+
+    def _backfill_aggregates(self, db: sqlite3.Connection):
+        """Bangun agregat sekali untuk ledger lama yang belum punya tabel agregat"""
+        has_transactions = db.execute("SELECT 1 FROM transactions LIMIT 1").fetchone()
+        has_aggregates = db.execute("SELECT 1 FROM aggregates LIMIT 1").fetchone()
+        if not has_transactions or has_aggregates:
+            return
+        print("🔄 Membangun agregat dari ledger yang sudah ada...")
+        with db:
+            for period, length in self.PERIODS.items():
+                for dimension in self.DIMENSIONS:
+                    db.execute(
+                        "INSERT INTO aggregates (chat_id, period, bucket, dimension, key, total, count) "
+                        f"SELECT chat_id, ?, substr(timestamp, 1, {length}), ?, COALESCE({dimension}, ''), "
+                        "SUM(amount), COUNT(*) FROM transactions "
+                        f"GROUP BY chat_id, substr(timestamp, 1, {length}), COALESCE({dimension}, '')",
+                        (period, dimension)
+                    )
+
+    def _backfill_typed_aggregates(self, db: sqlite3.Connection):
+        """Bangun agregat per tipe sekali untuk ledger yang dibuat sebelum agregat ini ada"""
+        has_transactions = db.execute("SELECT 1 FROM transactions LIMIT 1").fetchone()
+        has_typed = db.execute("SELECT 1 FROM aggregates WHERE dimension LIKE '%:%' LIMIT 1").fetchone()
+        if not has_transactions or has_typed:
+            return
+        print("🔄 Membangun agregat per tipe dari ledger yang sudah ada...")
+        with db:
+            for period, length in self.PERIODS.items():
+                for dimension in self.TYPED_DIMENSIONS:
+                    db.execute(
+                        "INSERT INTO aggregates (chat_id, period, bucket, dimension, key, total, count) "
+                        f"SELECT chat_id, ?, substr(timestamp, 1, {length}), ? || ':' || COALESCE(type, ''), "
+                        f"COALESCE({dimension}, ''), SUM(amount), COUNT(*) FROM transactions "
+                        f"GROUP BY chat_id, substr(timestamp, 1, {length}), COALESCE(type, ''), COALESCE({dimension}, '')",
+                        (period, dimension)
+                    )
+
+    def _update_aggregates(self, db: sqlite3.Connection, params: Tuple):
+        """Tambahkan satu transaksi ke agregat harian dan bulanan (dalam transaksi yang sama)"""
+        chat_id, timestamp, _, category, amount, payment_method, transaction_type = params[:7]
+        values = {"type": transaction_type, "category": category, "payment_method": payment_method}
+        for dimension in self.TYPED_DIMENSIONS:
+            values[f"{dimension}:{transaction_type or ''}"] = values[dimension]
+        for period, length in self.PERIODS.items():
+            bucket = timestamp[:length]
+            for dimension in values:
+                db.execute(
+                    "INSERT INTO aggregates (chat_id, period, bucket, dimension, key, total, count) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 1) "
+                    "ON CONFLICT(chat_id, period, bucket, dimension, key) "
+                    "DO UPDATE SET total = total + excluded.total, count = count + 1",
+                    (chat_id, period, bucket, dimension, values[dimension] or "", amount)
+                )
+
+    def _to_params(self, chat_id: int, financial_data: Dict[str, Any], created_at: float) -> Tuple:
+        try:
+            amount = float(financial_data.get("amount") or 0)
+        except (TypeError, ValueError):
+            amount = 0.0
+        return (
+            chat_id,
+            financial_data.get("timestamp", ""),
+            financial_data.get("prompt_text", ""),
+            financial_data.get("category", ""),
+            amount,
+            financial_data.get("payment_method", ""),
+            financial_data.get("type", ""),
+            financial_data.get("summary", ""),
+            json.dumps(financial_data.get("items", []), ensure_ascii=False),
+            created_at
+        )
+
+    def record_many(self, entries: List[Tuple[int, Dict[str, Any]]],
+                    checkpoint: Optional[Tuple[str, int]] = None) -> List[int]:
+        """
+        Menyimpan banyak transaksi (chat_id, financial_data) dalam satu transaksi database.
+        
+        `checkpoint` (name, value) opsional disimpan di transaksi yang sama, sehingga
+        progres import tidak pernah tertinggal dari baris yang sudah tersimpan.
+        """
+        now = time.time()
+        with self._lock:
+            db = self.get_db()
+            ids = []
+            with db:
+                for chat_id, financial_data in entries:
+                    params = self._to_params(chat_id, financial_data, now)
+                    cursor = db.execute(
+                        "INSERT INTO transactions (chat_id, timestamp, prompt_text, category, amount, "
+                        "payment_method, type, summary, items, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        params
+                    )
+                    self._update_aggregates(db, params)
+                    ids.append(cursor.lastrowid)
+                if checkpoint is not None:
+                    self._set_mark(db, *checkpoint)
+            return ids
+
+    def record(self, chat_id: int, financial_data: Dict[str, Any]) -> int:
+        """Menyimpan satu transaksi, mengembalikan id ledger"""
+        return self.record_many([(chat_id, financial_data)])[0]
+
+    def get_aggregates(self, chat_id: int, period: str, bucket: str) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Total per dimensi untuk satu periode (misalnya period="month", bucket="2025-09").
+
+        Hasil: {dimension: {key: {"total": ..., "count": ...}}}, dibaca langsung dari
+        agregat berjalan tanpa memindai transaksi. Rincian per tipe ada di dimensi
+        "category:expense", "payment_method:income", dan seterusnya.
+        """
+        with self._lock:
+            rows = self.get_db().execute(
+                "SELECT dimension, key, total, count FROM aggregates "
+                "WHERE chat_id = ? AND period = ? AND bucket = ?",
+                (chat_id, period, bucket)
+            ).fetchall()
+        result: Dict[str, Dict[str, Dict[str, float]]] = {dimension: {} for dimension in self.DIMENSIONS}
+        for dimension, key, total, count in rows:
+            result.setdefault(dimension, {})[key] = {"total": total, "count": count}
+        return result
+
+    def fetch_after(self, last_id: int, limit: int) -> List[Dict[str, Any]]:
+        """Transaksi dengan id > last_id, urut naik (untuk replikasi)"""
+        with self._lock:
+            rows = self.get_db().execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM transactions WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, limit)
+            ).fetchall()
+        transactions = []
+        for row in rows:
+            transaction = dict(zip(self.COLUMNS, row))
+            transaction["items"] = json.loads(transaction["items"] or "[]")
+            transactions.append(transaction)
+        return transactions
+
+    def max_id(self) -> int:
+        with self._lock:
+            row = self.get_db().execute("SELECT MAX(id) FROM transactions").fetchone()
+        return row[0] or 0
+
+    def get_high_water_mark(self, name: str) -> int:
+        with self._lock:
+            row = self.get_db().execute(
+                "SELECT high_water_mark FROM replication_state WHERE name = ?", (name,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def _set_mark(self, db: sqlite3.Connection, name: str, value: int):
+        db.execute(
+            "INSERT INTO replication_state (name, high_water_mark) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET high_water_mark = excluded.high_water_mark",
+            (name, value)
+        )
+
+    def set_high_water_mark(self, name: str, value: int):
+        with self._lock:
+            db = self.get_db()
+            with db:
+                self._set_mark(db, name, value)
+
+    def close(self):
+        """Menutup koneksi database ledger"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
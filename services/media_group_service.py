@@ -0,0 +1,89 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+from config import settings
+
+AlbumKey = Tuple[int, str]
+
+class MediaGroupService:
+    """
+    Service pengumpul album foto Telegram.
+
+    Telegram mengirim satu update per foto dengan `media_group_id` yang sama.
+    Pesan dikumpulkan per (chat, media_group_id) sampai tidak ada foto baru
+    selama `album_window` detik (atau album mencapai `album_max_size`), lalu
+    seluruh album diserahkan ke handler sekali di latar belakang. Update
+    aslinya langsung selesai sehingga worker antrian dan urutan per chat di
+    mode polling tidak tertahan menunggu foto berikutnya.
+    """
+
+    def __init__(self, handler: Callable[[List[Dict[str, Any]]], Awaitable[None]]):
+        self._handler = handler
+        self._pending: Dict[AlbumKey, List[Dict[str, Any]]] = {}
+        self._timers: Dict[AlbumKey, asyncio.Task] = {}
+        self._running: Set[asyncio.Task] = set()
+        self._albums = 0
+        self._photos = 0
+        self._errors = 0
+
+    def add(self, message: Dict[str, Any]):
+        """Menambahkan satu foto album; timer window dimulai ulang setiap foto baru"""
+        key = (message["chat"]["id"], str(message["media_group_id"]))
+        pending = self._pending.setdefault(key, [])
+        pending.append(message)
+
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        if len(pending) >= settings.album_max_size:
+            self._dispatch(key)
+        else:
+            self._timers[key] = asyncio.create_task(self._dispatch_after_window(key))
+
+    async def _dispatch_after_window(self, key: AlbumKey):
+        await asyncio.sleep(settings.album_window)
+        self._timers.pop(key, None)
+        self._dispatch(key)
+
+    def _dispatch(self, key: AlbumKey):
+        """Serahkan album yang terkumpul ke handler"""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        messages = self._pending.pop(key, [])
+        if not messages:
+            return
+
+        self._albums += 1
+        self._photos += len(messages)
+        task = asyncio.create_task(self._run(messages))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, messages: List[Dict[str, Any]]):
+        try:
+            await self._handler(sorted(messages, key=lambda message: message.get("message_id", 0)))
+        except Exception as e:
+            self._errors += 1
+            print(f"❌ Error memproses album ({len(messages)} foto): {e}")
+
+    async def stop(self):
+        """Proses album yang masih menunggu window lalu tunggu semua selesai (saat shutdown)"""
+        for key in list(self._pending):
+            self._dispatch(key)
+        if self._running:
+            await asyncio.gather(*list(self._running), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistik album untuk monitoring"""
+        return {
+            "enabled": settings.album_enabled,
+            "window_seconds": settings.album_window,
+            "pending": len(self._pending),
+            "running": len(self._running),
+            "albums": self._albums,
+            "photos": self._photos,
+            "errors": self._errors,
+            "avg_album_size": round(self._photos / self._albums, 2) if self._albums else 0.0
+        }
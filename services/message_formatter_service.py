@@ -1,11 +1,15 @@
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 
 class MessageFormatterService:
     """Service untuk memformat pesan response"""
+
+    # Urutan rincian per tipe di /report
+    REPORT_TYPES = [("expense", "Pengeluaran"), ("income", "Pemasukan"), ("transfer", "Transfer")]
     
     def format_financial_analysis(self, financial_data: Dict[str, Any], user_name: str, 
-                                 sheet_saved: bool, is_image: bool = False, caption: str = None) -> str:
+                                 sheet_saved: bool, is_image: bool = False, caption: str = None,
+                                 sync_pending: bool = False) -> str:
         """Format pesan analisis keuangan"""
         
         # Pilih emoji dan title berdasarkan jenis input
@@ -15,7 +19,12 @@ class MessageFormatterService:
             title = "📊 *Analisis Keuangan*"
         
         # Status penyimpanan Google Sheets
-        sheet_status = "✅ Disimpan ke Google Sheets" if sheet_saved else "⚠️ Gagal menyimpan ke Google Sheets"
+        if not sheet_saved:
+            sheet_status = "⚠️ Gagal menyimpan ke Google Sheets"
+        elif sync_pending:
+            sheet_status = "✅ Tersimpan, sinkron ke Google Sheets di latar belakang"
+        else:
+            sheet_status = "✅ Disimpan ke Google Sheets"
         
         # Buat pesan utama
         reply_text = f"{title}\n\n"
@@ -46,6 +55,49 @@ class MessageFormatterService:
         
         return reply_text
     
+    def format_album_analysis(self, results: List[Dict[str, Any]], user_name: str, sheet_saved: bool,
+                              caption: str = None, sync_pending: bool = False) -> str:
+        """Format satu ringkasan gabungan untuk album foto (satu baris per gambar)"""
+        transactions = [financial_data for financial_data in results if "error" not in financial_data]
+        
+        if not transactions:
+            sheet_status = "❌ Tidak ada transaksi yang tersimpan"
+        elif not sheet_saved:
+            sheet_status = "⚠️ Gagal menyimpan ke Google Sheets"
+        elif sync_pending:
+            sheet_status = "✅ Tersimpan, sinkron ke Google Sheets di latar belakang"
+        else:
+            sheet_status = "✅ Disimpan ke Google Sheets"
+        
+        reply_text = f"🖼️💰 *Analisis {len(results)} Gambar Keuangan*\n\n"
+        reply_text += f"👤 *User:* {user_name}\n"
+        if caption:
+            reply_text += f"📝 *Caption:* {caption}\n"
+        reply_text += "\n"
+        
+        for index, financial_data in enumerate(results, start=1):
+            if "error" in financial_data:
+                reply_text += f"{index}. ❌ {financial_data['error']}\n"
+                continue
+            reply_text += (
+                f"{index}. 🏷️ {financial_data.get('category', 'N/A')} • "
+                f"Rp {financial_data.get('amount', 0):,.0f} • {financial_data.get('payment_method', 'N/A')}\n"
+                f"    📋 {financial_data.get('summary', 'N/A')}\n"
+            )
+        
+        # Total per tipe transaksi
+        totals: Dict[str, float] = {}
+        for financial_data in transactions:
+            transaction_type = financial_data.get('type', 'expense')
+            totals[transaction_type] = totals.get(transaction_type, 0) + float(financial_data.get('amount') or 0)
+        if totals:
+            reply_text += "\n"
+            for transaction_type, total in totals.items():
+                reply_text += f"💵 *Total {transaction_type}:* Rp {total:,.0f}\n"
+        
+        reply_text += f"💾 *Status:* {sheet_status} ({len(transactions)}/{len(results)} transaksi)\n"
+        return reply_text
+    
     def format_error_message(self, error: str) -> str:
         """Format pesan error"""
         return f"❌ *Error*\n\n{error}"
@@ -63,9 +115,79 @@ class MessageFormatterService:
         reply_text += "\nBot akan menganalisis dan mengekstrak informasi keuangan dari pesan Anda."
         return reply_text
     
-    def format_processing_message(self, is_image: bool = False) -> str:
+    def _sum_type(self, aggregates: Dict[str, Dict[str, Dict[str, float]]], transaction_type: str) -> float:
+        return aggregates.get("type", {}).get(transaction_type, {}).get("total", 0)
+    
+    def _format_totals(self, aggregates: Dict[str, Dict[str, Dict[str, float]]]) -> str:
+        """Total pemasukan, pengeluaran, transfer dan selisih satu periode"""
+        types = aggregates.get("type", {})
+        count = sum(int(value["count"]) for value in types.values())
+        if not count:
+            return "Belum ada transaksi.\n"
+        income = self._sum_type(aggregates, "income")
+        expense = self._sum_type(aggregates, "expense")
+        transfer = self._sum_type(aggregates, "transfer")
+        text = f"🟢 Pemasukan: Rp {income:,.0f}\n"
+        text += f"🔴 Pengeluaran: Rp {expense:,.0f}\n"
+        if transfer:
+            text += f"🔁 Transfer: Rp {transfer:,.0f}\n"
+        text += f"⚖️ Selisih: Rp {income - expense:,.0f}\n"
+        text += f"🧾 Transaksi: {count}\n"
+        return text
+    
+    def _format_breakdown(self, values: Dict[str, Dict[str, float]]) -> str:
+        """Daftar total per key, terbesar di atas"""
+        text = ""
+        for key, value in sorted(values.items(), key=lambda item: item[1]["total"], reverse=True):
+            text += f"• {key or 'N/A'}: Rp {value['total']:,.0f} ({int(value['count'])}x)\n"
+        return text
+    
+    def format_summary(self, user_name: str, periods: List[Tuple[str, Dict[str, Dict[str, Dict[str, float]]]]]) -> str:
+        """Format ringkasan /summary: total per tipe untuk setiap periode"""
+        reply_text = f"📈 *Ringkasan Keuangan*\n\n👤 *User:* {user_name}\n"
+        for label, aggregates in periods:
+            reply_text += f"\n📅 *{label}*\n"
+            reply_text += self._format_totals(aggregates)
+        return reply_text
+    
+    def format_report(self, user_name: str, label: str, aggregates: Dict[str, Dict[str, Dict[str, float]]]) -> str:
+        """Format laporan /report: total per tipe, kategori dan metode pembayaran"""
+        reply_text = f"📑 *Laporan Keuangan*\n\n👤 *User:* {user_name}\n📅 *Periode:* {label}\n\n"
+        reply_text += self._format_totals(aggregates)
+        if not aggregates.get("type"):
+            return reply_text
+        
+        # Rincian kategori dan metode pembayaran dipisah per tipe agar pemasukan
+        # tidak tercampur dengan pengeluaran
+        for transaction_type, type_label in self.REPORT_TYPES:
+            categories = aggregates.get(f"category:{transaction_type}", {})
+            if not categories:
+                continue
+            reply_text += f"\n🏷️ *{type_label} per Kategori:*\n"
+            reply_text += self._format_breakdown(categories)
+            reply_text += f"\n💳 *{type_label} per Metode Pembayaran:*\n"
+            reply_text += self._format_breakdown(aggregates.get(f"payment_method:{transaction_type}", {}))
+        return reply_text
+    
+    def format_command_help(self) -> str:
+        """Format daftar perintah bot"""
+        reply_text = "ℹ️ *Perintah Bot*\n\n"
+        reply_text += "• /summary - total hari ini dan bulan ini\n"
+        reply_text += "• /summary <periode> - total untuk periode tertentu\n"
+        reply_text += "• /report [periode] - rincian per kategori, metode dan tipe (default bulan ini)\n"
+        reply_text += "\nPeriode: `hari`, `kemarin`, `bulan`, `bulanlalu`, `2025-09` atau `2025-09-14`.\n"
+        reply_text += "\nKirim pesan teks atau foto struk untuk mencatat transaksi."
+        return reply_text
+    
+    def format_ledger_required_message(self) -> str:
+        """Format pesan jika ringkasan diminta tanpa ledger lokal"""
+        return "⚠️ Ringkasan dan laporan membutuhkan ledger lokal (`LEDGER_ENABLED=true`)."
+    
+    def format_processing_message(self, is_image: bool = False, count: int = 1) -> str:
         """Format pesan sedang memproses"""
-        if is_image:
+        if is_image and count > 1:
+            return f"🤖 Sedang menganalisis {count} gambar Anda..."
+        elif is_image:
             return "🤖 Sedang menganalisis gambar Anda..."
         else:
             return "🤖 Sedang menganalisis pesan Anda..."
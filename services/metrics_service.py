@@ -0,0 +1,133 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Batas bucket histogram latency (detik), dari cache hit sampai LLM yang lambat
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    """Histogram kumulatif per kombinasi label (format Prometheus)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts: Dict[LabelKey, list] = {}
+        self.sums: Dict[LabelKey, float] = {}
+
+    def observe(self, labels: LabelKey, value: float):
+        counts = self.counts.setdefault(labels, [0] * (len(self.buckets) + 1))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        counts[-1] += 1  # +Inf
+        self.sums[labels] = self.sums.get(labels, 0.0) + value
+
+class MetricsService:
+    """
+    Metrics in-process untuk setiap tahap pemrosesan pesan.
+
+    Menyimpan counter dan histogram latency per tahap (get_file_url,
+    download_image, llm, save, send_message, ...) dengan label provider dan
+    outcome, lalu menampilkannya dalam format teks Prometheus di `/metrics`.
+    """
+
+    def __init__(self, prefix: str = "finance_bot"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._help: Dict[str, str] = {
+            "stage_duration_seconds": "Latency setiap tahap pemrosesan pesan",
+            "message_duration_seconds": "Latency total pemrosesan satu update Telegram",
+            "extractions_total": "Jumlah ekstraksi transaksi per sumber (fast_path, cache, llm)",
+            "llm_tokens_total": "Jumlah token LLM dari usage response provider",
+            "llm_calls_total": "Jumlah panggilan LLM per provider dan versi prompt",
+            "structured_output_total": "Hasil parse response LLM (valid, repaired, reask, invalid)",
+            "category_index_total": "Validasi hasil LLM dengan indeks kategori (filled, agree, disagree)"
+        }
+
+    def _key(self, labels: Dict[str, Optional[str]]) -> LabelKey:
+        return tuple(sorted((name, str(value if value is not None else "")) for name, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        """Menambah counter"""
+        with self._lock:
+            counter = self._counters.setdefault(name, {})
+            key = self._key(labels)
+            counter[key] = counter.get(key, 0.0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Mencatat satu nilai ke histogram"""
+        with self._lock:
+            histogram = self._histograms.setdefault(name, Histogram())
+            histogram.observe(self._key(labels), seconds)
+
+    @contextmanager
+    def timer(self, stage: str, provider: str = "", **labels):
+        """
+        Mengukur durasi satu tahap.
+
+        Outcome default "success", atau "error" jika terjadi exception. Blok
+        bisa mengubah label lewat dict yang di-yield, misalnya
+        `timing["outcome"] = "empty"` atau `timing["provider"] = "gemini"`.
+        """
+        timing = {"provider": provider, "outcome": "success", **labels}
+        started = time.perf_counter()
+        try:
+            yield timing
+        except BaseException:
+            timing["outcome"] = "error"
+            raise
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - started, stage=stage, **timing)
+
+    def record_tokens(self, provider: str, prompt_tokens: Optional[int], completion_tokens: Optional[int],
+                      cached_tokens: Optional[int] = None):
+        """Mencatat pemakaian token dari response OpenAI/Gemini (cached termasuk dalam prompt)"""
+        if prompt_tokens:
+            self.inc("llm_tokens_total", prompt_tokens, provider=provider, kind="prompt")
+        if cached_tokens:
+            self.inc("llm_tokens_total", cached_tokens, provider=provider, kind="cached")
+        if completion_tokens:
+            self.inc("llm_tokens_total", completion_tokens, provider=provider, kind="completion")
+
+    def _format_labels(self, key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(key) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escaped = []
+        for name, value in pairs:
+            value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            escaped.append(f'{name}="{value}"')
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self) -> str:
+        """Semua metrics dalam format teks Prometheus (text/plain; version=0.0.4)"""
+        lines = []
+        with self._lock:
+            for name, counter in sorted(self._counters.items()):
+                full_name = f"{self.prefix}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} counter")
+                for key, value in sorted(counter.items()):
+                    value_text = str(int(value)) if value.is_integer() else repr(value)
+                    lines.append(f"{full_name}{self._format_labels(key)} {value_text}")
+
+            for name, histogram in sorted(self._histograms.items()):
+                full_name = f"{self.prefix}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} histogram")
+                for key, counts in sorted(histogram.counts.items()):
+                    for bound, count in zip(histogram.buckets, counts):
+                        lines.append(f"{full_name}_bucket{self._format_labels(key, ('le', f'{bound:g}'))} {count}")
+                    lines.append(f"{full_name}_bucket{self._format_labels(key, ('le', '+Inf'))} {counts[-1]}")
+                    lines.append(f"{full_name}_sum{self._format_labels(key)} {histogram.sums[key]:.6f}")
+                    lines.append(f"{full_name}_count{self._format_labels(key)} {counts[-1]}")
+        return "\n".join(lines) + "\n"
+
+# Metrics bersama untuk semua service
+metrics = MetricsService()
@@ -0,0 +1,110 @@
+from typing import Any, Dict, List, Optional
+from config import settings
+from .metrics_service import metrics
+
+OUTPUT_TEMPLATE = """
+Format JSON:
+{
+  "prompt_text": "teks yang diberikan atau deskripsi gambar",
+  "category": "kategori transaksi (entertainment, transfer, billings, food, shopping, transport, dll)",
+  "amount": "total jumlah uang (angka saja, tanpa mata uang)",
+  "payment_method": "metode pembayaran (cash, dana, gopay, shopeepay, ovo, bca, bni, dll)",
+  "type": "jenis transaksi (income/expense/transfer)",
+  "summary": "ringkasan singkat transaksi",
+  "items": [
+    {
+      "name": "nama item",
+      "quantity": "jumlah item (angka)",
+      "price": "harga per item (angka)"
+    }
+  ]
+}
+"""
+
+INSTRUCTIONS = """Anda mengekstrak transaksi keuangan dari teks atau gambar (struk, nota, bukti transfer) yang dikirim pengguna Indonesia.
+Berikan HANYA JSON yang valid, tanpa penjelasan tambahan.
+{template}
+Aturan penting:
+1. Untuk amount, gunakan angka saja (contoh: 50000, bukan "Rp 50.000")
+2. Jika tidak ada informasi spesifik, gunakan nilai default yang masuk akal
+3. Items hanya diisi jika ada daftar pembelian yang jelas (seperti struk belanja)
+4. Category harus spesifik (contoh: food, transport, entertainment, shopping, transfer, billings)
+5. Type: "expense" untuk pengeluaran, "income" untuk pemasukan, "transfer" untuk transfer antar akun
+6. Jika pesan berisi beberapa teks bernomor [1], [2], ..., analisis SETIAP teks secara terpisah dan berikan JSON dengan field "transactions" berupa JSON array, satu objek per teks dengan urutan yang sama, dan field "index" (angka) sesuai nomor teks
+"""
+
+class PromptService:
+    """
+    Prompt ekstraksi transaksi bersama untuk semua AI provider.
+
+    Instruksi statis dikirim sebagai prefix yang sama persis di setiap
+    panggilan (system message OpenAI / `system_instruction` Gemini), sedangkan
+    teks atau gambar pengguna hanya ada di bagian akhir. Dengan begitu prompt
+    caching di sisi provider bisa memakai ulang prefix tersebut. Service ini
+    juga mencatat token prompt, cached dan completion setiap panggilan.
+    """
+
+    # Naikkan setiap kali prompt berubah agar cache ekstraksi tidak basi
+    version = "3"
+
+    def __init__(self):
+        self._system_prompt: Optional[str] = None
+        self._usage: Dict[str, Dict[str, int]] = {}
+
+    def system_prompt(self) -> str:
+        """
+        Prefix statis (instruksi). Contoh format JSON hanya disertakan jika
+        structured output nonaktif; jika aktif, schema sudah dikirim terpisah.
+        """
+        if self._system_prompt is None:
+            template = "" if settings.structured_output_enabled else OUTPUT_TEMPLATE
+            self._system_prompt = INSTRUCTIONS.format(template=template)
+        return self._system_prompt
+
+    def text_prompt(self, text: str) -> str:
+        """Bagian dinamis untuk pesan teks"""
+        return f"Teks: {text}"
+
+    def image_prompt(self, caption: Optional[str] = None) -> str:
+        """Bagian dinamis untuk gambar (dengan caption jika ada)"""
+        if caption:
+            return f"Teks: {caption}\nGambar: [Gambar terlampir]"
+        return "Gambar: [Gambar terlampir]"
+
+    def batch_prompt(self, texts: List[str]) -> str:
+        """Bagian dinamis untuk beberapa teks sekaligus (aturan batch ada di prefix)"""
+        prompt = f"Terdapat {len(texts)} teks transaksi TERPISAH, berikan JSON array berisi {len(texts)} objek.\n"
+        for index, text in enumerate(texts, start=1):
+            prompt += f"\n[{index}] {text}"
+        return prompt
+
+    def record_usage(self, provider: str, prompt_tokens: Optional[int], completion_tokens: Optional[int],
+                     cached_tokens: Optional[int] = None):
+        """Mencatat token satu panggilan (cached adalah bagian dari prompt yang diambil dari cache provider)"""
+        usage = self._usage.setdefault(provider, {"calls": 0, "prompt": 0, "cached": 0, "completion": 0})
+        usage["calls"] += 1
+        usage["prompt"] += prompt_tokens or 0
+        usage["cached"] += cached_tokens or 0
+        usage["completion"] += completion_tokens or 0
+        metrics.record_tokens(provider, prompt_tokens, completion_tokens, cached_tokens)
+        metrics.inc("llm_calls_total", provider=provider, prompt_version=self.version)
+
+    def stats(self) -> Dict[str, Any]:
+        """Rata-rata token per panggilan dan rasio prompt yang kena cache, per provider"""
+        providers = {}
+        for provider, usage in self._usage.items():
+            calls = usage["calls"] or 1
+            providers[provider] = {
+                **usage,
+                "avg_prompt": round(usage["prompt"] / calls, 1),
+                "avg_completion": round(usage["completion"] / calls, 1),
+                "cached_ratio": round(usage["cached"] / usage["prompt"], 3) if usage["prompt"] else 0.0
+            }
+        return {
+            "version": self.version,
+            "system_prompt_chars": len(self.system_prompt()),
+            "providers": providers
+        }
+
+# Instance global bersama untuk kedua AI service
+prompts = PromptService()
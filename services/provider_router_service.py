@@ -0,0 +1,216 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from config import settings
+from .metrics_service import metrics
+
+AICall = Callable[[Any], Awaitable[Dict[str, Any]]]
+
+class ProviderStats:
+    """Statistik latency/error bergulir dan status circuit breaker satu provider"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window: int):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return round(self.outcomes.count(False) / len(self.outcomes), 4)
+
+    def allows_request(self) -> bool:
+        """Apakah circuit breaker mengizinkan request ke provider ini"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= settings.breaker_cooldown:
+            # Setelah cooldown, izinkan satu request percobaan
+            self.state = self.HALF_OPEN
+        return self.state == self.HALF_OPEN and not self.trial_in_flight
+
+    def record(self, success: bool, latency: float):
+        self.latencies.append(latency)
+        self.outcomes.append(success)
+        self.trial_in_flight = False
+        if success:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= settings.breaker_failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+class ProviderRouterService:
+    """
+    Router AI provider yang sadar latency.
+
+    Menyimpan statistik latency dan error untuk setiap provider, membuka
+    circuit breaker untuk provider yang terus gagal, melakukan failover ke
+    provider lain, dan (opsional) mengirim request hedging ke provider kedua
+    jika provider pertama melewati p95 latency-nya.
+
+    `providers` berisi fungsi pembuat service per provider, sehingga provider
+    cadangan baru dibuat saat pertama kali benar-benar dipakai.
+    """
+
+    def __init__(self, providers: Dict[str, Callable[[], Any]]):
+        self.providers = providers
+        self.stats = {name: ProviderStats(settings.router_latency_window) for name in providers}
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._failovers = 0
+
+    def is_configured(self, name: str) -> bool:
+        """Provider hanya dipakai jika API key-nya tersedia"""
+        if name == "chatgpt":
+            return bool(settings.OPENAI_API_KEY)
+        if name == "gemini":
+            return bool(settings.GEMINI_API_KEY)
+        return True
+
+    def candidates(self) -> List[str]:
+        """Urutan provider yang akan dicoba: provider aktif dulu, lalu cadangan"""
+        primary = "gemini" if settings.ai_provider.lower() == "gemini" else "chatgpt"
+        ordered = [primary] + [name for name in self.providers if name != primary]
+        available = [
+            name for name in ordered
+            if name in self.providers and self.is_configured(name) and self.stats[name].allows_request()
+        ]
+        # Semua breaker terbuka: tetap coba provider aktif daripada langsung gagal
+        return available or [primary]
+
+    def is_valid(self, result: Any) -> bool:
+        return isinstance(result, dict) and "error" not in result
+
+    def hedge_delay(self, name: str) -> Optional[float]:
+        """Batas waktu sebelum request hedging dikirim (p95 provider pertama)"""
+        stats = self.stats[name]
+        if len(stats.latencies) < settings.router_hedge_min_samples:
+            return None
+        return max(stats.percentile(95), settings.router_hedge_min_delay)
+
+    async def _timed_call(self, name: str, call: AICall) -> Dict[str, Any]:
+        stats = self.stats[name]
+        if stats.state == ProviderStats.HALF_OPEN:
+            stats.trial_in_flight = True
+        started = time.monotonic()
+        try:
+            result = await call(self.providers[name]())
+        except asyncio.CancelledError:
+            stats.trial_in_flight = False
+            raise
+        except Exception as e:
+            result = {"error": str(e)}
+        latency = time.monotonic() - started
+        success = self.is_valid(result)
+        stats.record(success, latency)
+        metrics.observe("stage_duration_seconds", latency, stage="llm", provider=name,
+                        outcome="success" if success else "error")
+        return result
+
+    async def call(self, call: AICall) -> Dict[str, Any]:
+        """Menjalankan `call(ai_service)` pada provider terbaik yang tersedia"""
+        _, result = await self.call_with_provider(call)
+        return result
+
+    async def call_with_provider(self, call: AICall) -> Tuple[str, Dict[str, Any]]:
+        """
+        Seperti `call`, tetapi juga mengembalikan nama provider yang benar-benar
+        menjawab (bisa provider cadangan setelah failover atau hedging).
+        """
+        candidates = self.candidates()
+        primary = candidates[0]
+        secondary = candidates[1] if len(candidates) > 1 else None
+
+        delay = self.hedge_delay(primary) if settings.router_hedging_enabled and secondary else None
+        if delay is None:
+            result = await self._timed_call(primary, call)
+            if self.is_valid(result) or not secondary or not settings.router_failover:
+                return primary, result
+            self._failovers += 1
+            print(f"⚠️ Provider {primary} gagal, failover ke {secondary}")
+            fallback = await self._timed_call(secondary, call)
+            return (secondary, fallback) if self.is_valid(fallback) else (primary, result)
+
+        return await self._hedged_call(primary, secondary, call, delay)
+
+    async def _hedged_call(self, primary: str, secondary: str, call: AICall,
+                           delay: float) -> Tuple[str, Dict[str, Any]]:
+        """Kirim ke provider kedua jika provider pertama lebih lambat dari p95, ambil hasil valid tercepat"""
+        first = asyncio.create_task(self._timed_call(primary, call))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+
+        if done:
+            result = first.result()
+            if self.is_valid(result) or not settings.router_failover:
+                return primary, result
+            self._failovers += 1
+            fallback = await self._timed_call(secondary, call)
+            return (secondary, fallback) if self.is_valid(fallback) else (primary, result)
+
+        self._hedged += 1
+        second = asyncio.create_task(self._timed_call(secondary, call))
+        names = {first: primary, second: secondary}
+        pending = {first, second}
+        results = {}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results[task] = task.result()
+                    if self.is_valid(results[task]):
+                        if task is second:
+                            self._hedge_wins += 1
+                        return names[task], results[task]
+        finally:
+            for task in pending:
+                task.cancel()
+
+        # Keduanya gagal: kembalikan error dari provider pertama
+        return primary, results[first]
+
+    def state(self) -> Dict[str, Any]:
+        """Status routing saat ini untuk endpoint /ai-provider"""
+        providers = {}
+        for name, stats in self.stats.items():
+            p50 = stats.percentile(50)
+            p95 = stats.percentile(95)
+            providers[name] = {
+                "configured": self.is_configured(name),
+                "circuit": stats.state,
+                "p50_ms": round(p50 * 1000) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000) if p95 is not None else None,
+                "error_rate": stats.error_rate(),
+                "successes": stats.successes,
+                "failures": stats.failures,
+                "consecutive_failures": stats.consecutive_failures
+            }
+        return {
+            "order": self.candidates(),
+            "failover": settings.router_failover,
+            "hedging": settings.router_hedging_enabled,
+            "hedged_requests": self._hedged,
+            "hedge_wins": self._hedge_wins,
+            "failovers": self._failovers,
+            "providers": providers
+        }
@@ -0,0 +1,178 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Mapping, Optional
+from config import settings
+
+class TokenBucket:
+    """Token bucket async: request menunggu (bukan gagal) sampai token tersedia"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # token per detik
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """Ambil token, menunggu jika perlu. Mengembalikan lama menunggu (detik)"""
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= tokens:
+                        self.tokens -= tokens
+                        return waited
+                    delay = (tokens - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def pause(self, seconds: float):
+        """Hentikan pengambilan token selama `seconds` detik (misalnya setelah 429)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+class RateLimiterService:
+    """
+    Service rate limiting bersama untuk semua API keluar.
+
+    Setiap upstream (OpenAI, Gemini, Sheets, Telegram global dan per chat)
+    punya token bucket dan semaphore konkurensi sendiri. Header rate limit
+    dan `retry_after` dari upstream dipakai untuk menjeda bucket, sehingga
+    burst diantrikan mendekati kuota tanpa berubah menjadi rentetan 429.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[str, TokenBucket] = {
+            "openai": TokenBucket(settings.openai_rpm / 60, settings.openai_rpm / 10),
+            "openai_tokens": TokenBucket(settings.openai_tpm / 60, settings.openai_tpm / 10),
+            "gemini": TokenBucket(settings.gemini_rpm / 60, settings.gemini_rpm / 10),
+            "sheets": TokenBucket(settings.sheets_writes_per_minute / 60, settings.sheets_writes_per_minute / 10),
+            "telegram": TokenBucket(settings.telegram_global_per_second, settings.telegram_global_per_second)
+        }
+        self.concurrency = {
+            "openai": settings.openai_max_concurrency,
+            "gemini": settings.gemini_max_concurrency,
+            "sheets": settings.sheets_max_concurrency,
+            "telegram": settings.telegram_max_connections
+        }
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._chat_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._waits: Dict[str, int] = {}
+        self._wait_seconds: Dict[str, float] = {}
+        self._throttled: Dict[str, int] = {}
+
+    def get_semaphore(self, upstream: str) -> asyncio.Semaphore:
+        if upstream not in self._semaphores:
+            self._semaphores[upstream] = asyncio.Semaphore(self.concurrency[upstream])
+        return self._semaphores[upstream]
+
+    def get_chat_bucket(self, chat_id: int) -> TokenBucket:
+        """Bucket per chat Telegram (grup punya id negatif dan limit lebih ketat)"""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:
+                bucket = TokenBucket(settings.telegram_group_per_minute / 60, 3)
+            else:
+                bucket = TokenBucket(settings.telegram_chat_per_second, 3)
+            self._chat_buckets[chat_id] = bucket
+            while len(self._chat_buckets) > 10000:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def _record_wait(self, upstream: str, waited: float):
+        if waited > 0:
+            self._waits[upstream] = self._waits.get(upstream, 0) + 1
+            self._wait_seconds[upstream] = self._wait_seconds.get(upstream, 0.0) + waited
+
+    @asynccontextmanager
+    async def limit(self, upstream: str, chat_id: Optional[int] = None, tokens: Optional[float] = None):
+        """
+        Context manager untuk satu request ke upstream.
+
+        Token per chat diambil lebih dulu, di luar semaphore, agar chat yang
+        sedang dibatasi tidak menahan slot konkurensi dan token global milik
+        chat lain. Setelah itu menunggu slot konkurensi dan token (request dan
+        token LLM) sebelum masuk ke blok `async with`.
+        """
+        if chat_id is not None:
+            self._record_wait("telegram_chat", await self.get_chat_bucket(chat_id).acquire())
+        async with self.get_semaphore(upstream):
+            self._record_wait(upstream, await self.buckets[upstream].acquire())
+            if tokens and upstream == "openai":
+                self._record_wait("openai_tokens", await self.buckets["openai_tokens"].acquire(tokens))
+            yield
+
+    def penalize(self, upstream: str, retry_after: Optional[float] = None, chat_id: Optional[int] = None):
+        """Jeda upstream setelah menerima 429"""
+        seconds = retry_after if retry_after else settings.rate_limit_default_backoff
+        self._throttled[upstream] = self._throttled.get(upstream, 0) + 1
+        if chat_id is not None:
+            self.get_chat_bucket(chat_id).pause(seconds)
+        else:
+            self.buckets[upstream].pause(seconds)
+        print(f"⏳ Rate limit {upstream}{f' chat {chat_id}' if chat_id is not None else ''}, jeda {seconds:.1f} detik")
+
+    def parse_duration(self, value: Optional[str]) -> Optional[float]:
+        """Parse durasi seperti "20", "1.5s", "6m0s" atau "250ms" menjadi detik"""
+        if not value:
+            return None
+        value = value.strip()
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        total = 0.0
+        matched = False
+        for amount, unit in re.findall(r"([\d.]+)(ms|s|m|h)", value):
+            matched = True
+            total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+        return total if matched else None
+
+    def update_from_headers(self, upstream: str, headers: Mapping[str, str]):
+        """
+        Adaptasi dari header rate limit (format OpenAI `x-ratelimit-*`).
+
+        Jika sisa request/token habis, bucket dijeda sampai waktu reset.
+        """
+        retry_after = self.parse_duration(headers.get("retry-after"))
+        if retry_after:
+            self.buckets[upstream].pause(retry_after)
+            return
+
+        for kind, bucket_name in (("requests", upstream), ("tokens", f"{upstream}_tokens")):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = self.parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining is None or reset is None or bucket_name not in self.buckets:
+                continue
+            try:
+                if int(float(remaining)) <= 0:
+                    self.buckets[bucket_name].pause(reset)
+            except ValueError:
+                continue
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistik antrian rate limit untuk monitoring"""
+        return {
+            "waits": dict(self._waits),
+            "wait_seconds": {name: round(value, 3) for name, value in self._wait_seconds.items()},
+            "throttled": dict(self._throttled),
+            "chat_buckets": len(self._chat_buckets)
+        }
+
+# Rate limiter bersama untuk semua service
+rate_limiter = RateLimiterService()
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+from config import settings
+from .thread_pool_service import thread_pool
+from .metrics_service import metrics
+
+class SheetsReplicatorService:
+    """
+    Replikasi ledger lokal ke Google Sheets di latar belakang.
+
+    Menyimpan high-water mark (id ledger terakhir yang sudah tersalin) sehingga
+    gangguan atau latency Google Sheets tidak pernah menahan balasan ke user;
+    baris yang tertunda akan disalin pada sinkronisasi berikutnya.
+    """
+
+    NAME = "google_sheets"
+
+    def __init__(self, ledger, get_sheets: Callable[[], Any]):
+        self.ledger = ledger
+        self._get_sheets = get_sheets
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._replicated = 0
+        self._failures = 0
+        self._last_error: Optional[str] = None
+        self._last_sync: Optional[float] = None
+
+    @property
+    def sheets(self):
+        """GoogleSheetsService baru dibuat (dan gspread diimport) saat replikasi pertama"""
+        return self._get_sheets()
+
+    def notify(self):
+        """Memberi tahu replicator bahwa ada baris baru di ledger"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        """Menjalankan loop replikasi (dipanggil saat startup aplikasi)"""
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Sinkronisasi terakhir lalu hentikan loop replikasi"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def sync_once(self) -> int:
+        """Salin satu batch baris baru ke Google Sheets, mengembalikan jumlah baris"""
+        high_water_mark = await thread_pool.run(self.ledger.get_high_water_mark, self.NAME)
+        transactions = await thread_pool.run(
+            self.ledger.fetch_after, high_water_mark, settings.replication_batch_size
+        )
+        if not transactions:
+            return 0
+
+        # Satu append per worksheet shard (per chat/bulan jika sharding aktif)
+        groups: Dict[Optional[str], List[Dict[str, Any]]] = {}
+        for transaction in transactions:
+            shard = self.sheets.shard_for(transaction.get("chat_id"), transaction.get("timestamp"))
+            groups.setdefault(shard, []).append(transaction)
+
+        written = 0
+        with metrics.timer("sheets_replication", provider="sheets"):
+            for shard, group in groups.items():
+                written += await self._sync_shard(shard, group)
+
+        await thread_pool.run(self.ledger.set_high_water_mark, self.NAME, transactions[-1]["id"])
+        self._replicated += written
+        self._last_sync = time.time()
+        return len(transactions)
+
+    async def _sync_shard(self, shard: Optional[str], transactions: List[Dict[str, Any]]) -> int:
+        """
+        Menulis baris satu shard.
+
+        Setiap shard punya mark sendiri, sehingga jika shard lain dalam batch
+        yang sama gagal, shard yang sudah tertulis tidak diduplikasi saat retry.
+        """
+        if shard is None:
+            rows = [self.sheets.build_row(transaction) for transaction in transactions]
+            await self.sheets.write_rows(rows)
+            return len(rows)
+
+        mark_name = f"{self.NAME}:{shard}"
+        shard_mark = await thread_pool.run(self.ledger.get_high_water_mark, mark_name)
+        rows = [self.sheets.build_row(transaction) for transaction in transactions if transaction["id"] > shard_mark]
+        if rows:
+            await self.sheets.write_rows(rows, shard)
+            await thread_pool.run(self.ledger.set_high_water_mark, mark_name, transactions[-1]["id"])
+        return len(rows)
+
+    async def _run(self):
+        backoff = settings.replication_interval
+        while True:
+            try:
+                # Salin semua batch yang tertunda
+                while await self.sync_once() >= settings.replication_batch_size:
+                    pass
+                self._last_error = None
+                backoff = settings.replication_interval
+            except Exception as e:
+                self._failures += 1
+                self._last_error = str(e)
+                backoff = min(backoff * 2, settings.replication_max_backoff)
+                print(f"⚠️ Replikasi Google Sheets gagal, dicoba lagi dalam {backoff:.0f} detik: {e}")
+
+            if self._stopping:
+                break
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=backoff)
+                # Beri jeda singkat agar transaksi yang datang bersamaan ikut satu batch
+                if not self._stopping:
+                    await asyncio.sleep(settings.sheets_flush_interval)
+            except asyncio.TimeoutError:
+                # Idle: manfaatkan untuk mengurutkan sheet (terbaru di atas)
+                try:
+                    await self.sheets.run_write(self.sheets.sort_if_pending)
+                except Exception as e:
+                    print(f"⚠️ Gagal mengurutkan Google Sheets: {e}")
+            self._wakeup.clear()
+
+        try:
+            await self.sheets.run_write(self.sheets.sort_if_pending)
+        except Exception as e:
+            print(f"⚠️ Gagal mengurutkan Google Sheets saat shutdown: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Status replikasi untuk monitoring"""
+        try:
+            high_water_mark = self.ledger.get_high_water_mark(self.NAME)
+            lag = self.ledger.max_id() - high_water_mark
+        except Exception:
+            high_water_mark, lag = None, None
+        return {
+            "running": self._task is not None,
+            "high_water_mark": high_water_mark,
+            "lag": lag,
+            "replicated": self._replicated,
+            "failures": self._failures,
+            "last_error": self._last_error,
+            "last_sync": self._last_sync
+        }
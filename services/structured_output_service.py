@@ -0,0 +1,242 @@
+import ast
+import copy
+import json
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError
+from config import settings
+from schemas.models import IndexedTransactionExtraction, TransactionExtraction, TransactionExtractionBatch
+from .metrics_service import metrics
+
+class StructuredOutputService:
+    """
+    Service untuk structured output ekstraksi transaksi.
+
+    Membuat JSON schema untuk mode structured output OpenAI (`json_schema`) dan
+    Gemini (`response_schema`) dari model pydantic di `schemas/models.py`, lalu
+    memvalidasi response LLM dengan model yang sama. Response yang rusak
+    (markdown fence, prosa tambahan, koma berlebih) diperbaiki lokal dulu
+    sebelum pemanggil perlu bertanya ulang ke LLM.
+    """
+
+    FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+    TRAILING_COMMA = re.compile(r",\s*([}\]])")
+    SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+    def __init__(self):
+        self._openai_formats: Dict[str, Dict[str, Any]] = {}
+        self._gemini_schemas: Dict[str, Dict[str, Any]] = {}
+        self._decoder = json.JSONDecoder()
+
+    def _inline_refs(self, schema: Any, defs: Dict[str, Any]) -> Any:
+        """JSON schema pydantic tanpa $ref/$defs, title dan default"""
+        if isinstance(schema, list):
+            return [self._inline_refs(value, defs) for value in schema]
+        if not isinstance(schema, dict):
+            return schema
+        if "$ref" in schema:
+            return self._inline_refs(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+        return {
+            key: self._inline_refs(value, defs)
+            for key, value in schema.items()
+            if key not in ("$defs", "title", "default")
+        }
+
+    def _base_schema(self, model: Type[BaseModel]) -> Dict[str, Any]:
+        schema = model.model_json_schema()
+        return self._inline_refs(schema, schema.get("$defs", {}))
+
+    def _split_nullable(self, schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Skema non-null dari `anyOf: [X, null]` (Optional), atau None jika bukan Optional"""
+        options = schema.get("anyOf")
+        if not options:
+            return None
+        non_null = [option for option in options if option.get("type") != "null"]
+        if len(non_null) != 1:
+            return None
+        merged = {key: value for key, value in schema.items() if key != "anyOf"}
+        merged.update(non_null[0])
+        return merged
+
+    def _to_openai(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Mode strict OpenAI: semua field wajib, Optional menjadi tipe nullable"""
+        nullable = self._split_nullable(schema)
+        if nullable is not None:
+            converted = self._to_openai(nullable)
+            converted["type"] = [converted["type"], "null"]
+            return converted
+
+        schema = dict(schema)
+        if "properties" in schema:
+            schema["properties"] = {name: self._to_openai(value) for name, value in schema["properties"].items()}
+            schema["required"] = list(schema["properties"])
+            schema["additionalProperties"] = False
+        if "items" in schema:
+            schema["items"] = self._to_openai(schema["items"])
+        return schema
+
+    def _to_gemini(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Subset OpenAPI Gemini: `nullable`, enum string dengan format "enum", tanpa additionalProperties"""
+        nullable = self._split_nullable(schema)
+        if nullable is not None:
+            converted = self._to_gemini(nullable)
+            converted["nullable"] = True
+            return converted
+
+        schema = {key: value for key, value in schema.items() if key != "additionalProperties"}
+        if "properties" in schema:
+            schema["properties"] = {name: self._to_gemini(value) for name, value in schema["properties"].items()}
+            schema["required"] = list(schema["properties"])
+        if "items" in schema:
+            schema["items"] = self._to_gemini(schema["items"])
+        if "enum" in schema:
+            schema["format"] = "enum"
+        return schema
+
+    def openai_response_format(self, batch: bool = False) -> Dict[str, Any]:
+        """Parameter `response_format` chat completions (json_schema strict)"""
+        model = TransactionExtractionBatch if batch else TransactionExtraction
+        if model.__name__ not in self._openai_formats:
+            self._openai_formats[model.__name__] = {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": model.__name__,
+                    "strict": True,
+                    "schema": self._to_openai(self._base_schema(model))
+                }
+            }
+        return self._openai_formats[model.__name__]
+
+    def gemini_generation_config(self, batch: bool = False) -> Dict[str, Any]:
+        """`generation_config` Gemini dengan response_schema dan MIME application/json"""
+        model = TransactionExtractionBatch if batch else TransactionExtraction
+        if model.__name__ not in self._gemini_schemas:
+            self._gemini_schemas[model.__name__] = self._to_gemini(self._base_schema(model))
+        return {
+            "response_mime_type": "application/json",
+            # SDK mengubah dict schema ke proto, jadi berikan salinan agar cache tetap utuh
+            "response_schema": copy.deepcopy(self._gemini_schemas[model.__name__])
+        }
+
+    def _decode_from(self, text: str) -> Any:
+        """Decode JSON pertama di dalam teks, mengabaikan prosa sebelum dan sesudahnya"""
+        starts = [index for index in (text.find("{"), text.find("[")) if index >= 0]
+        if not starts:
+            raise ValueError("Response tidak berisi JSON")
+        data, _ = self._decoder.raw_decode(text, min(starts))
+        return data
+
+    def repair(self, text: str) -> Any:
+        """
+        Perbaikan murah untuk JSON yang hampir valid.
+
+        Menangani markdown fence, prosa di sekitar JSON, tanda kutip miring,
+        koma sebelum penutup, dan literal gaya Python (kutip tunggal, True/None).
+        Melempar ValueError jika tetap tidak bisa dibaca.
+        """
+        fenced = self.FENCE.search(text)
+        if fenced:
+            text = fenced.group(1)
+        text = text.strip().translate(self.SMART_QUOTES)
+
+        for candidate in (text, self.TRAILING_COMMA.sub(r"\1", text)):
+            try:
+                return self._decode_from(candidate)
+            except ValueError:
+                continue
+
+        # Literal Python: {'amount': 5000, 'items': None}
+        starts = [index for index in (text.find("{"), text.find("[")) if index >= 0]
+        ends = [index for index in (text.rfind("}"), text.rfind("]")) if index >= 0]
+        if starts and ends:
+            try:
+                return ast.literal_eval(text[min(starts):max(ends) + 1])
+            except (ValueError, SyntaxError):
+                pass
+        raise ValueError("JSON tidak bisa diperbaiki")
+
+    def load(self, text: str) -> Tuple[Any, bool]:
+        """Parse response LLM, mengembalikan (data, diperbaiki)"""
+        try:
+            return json.loads(text), False
+        except (TypeError, ValueError):
+            return self.repair(text or ""), True
+
+    def parse_transaction(self, provider: str, text: str) -> Dict[str, Any]:
+        """
+        Parse dan validasi response ekstraksi satu transaksi.
+
+        Angka berbentuk string dikonversi oleh model. Melempar ValueError jika
+        response tidak bisa dipakai sehingga pemanggil bisa bertanya ulang.
+        """
+        try:
+            data, repaired = self.load(text)
+            if isinstance(data, list) and len(data) == 1:
+                data = data[0]
+            result = TransactionExtraction.model_validate(data).model_dump()
+        except (ValueError, ValidationError) as e:
+            metrics.inc("structured_output_total", provider=provider, outcome="invalid")
+            raise ValueError(f"Response {provider} tidak valid: {e}") from e
+
+        metrics.inc("structured_output_total", provider=provider, outcome="repaired" if repaired else "valid")
+        return result
+
+    def parse_batch(self, provider: str, text: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Parse response batch menjadi list hasil dengan field "index".
+
+        Item yang tidak valid dibuang (akan diproses ulang satu per satu oleh
+        pemanggil); None jika response sama sekali tidak bisa dibaca.
+        """
+        try:
+            data, repaired = self.load(text)
+        except ValueError as e:
+            metrics.inc("structured_output_total", provider=provider, outcome="invalid")
+            print(f"JSON batch {provider} tidak valid: {e}")
+            return None
+
+        if isinstance(data, dict):
+            data = data.get("transactions")
+        if not isinstance(data, list):
+            metrics.inc("structured_output_total", provider=provider, outcome="invalid")
+            return None
+
+        results = []
+        for position, item in enumerate(data, start=1):
+            if isinstance(item, dict) and "index" not in item:
+                item = dict(item, index=position)
+            try:
+                results.append(IndexedTransactionExtraction.model_validate(item).model_dump())
+            except (ValueError, ValidationError):
+                continue
+
+        metrics.inc("structured_output_total", provider=provider, outcome="repaired" if repaired else "valid")
+        return results
+
+    async def parse_or_reask(self, provider: str, response_text: str,
+                             reask: Callable[[str], Awaitable[str]]) -> Dict[str, Any]:
+        """
+        Validasi response satu transaksi; jika perbaikan lokal gagal, minta
+        provider memperbaiki response-nya sekali (prompt teks singkat tanpa gambar).
+        """
+        try:
+            return self.parse_transaction(provider, response_text)
+        except ValueError as e:
+            if not settings.structured_output_reask:
+                raise
+            print(f"⚠️ {e}, meminta {provider} memperbaiki response")
+            metrics.inc("structured_output_total", provider=provider, outcome="reask")
+            return self.parse_transaction(provider, await reask(self.reask_prompt(response_text, str(e))))
+
+    def reask_prompt(self, response_text: str, error: str) -> str:
+        """Prompt singkat (tanpa gambar) untuk meminta LLM memperbaiki response-nya sendiri"""
+        return (
+            "Response berikut seharusnya JSON transaksi keuangan yang valid, tetapi gagal dibaca "
+            f"({error}).\n\nPerbaiki dan berikan HANYA JSON yang valid dengan field prompt_text, "
+            "category, amount (angka), payment_method, type (income/expense/transfer), summary "
+            "dan items (name, quantity, price).\n\nResponse sebelumnya:\n"
+            f"{response_text[:4000]}"
+        )
+
+# Instance global bersama untuk kedua AI service
+structured_output = StructuredOutputService()
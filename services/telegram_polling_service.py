@@ -0,0 +1,210 @@
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from config import settings
+from .telegram_service import TelegramService
+
+UpdateHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+class TelegramPollingService:
+    """
+    Service untuk menerima update lewat long-polling getUpdates (alternatif webhook).
+
+    Update diambil per batch lalu diproses bersamaan oleh `handler` yang sama
+    dengan webhook. Update dari chat yang sama tetap diproses berurutan. Offset
+    yang disimpan ke file hanya maju sampai update tertinggi yang semua update
+    sebelumnya sudah selesai, sehingga update yang belum selesai saat proses
+    mati diambil ulang setelah restart.
+    """
+
+    def __init__(self, telegram: TelegramService, handler: UpdateHandler,
+                 concurrency: Optional[int] = None, offset_path: Optional[str] = None):
+        self.telegram = telegram
+        self.handler = handler
+        self.concurrency = concurrency or settings.polling_concurrency
+        self.offset_path = offset_path if offset_path is not None else settings.polling_offset_path
+        self.offset: Optional[int] = None  # offset getUpdates berikutnya
+        self.committed_offset: Optional[int] = None  # offset yang aman disimpan
+        self._pending_ids: "OrderedDict[int, bool]" = OrderedDict()  # update_id -> selesai
+        self._task: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._chat_tails: Dict[Any, asyncio.Task] = {}
+        self._in_flight: set = set()
+        self._running = False
+        self._polls = 0
+        self._received = 0
+        self._processed = 0
+        self._failed = 0
+        self._poll_errors = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    def load_offset(self):
+        """Memuat offset getUpdates dari file (jika ada)"""
+        if not self.offset_path or not os.path.exists(self.offset_path):
+            return
+        try:
+            with open(self.offset_path, "r", encoding="utf-8") as f:
+                self.offset = json.load(f).get("offset")
+            self.committed_offset = self.offset
+            print(f"📥 Offset polling dimuat: {self.offset}")
+        except Exception as e:
+            print(f"Error loading polling offset: {e}")
+
+    def save_offset(self):
+        """Menyimpan offset yang sudah selesai diproses secara atomik (tulis file sementara lalu rename)"""
+        if not self.offset_path or self.committed_offset is None:
+            return
+        try:
+            directory = os.path.dirname(self.offset_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.offset_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"offset": self.committed_offset}, f)
+            os.replace(tmp_path, self.offset_path)
+        except Exception as e:
+            print(f"Error saving polling offset: {e}")
+
+    async def start(self):
+        """Menghapus webhook lalu menjalankan loop long-polling"""
+        if self._running:
+            return
+
+        self.load_offset()
+        # getUpdates ditolak Telegram selama webhook masih terpasang
+        await self.telegram.delete_webhook()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._running = True
+        self._task = asyncio.create_task(self._run())
+        print(f"📡 Long-polling getUpdates berjalan ({self.concurrency} update bersamaan)")
+
+    async def _run(self):
+        """Loop utama: ambil batch update lalu jadwalkan pemrosesannya"""
+        backoff = 1.0
+        while self._running:
+            # Backpressure: jangan ambil batch baru selama semua slot masih terpakai
+            while len(self._in_flight) >= self.concurrency * 2:
+                await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+            try:
+                updates = await self.telegram.get_updates(offset=self.offset)
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._poll_errors += 1
+                print(f"Error polling getUpdates: {e}, coba lagi dalam {backoff:.0f} detik")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+                continue
+
+            self._polls += 1
+            if not updates:
+                continue
+
+            self._received += len(updates)
+            for update in updates:
+                self._dispatch(update)
+
+            # Offset getUpdates maju agar batch yang sama tidak diambil lagi; offset yang
+            # disimpan ke file baru maju setelah update-nya selesai (lihat _complete)
+            self.offset = updates[-1]["update_id"] + 1
+
+    def _chat_key(self, update: Dict[str, Any]) -> Any:
+        message = update.get("message") or {}
+        chat_id = message.get("chat", {}).get("id")
+        return chat_id if chat_id is not None else ("update", update.get("update_id"))
+
+    def _dispatch(self, update: Dict[str, Any]):
+        """Menjadwalkan satu update setelah update sebelumnya dari chat yang sama"""
+        key = self._chat_key(update)
+        update_id = update["update_id"]
+        self._pending_ids[update_id] = False
+        previous = self._chat_tails.get(key)
+        task = asyncio.create_task(self._process(update, previous))
+        self._chat_tails[key] = task
+        self._in_flight.add(task)
+
+        def done(finished: asyncio.Task):
+            self._in_flight.discard(finished)
+            if self._chat_tails.get(key) is finished:
+                del self._chat_tails[key]
+            # Update yang dibatalkan (drain timeout) tidak dianggap selesai
+            if not finished.cancelled():
+                self._complete(update_id)
+
+        task.add_done_callback(done)
+
+    def _complete(self, update_id: int):
+        """Tandai update selesai lalu majukan offset tersimpan sejauh urutannya lengkap"""
+        if update_id not in self._pending_ids:
+            return
+        self._pending_ids[update_id] = True
+
+        committed = None
+        while self._pending_ids:
+            oldest, finished = next(iter(self._pending_ids.items()))
+            if not finished:
+                break
+            self._pending_ids.popitem(last=False)
+            committed = oldest + 1
+
+        if committed is not None:
+            self.committed_offset = committed
+            self.save_offset()
+
+    async def _process(self, update: Dict[str, Any], previous: Optional[asyncio.Task]):
+        if previous is not None:
+            await asyncio.wait([previous])
+        async with self._semaphore:
+            try:
+                await self.handler(update)
+                self._processed += 1
+            except Exception as e:
+                self._failed += 1
+                print(f"Error processing polled update {update.get('update_id')}: {e}")
+
+    async def stop(self, timeout: Optional[float] = None):
+        """Berhenti polling, selesaikan update yang sedang diproses, lalu simpan offset"""
+        if not self._running:
+            return
+
+        self._running = False
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        if timeout is None:
+            timeout = settings.webhook_drain_timeout
+        if self._in_flight:
+            _, pending = await asyncio.wait(set(self._in_flight), timeout=timeout)
+            if pending:
+                print(f"⚠️ Drain polling timeout, {len(pending)} update dibatalkan")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        self.save_offset()
+        print("📡 Long-polling dihentikan")
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistik polling untuk monitoring"""
+        return {
+            "running": self._running,
+            "offset": self.offset,
+            "committed_offset": self.committed_offset,
+            "pending_commit": len(self._pending_ids),
+            "polls": self._polls,
+            "received": self._received,
+            "in_flight": len(self._in_flight),
+            "chats_in_flight": len(self._chat_tails),
+            "processed": self._processed,
+            "failed": self._failed,
+            "poll_errors": self._poll_errors
+        }
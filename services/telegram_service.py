@@ -1,8 +1,10 @@
-import requests
+import asyncio
+import httpx
 import io
-from typing import Optional, Dict, Any
-from PIL import Image
+from typing import Optional, Dict, Any, List
 from config import settings
+from .rate_limiter_service import rate_limiter
+from .metrics_service import metrics
 
 class TelegramService:
     """Service untuk mengelola Telegram Bot API"""
@@ -10,54 +12,177 @@ class TelegramService:
     def __init__(self):
         self.bot_token = settings.TELEGRAM_BOT_TOKEN
         self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
+        self._client: Optional[httpx.AsyncClient] = None
     
-    def send_message(self, chat_id: int, text: str, parse_mode: str = "Markdown") -> Optional[Dict[str, Any]]:
+    def get_client(self) -> httpx.AsyncClient:
+        """Mendapatkan HTTP client async bersama (keep-alive connection pool)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    settings.telegram_timeout,
+                    connect=settings.telegram_connect_timeout
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.telegram_max_connections,
+                    max_keepalive_connections=settings.telegram_max_keepalive_connections
+                )
+            )
+        return self._client
+    
+    async def start(self):
+        """Membuka connection pool (dipanggil saat startup aplikasi)"""
+        self.get_client()
+    
+    async def close(self):
+        """Menutup connection pool (dipanggil saat shutdown aplikasi)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def call_api(self, method: str, payload: Optional[Dict[str, Any]] = None,
+                       chat_id: Optional[int] = None, http_method: str = "POST",
+                       timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Memanggil Bot API melalui rate limiter (global dan per chat).
+        
+        Jika Telegram membalas 429, request dijeda sesuai `retry_after` lalu
+        dicoba ulang, bukan langsung gagal.
+        """
+        url = f"{self.base_url}/{method}"
+        # Timeout khusus (misalnya long-poll getUpdates), selain itu pakai timeout client
+        request_timeout = httpx.Timeout(timeout, connect=settings.telegram_connect_timeout) if timeout else httpx.USE_CLIENT_DEFAULT
+        for attempt in range(settings.rate_limit_max_retries + 1):
+            async with rate_limiter.limit("telegram", chat_id=chat_id):
+                if http_method == "GET":
+                    response = await self.get_client().get(url, timeout=request_timeout)
+                else:
+                    response = await self.get_client().post(url, json=payload, timeout=request_timeout)
+            result = response.json()
+            
+            if response.status_code != 429 or attempt == settings.rate_limit_max_retries:
+                return result
+            retry_after = result.get("parameters", {}).get("retry_after")
+            rate_limiter.penalize("telegram", retry_after, chat_id=chat_id)
+        return result
+    
+    async def send_message(self, chat_id: int, text: str, parse_mode: str = "Markdown") -> Optional[Dict[str, Any]]:
         """Mengirim pesan ke Telegram menggunakan Bot API"""
-        url = f"{self.base_url}/sendMessage"
         payload = {
             "chat_id": chat_id,
             "text": text,
             "parse_mode": parse_mode
         }
         
-        try:
-            response = requests.post(url, json=payload)
-            return response.json()
-        except Exception as e:
-            print(f"Error sending message: {e}")
-            return None
+        with metrics.timer("send_message", provider="telegram") as timing:
+            try:
+                result = await self.call_api("sendMessage", payload, chat_id=chat_id)
+                if not result.get("ok"):
+                    timing["outcome"] = "error"
+                return result
+            except Exception as e:
+                print(f"Error sending message: {e}")
+                timing["outcome"] = "error"
+                return None
     
-    def get_file_url(self, file_id: str) -> Optional[str]:
+    async def send_chat_action(self, chat_id: int, action: str = "typing") -> bool:
+        """Menampilkan indikator aksi (misalnya "typing") selama ±5 detik atau sampai bot membalas"""
+        payload = {"chat_id": chat_id, "action": action}
+        
+        with metrics.timer("send_chat_action", provider="telegram") as timing:
+            try:
+                # Bukan pesan, jadi tidak memakai kuota pesan per chat
+                result = await self.call_api("sendChatAction", payload)
+                if not result.get("ok"):
+                    timing["outcome"] = "error"
+                return bool(result.get("ok"))
+            except Exception as e:
+                print(f"Error sending chat action: {e}")
+                timing["outcome"] = "error"
+                return False
+    
+    async def edit_message_text(self, chat_id: int, message_id: int, text: str,
+                                parse_mode: str = "Markdown") -> Optional[Dict[str, Any]]:
+        """Mengganti isi pesan yang sudah dikirim bot"""
+        payload = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "text": text,
+            "parse_mode": parse_mode
+        }
+        
+        with metrics.timer("edit_message", provider="telegram") as timing:
+            try:
+                result = await self.call_api("editMessageText", payload, chat_id=chat_id)
+                if not result.get("ok"):
+                    timing["outcome"] = "error"
+                return result
+            except Exception as e:
+                print(f"Error editing message: {e}")
+                timing["outcome"] = "error"
+                return None
+    
+    def status(self, chat_id: int, placeholder_text: str) -> "StatusMessage":
+        """Status "sedang memproses" yang nantinya diganti hasil (lihat StatusMessage)"""
+        return StatusMessage(self, chat_id, placeholder_text)
+    
+    async def get_file_url(self, file_id: str) -> Optional[str]:
         """Mendapatkan URL file dari Telegram"""
-        url = f"{self.base_url}/getFile"
         payload = {"file_id": file_id}
         
-        try:
-            response = requests.post(url, json=payload)
-            result = response.json()
-            
-            if result.get("ok"):
-                file_path = result["result"]["file_path"]
-                file_url = f"https://api.telegram.org/file/bot{self.bot_token}/{file_path}"
-                return file_url
-            return None
-        except Exception as e:
-            print(f"Error getting file URL: {e}")
-            return None
+        with metrics.timer("get_file_url", provider="telegram") as timing:
+            try:
+                result = await self.call_api("getFile", payload)
+                
+                if result.get("ok"):
+                    file_path = result["result"]["file_path"]
+                    file_url = f"https://api.telegram.org/file/bot{self.bot_token}/{file_path}"
+                    return file_url
+                timing["outcome"] = "error"
+                return None
+            except Exception as e:
+                print(f"Error getting file URL: {e}")
+                timing["outcome"] = "error"
+                return None
+    
+    async def download_image(self, file_url: str, max_bytes: Optional[int] = None) -> Optional[bytes]:
+        """Mengunduh gambar dari URL secara streaming dengan batas ukuran"""
+        if max_bytes is None:
+            max_bytes = settings.image_max_download_bytes
+        
+        with metrics.timer("download_image", provider="telegram") as timing:
+            image_data = await self._download(file_url, max_bytes)
+            if image_data is None:
+                timing["outcome"] = "error"
+            return image_data
     
-    def download_image(self, file_url: str) -> Optional[bytes]:
-        """Mengunduh gambar dari URL"""
+    async def _download(self, file_url: str, max_bytes: int) -> Optional[bytes]:
         try:
-            response = requests.get(file_url)
-            if response.status_code == 200:
-                return response.content
-            return None
+            async with self.get_client().stream("GET", file_url) as response:
+                if response.status_code != 200:
+                    return None
+                
+                content_length = int(response.headers.get("content-length") or 0)
+                if content_length > max_bytes:
+                    print(f"Gambar terlalu besar: {content_length} bytes (maks {max_bytes})")
+                    return None
+                
+                chunks = []
+                total = 0
+                async for chunk in response.aiter_bytes():
+                    total += len(chunk)
+                    if total > max_bytes:
+                        print(f"Gambar melebihi batas {max_bytes} bytes, unduhan dihentikan")
+                        return None
+                    chunks.append(chunk)
+                return b"".join(chunks)
         except Exception as e:
             print(f"Error downloading image: {e}")
             return None
     
     def process_image(self, image_data: bytes) -> Optional[Dict[str, Any]]:
         """Memproses gambar dan mendapatkan informasi dasar"""
+        from PIL import Image  # Import saat dibutuhkan agar cold start tetap cepat
+        
         try:
             image = Image.open(io.BytesIO(image_data))
             width, height = image.size
@@ -75,36 +200,117 @@ class TelegramService:
             print(f"Error processing image: {e}")
             return None
     
-    def get_webhook_info(self) -> Optional[Dict[str, Any]]:
+    async def get_webhook_info(self) -> Optional[Dict[str, Any]]:
         """Mendapatkan informasi webhook yang sudah diset"""
-        url = f"{self.base_url}/getWebhookInfo"
-        
         try:
-            response = requests.get(url)
-            return response.json()
+            return await self.call_api("getWebhookInfo", http_method="GET")
         except Exception as e:
             print(f"Error getting webhook info: {e}")
             return {"error": str(e)}
     
-    def set_webhook(self, webhook_url: str) -> Optional[Dict[str, Any]]:
+    async def set_webhook(self, webhook_url: str) -> Optional[Dict[str, Any]]:
         """Mengatur webhook Telegram"""
-        url = f"{self.base_url}/setWebhook"
         payload = {"url": webhook_url}
         
         try:
-            response = requests.post(url, json=payload)
-            return response.json()
+            return await self.call_api("setWebhook", payload)
         except Exception as e:
             print(f"Error setting webhook: {e}")
             return {"error": str(e)}
     
-    def get_bot_info(self) -> Optional[Dict[str, Any]]:
-        """Mendapatkan informasi bot"""
-        url = f"{self.base_url}/getMe"
+    async def get_updates(self, offset: Optional[int] = None, timeout: Optional[int] = None,
+                          limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Long-poll update baru dengan getUpdates.
         
+        Update dengan id < `offset` dianggap sudah dikonfirmasi oleh Telegram.
+        Melempar exception jika request gagal agar pemanggil bisa backoff.
+        """
+        timeout = settings.polling_timeout if timeout is None else timeout
+        payload: Dict[str, Any] = {
+            "timeout": timeout,
+            "limit": limit or settings.polling_limit,
+            "allowed_updates": ["message"]
+        }
+        if offset is not None:
+            payload["offset"] = offset
+        
+        result = await self.call_api("getUpdates", payload, timeout=timeout + 10)
+        if not result.get("ok"):
+            raise RuntimeError(f"getUpdates gagal: {result.get('description', result)}")
+        return result["result"]
+    
+    async def delete_webhook(self) -> Optional[Dict[str, Any]]:
+        """Menghapus webhook (wajib sebelum memakai getUpdates)"""
         try:
-            response = requests.get(url)
-            return response.json()
+            return await self.call_api("deleteWebhook", {"drop_pending_updates": False})
+        except Exception as e:
+            print(f"Error deleting webhook: {e}")
+            return {"error": str(e)}
+    
+    async def get_bot_info(self) -> Optional[Dict[str, Any]]:
+        """Mendapatkan informasi bot"""
+        try:
+            return await self.call_api("getMe", http_method="GET")
         except Exception as e:
             print(f"Error getting bot info: {e}")
             return {"error": str(e)}
+
+class StatusMessage:
+    """
+    Status "sedang memproses" satu pesan pengguna yang diganti hasil akhirnya.
+    
+    Mode "typing": satu indikator sendChatAction (diperbarui berkala hanya jika
+    `status_typing_interval` diisi), lalu hasil dikirim sebagai satu pesan. Mode "placeholder": satu pesan
+    placeholder yang kemudian diedit (editMessageText) menjadi hasil atau error.
+    Keduanya menghindari dua sendMessage per transaksi. Status hanya muncul
+    jika `start()` dipanggil, jadi jalur cepat (fast path, cache) langsung membalas.
+    """
+    
+    def __init__(self, telegram: TelegramService, chat_id: int, placeholder_text: str,
+                 mode: Optional[str] = None):
+        self.telegram = telegram
+        self.chat_id = chat_id
+        self.placeholder_text = placeholder_text
+        self.mode = mode or settings.status_message_mode
+        self.message_id: Optional[int] = None
+        self._typing_task: Optional[asyncio.Task] = None
+    
+    async def __aenter__(self) -> "StatusMessage":
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self._stop_typing()
+    
+    async def start(self):
+        """Menampilkan status (sekali saja) sebelum pekerjaan yang lambat"""
+        if self.message_id is not None or self._typing_task is not None:
+            return
+        
+        if self.mode == "placeholder":
+            result = await self.telegram.send_message(self.chat_id, self.placeholder_text)
+            if result and result.get("ok"):
+                self.message_id = result["result"]["message_id"]
+        else:
+            self._typing_task = asyncio.create_task(self._keep_typing())
+    
+    async def _keep_typing(self):
+        await self.telegram.send_chat_action(self.chat_id)
+        # Indikator Telegram hilang setelah ±5 detik; kirim ulang hanya jika diaktifkan
+        while settings.status_typing_interval > 0:
+            await asyncio.sleep(settings.status_typing_interval)
+            await self.telegram.send_chat_action(self.chat_id)
+    
+    def _stop_typing(self):
+        if self._typing_task is not None:
+            self._typing_task.cancel()
+            self._typing_task = None
+    
+    async def reply(self, text: str) -> Optional[Dict[str, Any]]:
+        """Mengganti status dengan hasil: edit placeholder, atau kirim pesan jika tidak ada/edit gagal"""
+        self._stop_typing()
+        if self.message_id is not None:
+            result = await self.telegram.edit_message_text(self.chat_id, self.message_id, text)
+            if result and result.get("ok"):
+                return result
+        return await self.telegram.send_message(self.chat_id, text)
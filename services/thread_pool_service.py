@@ -0,0 +1,35 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+from config import settings
+
+class ThreadPoolService:
+    """Service untuk menjalankan fungsi blocking di thread pool yang dibatasi"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or settings.blocking_pool_size
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        """Membuat executor saat pertama kali dibutuhkan"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="blocking"
+            )
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Menjalankan fungsi blocking tanpa memblokir event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.get_executor(), partial(func, *args, **kwargs))
+
+    def shutdown(self):
+        """Mematikan executor (dipanggil saat shutdown aplikasi)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Thread pool bersama untuk semua service
+thread_pool = ThreadPoolService()
@@ -0,0 +1,122 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from config import settings
+
+class UpdateDedupService:
+    """
+    Service untuk mencegah update Telegram yang sama diproses dua kali.
+
+    Menyimpan `update_id` yang sedang diproses atau sudah selesai dalam store
+    berukuran terbatas dengan TTL, opsional dipersist ke file JSON lokal.
+    """
+
+    IN_FLIGHT = "in_flight"
+    PROCESSED = "processed"
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None,
+                 persist_path: Optional[str] = None):
+        self.max_size = max_size or settings.dedup_max_size
+        self.ttl = ttl or settings.dedup_ttl
+        self.persist_path = persist_path if persist_path is not None else settings.dedup_persist_path
+        self._seen: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+        self._accepted = 0
+        self._duplicate_in_flight = 0
+        self._duplicate_processed = 0
+        self._evicted = 0
+        self.load()
+
+    def _evict(self, now: float):
+        """Buang entry yang kedaluwarsa atau melebihi kapasitas (paling lama dulu)"""
+        while self._seen:
+            _, seen_at = next(iter(self._seen.values()))
+            if now - seen_at < self.ttl and len(self._seen) <= self.max_size:
+                break
+            self._seen.popitem(last=False)
+            self._evicted += 1
+
+    def claim(self, update_id: int) -> bool:
+        """
+        Menandai update sebagai sedang diproses.
+
+        Mengembalikan False jika update sudah diproses atau sedang diproses,
+        sehingga pemanggil bisa langsung membuangnya.
+        """
+        now = time.time()
+        self._evict(now)
+
+        entry = self._seen.get(update_id)
+        if entry is not None:
+            if entry[0] == self.IN_FLIGHT:
+                self._duplicate_in_flight += 1
+            else:
+                self._duplicate_processed += 1
+            return False
+
+        self._seen[update_id] = (self.IN_FLIGHT, now)
+        self._accepted += 1
+        return True
+
+    def mark_processed(self, update_id: int):
+        """Menandai update sudah selesai diproses"""
+        entry = self._seen.get(update_id)
+        seen_at = entry[1] if entry else time.time()
+        self._seen[update_id] = (self.PROCESSED, seen_at)
+
+    def release(self, update_id: int):
+        """Melepas klaim agar update boleh diproses ulang (misalnya saat gagal)"""
+        entry = self._seen.get(update_id)
+        if entry is not None and entry[0] == self.IN_FLIGHT:
+            del self._seen[update_id]
+
+    def load(self):
+        """Memuat update yang sudah diproses dari file (jika persist diaktifkan)"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            now = time.time()
+            for update_id, seen_at in sorted(entries, key=lambda entry: entry[1]):
+                if now - seen_at < self.ttl:
+                    self._seen[int(update_id)] = (self.PROCESSED, seen_at)
+            self._evict(now)
+            print(f"🗂️ Memuat {len(self._seen)} update_id dari {self.persist_path}")
+        except Exception as e:
+            print(f"⚠️ Gagal memuat dedup store: {e}")
+
+    def save(self):
+        """Menyimpan update yang sudah diproses ke file (jika persist diaktifkan)"""
+        if not self.persist_path:
+            return
+        try:
+            entries = [
+                [update_id, seen_at]
+                for update_id, (state, seen_at) in self._seen.items()
+                if state == self.PROCESSED
+            ]
+            directory = os.path.dirname(self.persist_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.persist_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.persist_path)
+        except Exception as e:
+            print(f"⚠️ Gagal menyimpan dedup store: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistik dedup untuk monitoring"""
+        in_flight = sum(1 for state, _ in self._seen.values() if state == self.IN_FLIGHT)
+        return {
+            "size": len(self._seen),
+            "max_size": self.max_size,
+            "in_flight": in_flight,
+            "accepted": self._accepted,
+            "duplicate_in_flight": self._duplicate_in_flight,
+            "duplicate_processed": self._duplicate_processed,
+            "duplicates_dropped": self._duplicate_in_flight + self._duplicate_processed,
+            "evicted": self._evicted
+        }
@@ -0,0 +1,13 @@
+import os
+import sys
+
+# Settings wajib diisi sebelum config diimport; test tidak memanggil API sungguhan
+for name in ["TELEGRAM_BOT_TOKEN", "GEMINI_API_KEY", "GEMINI_API_URL", "OPENAI_API_KEY", "VERIFY_TOKEN"]:
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("TELEGRAM_CHAT_ID", "1")
+# Indeks kategori dan cache hanya di memori agar test tidak menulis ke data/
+os.environ["CATEGORY_INDEX_PATH"] = ""
+os.environ["EXTRACTION_CACHE_PATH"] = ""
+os.environ["DEDUP_PERSIST_PATH"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
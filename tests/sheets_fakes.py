@@ -0,0 +1,80 @@
+"""Fake gspread minimal (client, spreadsheet, worksheet) untuk test Google Sheets"""
+from gspread.exceptions import SpreadsheetNotFound, WorksheetNotFound
+from config import settings
+from services.google_sheets_service import GoogleSheetsService
+
+class FakeErrorResponse:
+    def __init__(self, code):
+        self.status_code = code
+        self.text = "error"
+        self.headers = {"retry-after": "0.01"}
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": "error", "status": "TEST"}}
+
+class FakeWorksheet:
+    def __init__(self, title="Sheet1"):
+        self.title = title
+        self.rows = [GoogleSheetsService().get_headers()]
+        self.calls = []
+        self.failures = []  # exception yang dilempar append_rows berikutnya
+        self.read_failures = []  # exception yang dilempar row_values berikutnya
+
+    def row_values(self, row):
+        if self.read_failures:
+            raise self.read_failures.pop(0)
+        return self.rows[row - 1] if len(self.rows) >= row else []
+
+    def col_values(self, col):
+        return [row[col - 1] for row in self.rows]
+
+    def append_row(self, values, **kwargs):
+        self.rows.append(values)
+
+    def append_rows(self, values, **kwargs):
+        self.calls.append(("append_rows", len(values)))
+        if self.failures:
+            raise self.failures.pop(0)
+        start = len(self.rows) + 1
+        self.rows.extend(values)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:H{len(self.rows)}"}}
+
+    def sort(self, *specs, range=None):
+        self.calls.append(("sort", range))
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.id = "sheet-id"
+        self.title = settings.google_sheet_name
+        self.sheet1 = FakeWorksheet()
+        self.worksheets = {}
+
+    def worksheet(self, title):
+        if title not in self.worksheets:
+            raise WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title, rows, cols):
+        self.worksheets[title] = FakeWorksheet(title)
+        self.worksheets[title].rows = []
+        return self.worksheets[title]
+
+class FakeClient:
+    def __init__(self):
+        self.spreadsheet = FakeSpreadsheet()
+        self.calls = []
+
+    def open(self, title):
+        self.calls.append(("open", title))
+        if title != self.spreadsheet.title:
+            raise SpreadsheetNotFound(title)
+        return self.spreadsheet
+
+    def open_by_key(self, key):
+        self.calls.append(("open_by_key", key))
+        if key != self.spreadsheet.id:
+            raise SpreadsheetNotFound(key)
+        return self.spreadsheet
+
+    def create(self, title):
+        raise AssertionError("spreadsheet baru tidak boleh dibuat")
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import pytest
+from config import settings
+from services.bulk_import_service import BulkImportService
+from services.finance_bot_service import FinanceBotService
+from services.ledger_service import LedgerService
+
+CSV_ROWS = [
+    (f"2025-09-0{day}", f"Belanja toko {day}", f"{day}0.000") for day in range(1, 6)
+]
+
+@pytest.fixture
+def importer(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ledger_enabled", True)
+    monkeypatch.setattr(settings, "import_batch_size", 2)
+    monkeypatch.setattr(settings, "import_dir", str(tmp_path / "imports"))
+    bot = FinanceBotService()
+    bot.ledger = LedgerService(db_path=str(tmp_path / "ledger.db"))
+    bot.replicator.ledger = bot.ledger
+    yield BulkImportService(bot)
+    bot.ledger.close()
+
+def write_csv(path, rows=CSV_ROWS, encoding="utf-8"):
+    lines = ["tanggal;keterangan;debit"] + [";".join(row) for row in rows]
+    path.write_bytes("\n".join(lines).encode(encoding))
+    return str(path)
+
+def test_structured_csv_rows_skip_the_llm(importer, tmp_path):
+    job = asyncio.run(importer.run_import(write_csv(tmp_path / "mutasi.csv"), chat_id=1, payment_method="bca"))
+
+    assert job["status"] == "completed"
+    assert (job["imported"], job["structured"], job["llm"]) == (5, 5, 0)
+    rows = importer.bot.ledger.fetch_after(0, 10)
+    assert rows[0]["amount"] == 10000 and rows[0]["payment_method"] == "bca" and rows[0]["type"] == "expense"
+
+def test_interrupted_import_resumes_from_its_checkpoint(importer, tmp_path, monkeypatch):
+    path = write_csv(tmp_path / "mutasi.csv")
+    ledger = importer.bot.ledger
+    record_many = ledger.record_many
+    calls = []
+
+    def failing_record_many(entries, checkpoint=None):
+        calls.append(checkpoint)
+        if len(calls) == 2:
+            raise RuntimeError("disk penuh")
+        return record_many(entries, checkpoint)
+
+    monkeypatch.setattr(ledger, "record_many", failing_record_many)
+    first = dict(asyncio.run(importer.run_import(path, chat_id=1)))
+    assert first["status"] == "failed" and first["imported"] == 2
+
+    second = asyncio.run(importer.run_import(path, chat_id=1))
+    assert second["status"] == "completed"
+    assert second["resumed_from"] == 2 and second["imported"] == 3
+    assert ledger.max_id() == 5
+    assert ledger.get_high_water_mark(importer.checkpoint_name(second["import_id"])) == 5
+
+def test_cp1252_csv_is_detected_and_decoded(importer, tmp_path):
+    path = write_csv(tmp_path / "mutasi.csv", [("2025-09-01", "Café Ñusa", "25.000")], encoding="cp1252")
+    assert importer.detect_format(path) == "csv"
+    assert importer.detect_encoding(path) == "cp1252"
+
+    job = asyncio.run(importer.run_import(path, chat_id=1))
+    assert job["encoding"] == "cp1252"
+    assert importer.bot.ledger.fetch_after(0, 10)[0]["prompt_text"] == "Café Ñusa"
+
+def test_utf8_csv_with_bom_stays_utf8(importer, tmp_path):
+    path = tmp_path / "mutasi.csv"
+    path.write_bytes(b"\xef\xbb\xbf" + "tanggal;keterangan;debit\n2025-09-01;Kopi Ñ;10.000".encode("utf-8"))
+    assert importer.detect_encoding(str(path)) == "utf-8-sig"
+    record = next(importer.iter_csv(str(path), 1, encoding="utf-8-sig"))
+    assert record["financial_data"]["prompt_text"] == "Kopi Ñ"
+
+def write_export(path, messages):
+    path.write_text(json.dumps({"name": "Bot", "messages": messages}), encoding="utf-8")
+    return str(path)
+
+def message(message_id, from_id, text):
+    return {"id": message_id, "type": "message", "date_unixtime": "1757300000", "from_id": from_id, "text": text}
+
+def test_bot_replies_are_skipped_and_sender_filter_applies(importer, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_BOT_TOKEN", "999:secret")
+    path = write_export(tmp_path / "result.json", [
+        message(1, "user123", "kopi 25rb gopay"),
+        message(2, "user999", "✅ Tercatat: Rp 25,000"),
+        message(3, "user456", "parkir 5rb cash"),
+    ])
+
+    everyone = [record["text"] for record in importer.iter_telegram_export(path) if record]
+    assert everyone == ["kopi 25rb gopay", "parkir 5rb cash"]
+
+    only_user = list(importer.iter_telegram_export(path, from_id="123"))
+    # Posisi tetap satu per pesan agar checkpoint tidak bergeser
+    assert len(only_user) == 3
+    assert [record["text"] for record in only_user if record] == ["kopi 25rb gopay"]
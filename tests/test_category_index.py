@@ -0,0 +1,67 @@
+import threading
+from config import settings
+from services.category_index_service import CategoryIndexService
+from services.fast_path_parser_service import INFERRED_FIELDS, FastPathParserService
+
+def learn(index, chat_id, financial_data):
+    index.learn_many([(chat_id, dict(financial_data))] * settings.category_index_min_support)
+
+def test_lookup_is_per_chat():
+    index = CategoryIndexService(db_path="")
+    learn(index, 1, {"prompt_text": "kopi kenangan", "category": "food", "payment_method": "gopay"})
+    assert index.lookup(1, "kopi kenangan mantan") == {"category": "food", "payment_method": "gopay"}
+    assert index.lookup(2, "kopi kenangan mantan") == {}
+
+def test_inferred_fields_are_not_learned():
+    index = CategoryIndexService(db_path="")
+    learn(index, 1, {
+        "prompt_text": "kenangan", "category": "food", "payment_method": "cash",
+        INFERRED_FIELDS: ["payment_method"]
+    })
+    assert index.lookup(1, "kenangan") == {"category": "food"}
+
+def test_generic_words_and_sub_phrases_are_not_learned():
+    index = CategoryIndexService(db_path="")
+    learn(index, 1, {"prompt_text": "makan siang", "category": "food", "payment_method": "gopay"})
+    learn(index, 1, {"prompt_text": "kopi susu", "category": "food", "payment_method": "gopay"})
+    assert index.lookup(1, "siang") == {}
+    assert index.lookup(1, "susu") == {}
+
+def test_apply_marks_filled_fields_as_inferred():
+    index = CategoryIndexService(db_path="")
+    learn(index, 1, {"prompt_text": "kenangan", "category": "food", "payment_method": "gopay"})
+    financial_data = index.apply(1, {"prompt_text": "kenangan", "category": "other", "payment_method": "ovo"})
+    assert financial_data["category"] == "food"
+    assert financial_data["payment_method"] == "ovo"
+    assert financial_data[INFERRED_FIELDS] == ["category"]
+
+def test_counts_survive_restart(tmp_path):
+    path = str(tmp_path / "category_index.db")
+    index = CategoryIndexService(db_path=path)
+    learn(index, 1, {"prompt_text": "kenangan", "category": "food", "payment_method": "gopay"})
+    index.close()
+    assert CategoryIndexService(db_path=path).lookup(1, "kenangan") == {"category": "food", "payment_method": "gopay"}
+
+def test_lookup_does_not_wait_for_a_database_commit(tmp_path):
+    index = CategoryIndexService(db_path=str(tmp_path / "category_index.db"))
+    learn(index, 1, {"prompt_text": "kenangan", "category": "food", "payment_method": "gopay"})
+    result = {}
+    with index._db_lock:  # commit learn_many lain sedang berjalan di thread pool
+        thread = threading.Thread(target=lambda: result.update(index.lookup(1, "kenangan")))
+        thread.start()
+        thread.join(timeout=1)
+        assert not thread.is_alive()
+    assert result == {"category": "food", "payment_method": "gopay"}
+    index.close()
+
+def test_learned_merchant_is_used_only_for_its_chat():
+    index = CategoryIndexService(db_path="")
+    parser = FastPathParserService(index)
+    learned = {"prompt_text": "kenangan", "category": "food", "payment_method": "gopay", "items": []}
+    index.learn_many([(1, learned)] * settings.category_index_min_support)
+
+    financial_data = parser.try_parse("kenangan 25rb", chat_id=1)
+    assert financial_data is not None
+    assert (financial_data["category"], financial_data["payment_method"]) == ("food", "gopay")
+    assert sorted(financial_data[INFERRED_FIELDS]) == ["category", "payment_method"]
+    assert parser.try_parse("kenangan 25rb", chat_id=2) is None
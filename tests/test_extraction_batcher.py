@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from config import settings
+from services.extraction_batcher_service import ExtractionBatcherService
+
+class FakeAIService:
+    provider_name = "fake"
+
+    def __init__(self, batch_results=None):
+        self.batch_results = batch_results
+        self.batches = []
+        self.singles = []
+
+    async def process_financial_data(self, text_content=None, **kwargs):
+        self.singles.append(text_content)
+        return {"amount": len(text_content), "summary": text_content}
+
+    async def process_financial_data_batch(self, texts):
+        self.batches.append(list(texts))
+        if self.batch_results is not None:
+            return self.batch_results
+        return [{"index": n, "amount": len(text), "summary": text} for n, text in enumerate(texts, start=1)]
+
+@pytest.fixture(autouse=True)
+def batching(monkeypatch):
+    monkeypatch.setattr(settings, "llm_batching_enabled", True)
+    monkeypatch.setattr(settings, "llm_batch_window", 0.02)
+    monkeypatch.setattr(settings, "llm_batch_max_size", 8)
+
+async def extract_all(batcher, service, texts):
+    return await asyncio.gather(*[batcher.extract(service, text) for text in texts])
+
+def test_requests_within_the_window_share_one_call():
+    batcher = ExtractionBatcherService()
+    service = FakeAIService()
+    results = asyncio.run(extract_all(batcher, service, ["kopi", "parkir 5rb", "gaji"]))
+
+    assert service.batches == [["kopi", "parkir 5rb", "gaji"]]
+    assert [result["summary"] for result in results] == ["kopi", "parkir 5rb", "gaji"]
+    assert batcher.stats()["batches"] == 1
+
+def test_full_batch_is_sent_without_waiting_for_the_window(monkeypatch):
+    monkeypatch.setattr(settings, "llm_batch_window", 10)
+    monkeypatch.setattr(settings, "llm_batch_max_size", 2)
+    batcher = ExtractionBatcherService()
+    service = FakeAIService()
+
+    async def scenario():
+        return await asyncio.wait_for(extract_all(batcher, service, ["a", "bb"]), timeout=1)
+
+    assert [result["amount"] for result in asyncio.run(scenario())] == [1, 2]
+
+def test_single_request_uses_the_normal_call():
+    batcher = ExtractionBatcherService()
+    service = FakeAIService()
+    asyncio.run(extract_all(batcher, service, ["kopi"]))
+    assert service.batches == [] and service.singles == ["kopi"]
+
+def test_results_are_mapped_by_index_and_missing_ones_are_retried():
+    batcher = ExtractionBatcherService()
+    service = FakeAIService(batch_results=[{"index": 2, "amount": 99, "summary": "b"}, {"index": 1, "error": "x"}])
+    results = asyncio.run(extract_all(batcher, service, ["a", "b"]))
+
+    assert results[1]["amount"] == 99
+    assert results[0] == {"amount": 1, "summary": "a"}
+    assert service.singles == ["a"]
+    assert batcher.stats()["fallbacks"] == 1
+
+def test_unindexed_array_of_the_wrong_length_is_rejected():
+    batcher = ExtractionBatcherService()
+    assert batcher.map_results([{"amount": 1}], 2) == [None, None]
+    assert batcher.map_results([{"amount": 1}, {"amount": 2}], 2) == [{"amount": 1}, {"amount": 2}]
+
+def test_batch_error_is_reported_to_every_caller():
+    class FailingService(FakeAIService):
+        async def process_financial_data_batch(self, texts):
+            raise RuntimeError("boom")
+
+    results = asyncio.run(extract_all(ExtractionBatcherService(), FailingService(), ["a", "b"]))
+    assert results == [{"error": "boom"}, {"error": "boom"}]
@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from config import settings
+from services import extraction_cache_service
+from services.extraction_cache_service import ExtractionCacheService
+from services.finance_bot_service import FinanceBotService
+from services.prompt_service import prompts
+
+RESULT = {"category": "food", "amount": 15000, "timestamp": "2025-09-01 10:00:00"}
+
+def test_text_key_ignores_spacing_and_case():
+    cache = ExtractionCacheService(db_path="")
+    assert cache.text_key("gemini", "v1", "Kopi  15rb ") == cache.text_key("gemini", "v1", "kopi 15rb")
+    assert cache.text_key("gemini", "v1", "kopi 15rb") != cache.text_key("chatgpt", "v1", "kopi 15rb")
+
+def test_memory_hit_returns_a_copy_without_timestamp():
+    async def scenario():
+        cache = ExtractionCacheService(db_path="")
+        key = cache.text_key("gemini", "v1", "kopi 15rb")
+        await cache.set(key, RESULT)
+        first = await cache.get(key)
+        first["amount"] = 0
+        return first, await cache.get(key), cache.stats()
+
+    first, second, stats = asyncio.run(scenario())
+    assert second == {"category": "food", "amount": 15000}
+    assert stats["hits_memory"] == 2 and stats["misses"] == 0
+
+def test_errors_are_not_cached():
+    async def scenario():
+        cache = ExtractionCacheService(db_path="")
+        key = cache.text_key("gemini", "v1", "???")
+        await cache.set(key, {"error": "gagal"})
+        return await cache.get(key)
+
+    assert asyncio.run(scenario()) is None
+
+def test_expired_entries_are_misses(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(extraction_cache_service.time, "time", lambda: now[0])
+
+    async def scenario():
+        cache = ExtractionCacheService(ttl=10, db_path="")
+        key = cache.text_key("gemini", "v1", "kopi 15rb")
+        await cache.set(key, RESULT)
+        now[0] += 11
+        return await cache.get(key)
+
+    assert asyncio.run(scenario()) is None
+
+def test_disk_cache_survives_restart_and_batches_last_access(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.db")
+    monkeypatch.setattr(ExtractionCacheService, "ACCESS_BATCH_SIZE", 2)
+
+    async def scenario():
+        cache = ExtractionCacheService(db_path=path)
+        keys = [cache.text_key("gemini", "v1", f"kopi {n}rb") for n in (10, 20)]
+        for key in keys:
+            await cache.set(key, RESULT)
+        cache.close()
+
+        restarted = ExtractionCacheService(db_path=path)
+        assert await restarted.get(keys[0]) == {"category": "food", "amount": 15000}
+        # Satu hit dari disk masih ditampung di memori, belum ditulis
+        assert len(restarted._accessed) == 1
+        await restarted.get(keys[1])
+        assert restarted._accessed == {}
+        stats = restarted.stats()
+        restarted.close()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["hits_disk"] == 2
+
+class FakeRouter:
+    """Router yang selalu menjawab dari provider cadangan"""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.calls = 0
+
+    async def call_with_provider(self, call):
+        self.calls += 1
+        return self.provider, dict(RESULT)
+
+class FakeAIService:
+    provider_name = "chatgpt"
+
+@pytest.fixture
+def bot(monkeypatch):
+    monkeypatch.setattr(settings, "extraction_cache_enabled", True)
+    service = FinanceBotService()
+    service.cache = ExtractionCacheService(db_path="")
+    service.router = FakeRouter("gemini")
+    return service
+
+def test_fallback_result_is_cached_under_the_provider_that_answered(bot):
+    async def scenario():
+        await bot.extract_text_data(FakeAIService(), "kopi 15rb")
+        gemini_hit = await bot.cache.get(bot.cache.text_key("gemini", prompts.version, "kopi 15rb"))
+        chatgpt_hit = await bot.cache.get(bot.cache.text_key("chatgpt", prompts.version, "kopi 15rb"))
+        # Provider aktif tetap chatgpt: pesan yang sama dianalisis ulang, bukan memakai hasil gemini
+        await bot.extract_text_data(FakeAIService(), "kopi 15rb")
+        return gemini_hit, chatgpt_hit
+
+    gemini_hit, chatgpt_hit = asyncio.run(scenario())
+    assert gemini_hit is not None and chatgpt_hit is None
+    assert bot.router.calls == 2
@@ -0,0 +1,49 @@
+import pytest
+from config import settings
+from services.fast_path_parser_service import INFERRED_FIELDS, FastPathParserService
+
+@pytest.fixture
+def parser():
+    return FastPathParserService()
+
+@pytest.mark.parametrize("text, amount, category, payment_method, transaction_type", [
+    ("makan siang 25rb gopay", 25000, "food", "gopay", "expense"),
+    ("gaji 5jt bca", 5000000, "salary", "bca", "income"),
+    ("bensin 50.000 cash", 50000, "transport", "cash", "expense"),
+    ("parkir 2,5k ovo", 2500, "transport", "ovo", "expense"),
+])
+def test_simple_messages_pass_the_threshold(parser, text, amount, category, payment_method, transaction_type):
+    financial_data = parser.try_parse(text)
+    assert financial_data is not None
+    assert financial_data["amount"] == amount
+    assert financial_data["category"] == category
+    assert financial_data["payment_method"] == payment_method
+    assert financial_data["type"] == transaction_type
+
+@pytest.mark.parametrize("text", [
+    "beli kopi 25rb lalu parkir 5rb",  # lebih dari satu nominal
+    "kopi 2 gelas 25rb gopay",  # angka lain selain nominal
+    "/summary 25rb",
+    "makan 25rb gopay\nparkir 5rb cash",
+])
+def test_unsafe_messages_are_not_parsed(parser, text):
+    financial_data, confidence = parser.parse(text)
+    assert financial_data is None
+    assert confidence == 0.0
+
+@pytest.mark.parametrize("text", ["gak jadi beli kopi 25rb gopay", "batal parkir 5rb cash", "tidak bayar pulsa 50rb bca"])
+def test_negation_falls_back_to_llm(parser, text):
+    assert parser.parse(text) == (None, 0.0)
+    assert parser.try_parse(text) is None
+
+def test_defaulted_payment_method_stays_below_threshold(parser):
+    financial_data, confidence = parser.parse("beli kopi 25k")
+    assert financial_data["payment_method"] == "cash"
+    assert financial_data[INFERRED_FIELDS] == ["payment_method"]
+    assert confidence < settings.fast_path_min_confidence
+    assert parser.try_parse("beli kopi 25k") is None
+
+def test_income_keyword_with_expense_category_stays_below_threshold(parser):
+    financial_data, confidence = parser.parse("jual baju 100rb bca")
+    assert financial_data["type"] == "income"
+    assert confidence < settings.fast_path_min_confidence
@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from gspread.exceptions import APIError
+from config import settings
+from services import google_sheets_service
+from services.rate_limiter_service import RateLimiterService
+from sheets_fakes import FakeClient, FakeErrorResponse
+
+@pytest.fixture
+def sheets(monkeypatch):
+    # Rate limiter baru per test: semaphore/lock asyncio terikat ke event loop
+    monkeypatch.setattr(google_sheets_service, "rate_limiter", RateLimiterService())
+    monkeypatch.setattr(settings, "sheets_flush_interval", 0.05)
+    monkeypatch.setattr(settings, "sheets_sort_interval", 0.0)
+    monkeypatch.setattr(settings, "sheets_shard_mode", "none")
+    monkeypatch.setattr(settings, "rate_limit_default_backoff", 0.01)
+    service = google_sheets_service.GoogleSheetsService()
+    service._client = FakeClient()
+    return service
+
+def transaction(timestamp, amount):
+    return {
+        "timestamp": timestamp, "prompt_text": "kopi", "category": "food", "amount": amount,
+        "payment_method": "cash", "type": "expense", "summary": "kopi", "items": []
+    }
+
+async def save_concurrently(sheets, transactions, chat_id=1):
+    await sheets.start()
+    try:
+        return await asyncio.gather(*[
+            sheets.save_financial_data_async(financial_data, chat_id) for financial_data in transactions
+        ])
+    finally:
+        await sheets.stop()
+
+def test_buffered_rows_are_written_in_one_append(sheets):
+    transactions = [transaction(f"2025-09-0{day} 10:00:00", day * 1000) for day in (1, 2, 3)]
+    saved = asyncio.run(save_concurrently(sheets, transactions))
+
+    worksheet = sheets._client.spreadsheet.sheet1
+    assert saved == [True, True, True]
+    assert [call for call in worksheet.calls if call[0] == "append_rows"] == [("append_rows", 3)]
+    assert len(worksheet.rows) == 4
+
+def test_sort_uses_explicit_range_after_append(sheets):
+    asyncio.run(save_concurrently(sheets, [transaction("2025-09-01 10:00:00", 1000), transaction("2025-09-02 10:00:00", 2000)]))
+
+    worksheet = sheets._client.spreadsheet.sheet1
+    assert ("sort", "A2:H3") in worksheet.calls
+    assert worksheet.calls.index(("append_rows", 2)) < worksheet.calls.index(("sort", "A2:H3"))
+
+def test_rate_limited_append_is_retried_without_duplicate_rows(sheets):
+    worksheet = sheets._client.spreadsheet.sheet1
+    worksheet.failures.append(APIError(FakeErrorResponse(429)))
+
+    saved = asyncio.run(save_concurrently(sheets, [transaction("2025-09-01 10:00:00", 1000)]))
+
+    assert saved == [True]
+    assert [call for call in worksheet.calls if call[0] == "append_rows"] == [("append_rows", 1), ("append_rows", 1)]
+    assert len(worksheet.rows) == 2
+
+def test_failed_append_is_reported_to_every_caller(sheets):
+    worksheet = sheets._client.spreadsheet.sheet1
+    worksheet.failures.append(RuntimeError("boom"))
+
+    saved = asyncio.run(save_concurrently(sheets, [transaction("2025-09-01 10:00:00", 1000), transaction("2025-09-02 10:00:00", 2000)]))
+
+    assert saved == [False, False]
+    assert len(worksheet.rows) == 1
+
+def test_rows_are_grouped_per_shard(sheets, monkeypatch):
+    monkeypatch.setattr(settings, "sheets_shard_mode", "chat")
+
+    async def scenario():
+        await sheets.start()
+        try:
+            return await asyncio.gather(
+                sheets.save_financial_data_async(transaction("2025-09-01 10:00:00", 1000), 1),
+                sheets.save_financial_data_async(transaction("2025-09-01 11:00:00", 2000), 2),
+                sheets.save_financial_data_async(transaction("2025-09-01 12:00:00", 3000), 1)
+            )
+        finally:
+            await sheets.stop()
+
+    assert asyncio.run(scenario()) == [True, True, True]
+    worksheets = sheets._client.spreadsheet.worksheets
+    assert len(worksheets["chat_1"].rows) == 3  # header + 2 baris
+    assert len(worksheets["chat_2"].rows) == 2
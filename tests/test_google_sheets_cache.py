@@ -0,0 +1,43 @@
+import pytest
+from gspread.exceptions import APIError
+from config import settings
+from services.google_sheets_service import GoogleSheetsService
+from sheets_fakes import FakeClient, FakeErrorResponse
+
+@pytest.fixture
+def sheets(monkeypatch):
+    monkeypatch.setattr(settings, "sheets_shard_mode", "none")
+    monkeypatch.setattr(settings, "google_sheet_id", None)
+    service = GoogleSheetsService()
+    service._client = FakeClient()
+    return service
+
+def test_spreadsheet_is_looked_up_by_title_once(sheets):
+    sheets.get_spreadsheet()
+    sheets._spreadsheet_cached_at = 0.0  # TTL habis
+    sheets.get_spreadsheet()
+    assert sheets._client.calls == [("open", settings.google_sheet_name), ("open_by_key", "sheet-id")]
+
+def test_renamed_spreadsheet_is_still_opened_by_id(sheets):
+    sheets.get_spreadsheet()
+    sheets._client.spreadsheet.title = "Keuangan (lama)"
+    sheets.invalidate_cache()
+    assert sheets.get_spreadsheet() is sheets._client.spreadsheet
+    assert sheets._client.calls[-1] == ("open_by_key", "sheet-id")
+
+def test_header_is_written_once_for_an_empty_sheet(sheets):
+    worksheet = sheets._client.spreadsheet.sheet1
+    worksheet.rows = []
+    sheets.ensure_headers(worksheet)
+    sheets.ensure_headers(worksheet)
+    assert worksheet.rows == [sheets.get_headers()]
+
+def test_transient_error_does_not_write_a_second_header(sheets):
+    worksheet = sheets._client.spreadsheet.sheet1
+    worksheet.read_failures.append(APIError(FakeErrorResponse(429)))
+    with pytest.raises(APIError):
+        sheets.ensure_headers(worksheet)
+    assert worksheet.rows == [sheets.get_headers()]
+    # Percobaan berikutnya tetap mengecek header (belum dianggap terverifikasi)
+    sheets.ensure_headers(worksheet)
+    assert worksheet.rows == [sheets.get_headers()]
@@ -0,0 +1,103 @@
+import asyncio
+import httpx
+import pytest
+import main
+from services.job_queue_service import JobQueueService
+
+def test_jobs_run_on_workers():
+    async def scenario():
+        done = []
+        queue = JobQueueService(workers=2, max_size=10)
+        await queue.start()
+
+        async def job(value):
+            await asyncio.sleep(0.01)
+            done.append(value)
+
+        for value in range(5):
+            assert await queue.submit(lambda value=value: job(value))
+        await queue.stop(timeout=1)
+        return sorted(done), queue.stats()
+
+    done, stats = asyncio.run(scenario())
+    assert done == [0, 1, 2, 3, 4]
+    assert stats["processed"] == 5 and stats["failed"] == 0
+
+def test_full_queue_rejects_after_timeout():
+    async def scenario():
+        release = asyncio.Event()
+        queue = JobQueueService(workers=1, max_size=1)
+        await queue.start()
+        assert await queue.submit(release.wait)  # dikerjakan worker
+        await asyncio.sleep(0.01)
+        assert await queue.submit(release.wait)  # mengisi antrian
+        rejected = not await queue.submit(release.wait, timeout=0.01)
+        release.set()
+        await queue.stop(timeout=1)
+        return rejected, queue.stats()
+
+    rejected, stats = asyncio.run(scenario())
+    assert rejected
+    assert stats["rejected"] == 1 and stats["processed"] == 2
+
+def test_stop_drains_pending_jobs_and_refuses_new_ones():
+    async def scenario():
+        done = []
+        queue = JobQueueService(workers=1, max_size=10)
+        await queue.start()
+
+        async def job():
+            await asyncio.sleep(0.01)
+            done.append(1)
+
+        for _ in range(3):
+            await queue.submit(job)
+        await queue.stop(timeout=1)
+        return len(done), await queue.submit(job)
+
+    assert asyncio.run(scenario()) == (3, False)
+
+@pytest.fixture
+def webhook(monkeypatch):
+    handled = []
+
+    async def handle_update(data):
+        handled.append(data["update_id"])
+        main.update_dedup.mark_processed(data["update_id"])
+
+    monkeypatch.setattr(main, "handle_update", handle_update)
+    return handled
+
+async def post_update(update_id):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post("/webhook", json={"update_id": update_id, "message": {"chat": {"id": 1}}})
+
+def test_webhook_processes_inline_without_workers(webhook):
+    response = asyncio.run(post_update(900001))
+    assert response.json() == {"status": "ok"}
+    assert webhook == [900001]
+    assert asyncio.run(post_update(900001)).json() == {"status": "duplicate"}
+
+def test_webhook_answers_503_when_queue_is_full_and_releases_the_update(webhook, monkeypatch):
+    async def scenario():
+        release = asyncio.Event()
+        queue = JobQueueService(workers=1, max_size=1)
+        monkeypatch.setattr(main, "job_queue", queue)
+        monkeypatch.setattr(main.settings, "webhook_enqueue_timeout", 0.01)
+        await queue.start()
+        await queue.submit(release.wait)
+        await asyncio.sleep(0.01)
+        await queue.submit(release.wait)
+
+        full = await post_update(900002)
+        # Update yang ditolak boleh dikirim ulang Telegram (tidak dianggap duplikat)
+        retried = await post_update(900002)
+        release.set()
+        await asyncio.sleep(0.01)
+        accepted = await post_update(900002)
+        await queue.stop(timeout=1)
+        return full.status_code, retried.status_code, accepted.json()
+
+    assert asyncio.run(scenario()) == (503, 503, {"status": "queued"})
+    assert webhook == [900002]
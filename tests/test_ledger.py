@@ -0,0 +1,70 @@
+import asyncio
+from config import settings
+from services.finance_bot_service import FinanceBotService
+from services.ledger_service import LedgerService
+
+def transaction(timestamp, amount, category="food", payment_method="cash", transaction_type="expense"):
+    return {
+        "timestamp": timestamp, "prompt_text": "kopi", "category": category, "amount": amount,
+        "payment_method": payment_method, "type": transaction_type, "summary": "kopi", "items": [{"name": "kopi"}]
+    }
+
+def test_record_many_updates_daily_and_monthly_aggregates(tmp_path):
+    ledger = LedgerService(db_path=str(tmp_path / "ledger.db"))
+    ledger.record_many([
+        (1, transaction("2025-09-01 08:00:00", 15000)),
+        (1, transaction("2025-09-01 12:00:00", 5000, category="transport", payment_method="gopay")),
+        (1, transaction("2025-09-02 09:00:00", 1000000, category="salary", transaction_type="income")),
+        (2, transaction("2025-09-01 08:00:00", 99000)),
+    ])
+
+    day = ledger.get_aggregates(1, "day", "2025-09-01")
+    assert day["type"] == {"expense": {"total": 20000, "count": 2}}
+    assert day["category"]["transport"] == {"total": 5000, "count": 1}
+
+    month = ledger.get_aggregates(1, "month", "2025-09")
+    assert month["type"]["income"] == {"total": 1000000, "count": 1}
+    assert month["category:expense"] == {"food": {"total": 15000, "count": 1}, "transport": {"total": 5000, "count": 1}}
+    assert month["payment_method:income"] == {"cash": {"total": 1000000, "count": 1}}
+    assert ledger.get_aggregates(2, "month", "2025-09")["type"]["expense"]["total"] == 99000
+    ledger.close()
+
+def test_checkpoint_is_written_with_the_rows(tmp_path):
+    ledger = LedgerService(db_path=str(tmp_path / "ledger.db"))
+    ids = ledger.record_many([(1, transaction("2025-09-01 08:00:00", 15000))], checkpoint=("import:abc", 200))
+    assert ledger.get_high_water_mark("import:abc") == 200
+    assert ledger.max_id() == ids[0]
+    ledger.close()
+
+def test_fetch_after_returns_rows_in_order_with_items(tmp_path):
+    ledger = LedgerService(db_path=str(tmp_path / "ledger.db"))
+    first, second = ledger.record_many([
+        (1, transaction("2025-09-01 08:00:00", 15000)), (1, transaction("2025-09-02 08:00:00", 5000))
+    ])
+    rows = ledger.fetch_after(first, limit=10)
+    assert [row["id"] for row in rows] == [second]
+    assert rows[0]["items"] == [{"name": "kopi"}]
+    ledger.close()
+
+def test_aggregates_are_backfilled_for_an_old_ledger(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    ledger = LedgerService(db_path=path)
+    ledger.record(1, transaction("2025-09-01 08:00:00", 15000))
+    with ledger.get_db() as db:
+        db.execute("DELETE FROM aggregates")
+    ledger.close()
+
+    reopened = LedgerService(db_path=path)
+    assert reopened.get_aggregates(1, "month", "2025-09")["category:expense"]["food"]["total"] == 15000
+    reopened.close()
+
+def test_bot_saves_to_the_ledger_when_enabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ledger_enabled", True)
+    bot = FinanceBotService()
+    bot.ledger = LedgerService(db_path=str(tmp_path / "ledger.db"))
+    bot.replicator.ledger = bot.ledger
+
+    storage = asyncio.run(bot.save_transactions(1, [transaction("2025-09-01 08:00:00", 15000)]))
+    assert storage == "ledger"
+    assert bot.ledger.get_aggregates(1, "day", "2025-09-01")["type"]["expense"]["total"] == 15000
+    bot.ledger.close()
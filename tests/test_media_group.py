@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+from config import settings
+from services.finance_bot_service import FinanceBotService
+from services.media_group_service import MediaGroupService
+from services.telegram_service import StatusMessage
+
+@pytest.fixture(autouse=True)
+def album_settings(monkeypatch):
+    monkeypatch.setattr(settings, "album_window", 0.02)
+    monkeypatch.setattr(settings, "album_max_size", 10)
+    monkeypatch.setattr(settings, "status_typing_interval", 0.0)
+
+def photo(message_id, chat_id=1, group="g1", caption=None):
+    message = {
+        "message_id": message_id, "chat": {"id": chat_id}, "from": {"first_name": "Budi"},
+        "date": 1757300000, "media_group_id": group,
+        "photo": [{"file_id": f"file-{message_id}", "file_unique_id": f"u-{message_id}", "width": 1280, "height": 960}]
+    }
+    if caption:
+        message["caption"] = caption
+    return message
+
+def collect(albums):
+    async def handler(messages):
+        albums.append([message["message_id"] for message in messages])
+    return handler
+
+def test_photos_are_grouped_per_chat_and_album_in_order():
+    async def scenario():
+        albums = []
+        service = MediaGroupService(collect(albums))
+        for message in (photo(3), photo(1), photo(7, chat_id=2), photo(2), photo(8, group="g2")):
+            service.add(message)
+        await asyncio.sleep(0.1)
+        return albums, service.stats()
+
+    albums, stats = asyncio.run(scenario())
+    assert sorted(albums) == [[1, 2, 3], [7], [8]]
+    assert stats["albums"] == 3 and stats["photos"] == 5 and stats["pending"] == 0
+
+def test_full_album_is_dispatched_without_waiting(monkeypatch):
+    monkeypatch.setattr(settings, "album_window", 10)
+    monkeypatch.setattr(settings, "album_max_size", 2)
+
+    async def scenario():
+        albums = []
+        service = MediaGroupService(collect(albums))
+        service.add(photo(1))
+        service.add(photo(2))
+        await asyncio.sleep(0.01)
+        return albums
+
+    assert asyncio.run(scenario()) == [[1, 2]]
+
+def test_stop_flushes_pending_albums():
+    async def scenario():
+        albums = []
+        service = MediaGroupService(collect(albums))
+        service.add(photo(1))
+        await service.stop()
+        return albums
+
+    assert asyncio.run(scenario()) == [[1]]
+
+def test_handler_errors_are_counted():
+    async def handler(messages):
+        raise RuntimeError("boom")
+
+    async def scenario():
+        service = MediaGroupService(handler)
+        service.add(photo(1))
+        await service.stop()
+        return service.stats()["errors"]
+
+    assert asyncio.run(scenario()) == 1
+
+class FakeTelegram:
+    def __init__(self):
+        self.sent = []
+
+    def status(self, chat_id, placeholder_text):
+        return StatusMessage(self, chat_id, placeholder_text, mode="typing")
+
+    async def send_chat_action(self, chat_id):
+        return {"ok": True}
+
+    async def send_message(self, chat_id, text, parse_mode="Markdown"):
+        self.sent.append(text)
+        return {"ok": True, "result": {"message_id": len(self.sent)}}
+
+@pytest.fixture
+def bot(monkeypatch):
+    service = FinanceBotService()
+    service.telegram = FakeTelegram()
+    saved = []
+
+    async def save_transactions(chat_id, transactions):
+        saved.extend(transactions)
+        return "ledger"
+
+    monkeypatch.setattr(service, "save_transactions", save_transactions)
+    service.saved = saved
+    return service
+
+def test_caption_is_used_only_for_the_photo_that_carries_it(bot, monkeypatch):
+    captions = {}
+
+    async def extract_image_data(chat_id, ai_service, file_id, caption="", file_unique_id=None, status=None):
+        captions[file_id] = caption
+        return {"amount": 1000, "category": "food", "payment_method": "cash", "type": "expense", "summary": file_id}
+
+    monkeypatch.setattr(bot, "extract_image_data", extract_image_data)
+    asyncio.run(bot.process_album([photo(1), photo(2, caption="makan siang kantor"), photo(3)]))
+
+    assert captions == {"file-1": "", "file-2": "makan siang kantor", "file-3": ""}
+    assert len(bot.saved) == 3
+    assert "makan siang kantor" in bot.telegram.sent[-1]
+
+def test_failed_album_replies_with_an_error(bot, monkeypatch):
+    def select_photo(photos):
+        raise RuntimeError("foto rusak")
+
+    monkeypatch.setattr(bot.images, "select_photo", select_photo)
+    with pytest.raises(RuntimeError):
+        asyncio.run(bot.process_album([photo(1), photo(2)]))
+
+    assert "Gagal memproses album 2 foto: foto rusak" in bot.telegram.sent[-1]
+    assert bot.saved == []
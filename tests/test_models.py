@@ -0,0 +1,39 @@
+import pytest
+from pydantic import ValidationError
+from schemas.models import TransactionExtraction, TransactionItem, coerce_number
+
+@pytest.mark.parametrize("value, expected", [
+    ("2", 2),
+    ("Rp 50.000", 50000),
+    ("12,5", 12.5),
+    ("1,250,000.00", 1250000),
+    ("25rb", 25000),
+    ("25 ribu", 25000),
+    ("50k", 50000),
+    ("2,5jt", 2500000),
+    ("1.500 rb", 1500000),
+    ("-5000", -5000),
+    ("Rp -5.000", -5000),
+    ("- Rp 5.000", -5000),
+    ("Rp 50.000 IDR", 50000),
+])
+def test_coerce_number_parses_llm_strings(value, expected):
+    assert coerce_number(value) == expected
+
+@pytest.mark.parametrize("value", [12, 12.5, None, "abc", "2 x 15000"])
+def test_coerce_number_leaves_other_values_for_pydantic(value):
+    assert coerce_number(value) == value
+
+def test_amount_with_several_numbers_is_rejected():
+    with pytest.raises(ValidationError):
+        TransactionExtraction(amount="2 x 15000", type="expense")
+
+def test_extraction_amount_uses_multiplier():
+    extraction = TransactionExtraction(amount="Rp 25rb", type="Pengeluaran")
+    assert extraction.amount == 25000
+    assert extraction.type == "expense"
+
+def test_item_quantity_accepts_decimals_and_keeps_whole_numbers_int():
+    assert TransactionItem(name="beras", quantity="1.5").quantity == 1.5
+    quantity = TransactionItem(name="kopi", quantity="2").quantity
+    assert quantity == 2 and isinstance(quantity, int)
@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from config import settings
+from services import provider_router_service
+from services.provider_router_service import ProviderRouterService, ProviderStats
+
+class FakeProvider:
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    async def extract(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            return {"error": f"{self.name} gagal"}
+        return {"amount": 1000, "provider": self.name}
+
+@pytest.fixture(autouse=True)
+def router_settings(monkeypatch):
+    monkeypatch.setattr(settings, "ai_provider", "chatgpt")
+    monkeypatch.setattr(settings, "router_failover", True)
+    monkeypatch.setattr(settings, "router_hedging_enabled", False)
+    monkeypatch.setattr(settings, "breaker_failure_threshold", 2)
+    monkeypatch.setattr(settings, "breaker_cooldown", 30.0)
+
+def make_router(chatgpt, gemini):
+    return ProviderRouterService({"chatgpt": lambda: chatgpt, "gemini": lambda: gemini})
+
+def call(router):
+    return asyncio.run(router.call_with_provider(lambda service: service.extract()))
+
+def test_failover_reports_the_provider_that_answered():
+    router = make_router(FakeProvider("chatgpt", fail=True), FakeProvider("gemini"))
+    provider, result = call(router)
+    assert provider == "gemini" and result["provider"] == "gemini"
+    assert router.state()["failovers"] == 1
+
+def test_both_failing_returns_the_primary_error():
+    router = make_router(FakeProvider("chatgpt", fail=True), FakeProvider("gemini", fail=True))
+    assert call(router) == ("chatgpt", {"error": "chatgpt gagal"})
+
+def test_breaker_opens_after_threshold_and_skips_the_provider():
+    chatgpt, gemini = FakeProvider("chatgpt", fail=True), FakeProvider("gemini")
+    router = make_router(chatgpt, gemini)
+    call(router)
+    call(router)
+    assert router.stats["chatgpt"].state == ProviderStats.OPEN
+    assert router.candidates() == ["gemini"]
+
+    call(router)
+    assert chatgpt.calls == 2 and gemini.calls == 3
+
+def test_half_open_allows_one_trial_and_closes_on_success(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(provider_router_service.time, "monotonic", lambda: now[0])
+    chatgpt, gemini = FakeProvider("chatgpt", fail=True), FakeProvider("gemini")
+    router = make_router(chatgpt, gemini)
+    call(router)
+    call(router)
+
+    now[0] += settings.breaker_cooldown
+    stats = router.stats["chatgpt"]
+    assert stats.allows_request() and stats.state == ProviderStats.HALF_OPEN
+    stats.trial_in_flight = True
+    assert not stats.allows_request()
+    stats.trial_in_flight = False
+
+    chatgpt.fail = False
+    assert call(router)[0] == "chatgpt"
+    assert stats.state == ProviderStats.CLOSED
+
+def test_failed_trial_reopens_the_breaker(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(provider_router_service.time, "monotonic", lambda: now[0])
+    router = make_router(FakeProvider("chatgpt", fail=True), FakeProvider("gemini"))
+    call(router)
+    call(router)
+    now[0] += settings.breaker_cooldown
+    call(router)
+    assert router.stats["chatgpt"].state == ProviderStats.OPEN
+
+def test_hedging_takes_the_faster_valid_result(monkeypatch):
+    monkeypatch.setattr(settings, "router_hedging_enabled", True)
+    monkeypatch.setattr(settings, "router_hedge_min_samples", 1)
+    monkeypatch.setattr(settings, "router_hedge_min_delay", 0.01)
+    chatgpt, gemini = FakeProvider("chatgpt", delay=0.2), FakeProvider("gemini")
+    router = make_router(chatgpt, gemini)
+    router.stats["chatgpt"].latencies.append(0.01)
+
+    provider, result = call(router)
+    state = router.state()
+    assert provider == "gemini" and result["provider"] == "gemini"
+    assert state["hedged_requests"] == 1 and state["hedge_wins"] == 1
+
+def test_hedging_waits_for_enough_latency_samples(monkeypatch):
+    monkeypatch.setattr(settings, "router_hedging_enabled", True)
+    monkeypatch.setattr(settings, "router_hedge_min_samples", 5)
+    chatgpt, gemini = FakeProvider("chatgpt", delay=0.02), FakeProvider("gemini")
+    router = make_router(chatgpt, gemini)
+
+    assert call(router)[0] == "chatgpt"
+    assert gemini.calls == 0 and router.state()["hedged_requests"] == 0
@@ -0,0 +1,70 @@
+import asyncio
+import time
+import pytest
+from config import settings
+from services.rate_limiter_service import RateLimiterService, TokenBucket
+
+def test_bucket_waits_instead_of_failing():
+    async def scenario():
+        bucket = TokenBucket(rate=50, capacity=1)
+        first = await bucket.acquire()
+        started = time.monotonic()
+        second = await bucket.acquire()
+        return first, second, time.monotonic() - started
+
+    first, second, elapsed = asyncio.run(scenario())
+    assert first == 0.0
+    assert second > 0 and elapsed >= 0.015
+
+def test_pause_blocks_until_it_expires():
+    async def scenario():
+        bucket = TokenBucket(rate=1000, capacity=10)
+        bucket.pause(0.05)
+        return await bucket.acquire()
+
+    assert asyncio.run(scenario()) >= 0.04
+
+@pytest.mark.parametrize("value, seconds", [
+    ("20", 20.0), ("1.5s", 1.5), ("6m0s", 360.0), ("250ms", 0.25), ("1h", 3600.0), ("", None), ("soon", None),
+])
+def test_parse_duration(value, seconds):
+    assert RateLimiterService().parse_duration(value) == seconds
+
+def test_exhausted_headers_pause_the_bucket():
+    limiter = RateLimiterService()
+    limiter.update_from_headers("openai", {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2s"})
+    assert limiter.buckets["openai"].paused_until > time.monotonic() + 1
+    assert limiter.buckets["openai_tokens"].paused_until == 0.0
+
+def test_penalize_uses_default_backoff_and_counts(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_default_backoff", 3.0)
+    limiter = RateLimiterService()
+    limiter.penalize("sheets")
+    limiter.penalize("telegram", retry_after=7, chat_id=5)
+    assert limiter.buckets["sheets"].paused_until > time.monotonic() + 2
+    assert limiter.get_chat_bucket(5).paused_until > time.monotonic() + 6
+    assert limiter.buckets["telegram"].paused_until == 0.0
+    assert limiter.stats()["throttled"] == {"sheets": 1, "telegram": 1}
+
+def test_throttled_chat_does_not_hold_a_concurrency_slot(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_max_connections", 1)
+
+    async def scenario():
+        limiter = RateLimiterService()
+        limiter.get_chat_bucket(1).pause(0.2)
+        order = []
+
+        async def send(chat_id):
+            async with limiter.limit("telegram", chat_id=chat_id):
+                order.append(chat_id)
+
+        await asyncio.gather(send(1), send(2))
+        return order
+
+    # Chat 2 tidak menunggu chat 1 yang sedang dijeda
+    assert asyncio.run(scenario()) == [2, 1]
+
+def test_group_chats_get_a_stricter_bucket():
+    limiter = RateLimiterService()
+    assert limiter.get_chat_bucket(-100).rate == settings.telegram_group_per_minute / 60
+    assert limiter.get_chat_bucket(100).rate == settings.telegram_chat_per_second
@@ -0,0 +1,43 @@
+import asyncio
+from config import settings
+from services.telegram_service import StatusMessage
+
+class FakeTelegram:
+    def __init__(self):
+        self.calls = []
+
+    async def send_chat_action(self, chat_id):
+        self.calls.append(("sendChatAction", chat_id))
+
+    async def send_message(self, chat_id, text):
+        self.calls.append(("sendMessage", text))
+        return {"ok": True, "result": {"message_id": 7}}
+
+    async def edit_message_text(self, chat_id, message_id, text):
+        self.calls.append(("editMessageText", message_id, text))
+        return {"ok": True}
+
+async def run_status(telegram, mode, duration):
+    async with StatusMessage(telegram, 1, "⏳", mode=mode) as status:
+        await status.start()
+        await status.start()
+        await asyncio.sleep(duration)
+        await status.reply("✅ selesai")
+
+def test_typing_sends_one_chat_action_by_default(monkeypatch):
+    monkeypatch.setattr(settings, "status_typing_interval", 0.0)
+    telegram = FakeTelegram()
+    asyncio.run(run_status(telegram, "typing", 0.05))
+    assert telegram.calls == [("sendChatAction", 1), ("sendMessage", "✅ selesai")]
+
+def test_typing_refresh_is_opt_in(monkeypatch):
+    monkeypatch.setattr(settings, "status_typing_interval", 0.02)
+    telegram = FakeTelegram()
+    asyncio.run(run_status(telegram, "typing", 0.05))
+    assert telegram.calls.count(("sendChatAction", 1)) >= 2
+    assert telegram.calls[-1] == ("sendMessage", "✅ selesai")
+
+def test_placeholder_is_edited_into_the_result():
+    telegram = FakeTelegram()
+    asyncio.run(run_status(telegram, "placeholder", 0))
+    assert telegram.calls == [("sendMessage", "⏳"), ("editMessageText", 7, "✅ selesai")]
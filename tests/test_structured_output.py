@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from config import settings
+from services.structured_output_service import StructuredOutputService
+
+VALID = '{"amount": 25000, "type": "expense", "category": "food"}'
+
+@pytest.fixture
+def structured():
+    return StructuredOutputService()
+
+@pytest.mark.parametrize("text", [
+    "```json\n" + VALID + "\n```",
+    "Berikut hasilnya: " + VALID + " Semoga membantu!",
+    '{"amount": 25000, "type": "expense", "category": "food",}',
+    "{“amount”: 25000, “type”: “expense”, “category”: “food”}",
+    "{'amount': 25000, 'type': 'expense', 'category': 'food', 'items': None}",
+])
+def test_repair_reads_almost_valid_json(structured, text):
+    data = structured.repair(text)
+    assert data["amount"] == 25000 and data["category"] == "food"
+
+def test_repair_gives_up_on_non_json(structured):
+    with pytest.raises(ValueError):
+        structured.repair("maaf, saya tidak bisa membaca struk ini")
+
+def test_parse_transaction_validates_and_coerces(structured):
+    result = structured.parse_transaction("fake", '[{"amount": "Rp 25rb", "type": "Pengeluaran"}]')
+    assert result["amount"] == 25000 and result["type"] == "expense"
+
+def test_parse_batch_drops_invalid_items_and_adds_index(structured):
+    text = '{"transactions": [{"amount": 1000, "type": "expense"}, {"amount": "?", "type": "expense"}, {"amount": 3000, "type": "income"}]}'
+    results = structured.parse_batch("fake", text)
+    assert [(result["index"], result["amount"]) for result in results] == [(1, 1000), (3, 3000)]
+
+def test_unusable_response_is_reasked_once(structured, monkeypatch):
+    monkeypatch.setattr(settings, "structured_output_reask", True)
+    prompts = []
+
+    async def reask(prompt):
+        prompts.append(prompt)
+        return VALID
+
+    result = asyncio.run(structured.parse_or_reask("fake", '{"amount": "banyak"}', reask))
+    assert result["amount"] == 25000
+    assert len(prompts) == 1 and '{"amount": "banyak"}' in prompts[0]
+
+def test_failed_reask_raises(structured, monkeypatch):
+    monkeypatch.setattr(settings, "structured_output_reask", True)
+
+    async def reask(prompt):
+        return "tetap bukan JSON"
+
+    with pytest.raises(ValueError):
+        asyncio.run(structured.parse_or_reask("fake", "bukan JSON", reask))
+
+def test_reask_can_be_disabled(structured, monkeypatch):
+    monkeypatch.setattr(settings, "structured_output_reask", False)
+
+    async def reask(prompt):
+        raise AssertionError("tidak boleh bertanya ulang")
+
+    with pytest.raises(ValueError):
+        asyncio.run(structured.parse_or_reask("fake", "bukan JSON", reask))
+
+def test_schemas_are_strict_for_openai(structured):
+    schema = structured.openai_response_format()["json_schema"]["schema"]
+    assert schema["additionalProperties"] is False
+    assert set(schema["required"]) == set(schema["properties"])
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime
+import pytest
+import pytz
+from config import settings
+from services.finance_bot_service import FinanceBotService
+from services.ledger_service import LedgerService
+from services.message_formatter_service import MessageFormatterService
+
+# 14 September 2025 pukul 10:00 WIB
+NOW = int(pytz.timezone("Asia/Jakarta").localize(datetime(2025, 9, 14, 10, 0)).timestamp())
+
+class FakeTelegram:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode="Markdown"):
+        self.sent.append((chat_id, text))
+        return {"message_id": len(self.sent)}
+
+def transaction(timestamp, amount, category, payment_method, transaction_type):
+    return {
+        "timestamp": timestamp, "prompt_text": category, "category": category, "amount": amount,
+        "payment_method": payment_method, "type": transaction_type, "summary": category, "items": []
+    }
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ledger_enabled", True)
+    service = FinanceBotService()
+    service.telegram = FakeTelegram()
+    service.ledger = LedgerService(db_path=str(tmp_path / "ledger.db"))
+    service.ledger.record_many([
+        (1, transaction("2025-09-14 08:00:00", 25000, "food", "gopay", "expense")),
+        (1, transaction("2025-09-13 08:00:00", 50000, "transport", "cash", "expense")),
+        (1, transaction("2025-09-01 09:00:00", 5000000, "salary", "bca", "income")),
+        (1, transaction("2025-08-20 09:00:00", 70000, "food", "cash", "expense")),
+        (2, transaction("2025-09-14 08:00:00", 999000, "food", "cash", "expense")),
+    ])
+    yield service
+    service.ledger.close()
+
+def reply(bot, text):
+    asyncio.run(bot.process_command(1, "Budi", text, NOW))
+    return bot.telegram.sent[-1][1]
+
+@pytest.mark.parametrize("argument, expected", [
+    ("hari", ("day", "2025-09-14")),
+    ("kemarin", ("day", "2025-09-13")),
+    ("", ("month", "2025-09")),
+    ("bulanlalu", ("month", "2025-08")),
+    ("2025-07", ("month", "2025-07")),
+    ("2025-07-04", ("day", "2025-07-04")),
+])
+def test_resolve_period(argument, expected):
+    assert FinanceBotService().resolve_period(argument, NOW)[:2] == expected
+
+def test_unknown_period_is_rejected():
+    assert FinanceBotService().resolve_period("minggu", NOW) is None
+
+def test_summary_shows_today_and_this_month(bot):
+    text = reply(bot, "/summary")
+    today, month = text.split("Bulan ini")
+    assert "Pengeluaran: Rp 25,000" in today and "Transaksi: 1" in today
+    assert "Pemasukan: Rp 5,000,000" in month and "Pengeluaran: Rp 75,000" in month
+    assert "999,000" not in text
+
+def test_report_breaks_down_by_type(bot):
+    text = reply(bot, "/report@finance_bot bulanlalu")
+    assert "Bulan lalu (2025-08)" in text
+    assert "Pengeluaran per Kategori:*\n• food: Rp 70,000 (1x)" in text
+    assert "Pemasukan per Kategori" not in text
+
+def test_unknown_period_replies_with_help(bot):
+    text = reply(bot, "/report minggu")
+    assert "Periode tidak dikenal: minggu" in text and "/summary" in text
+
+def test_summary_without_ledger_explains_the_setting(bot, monkeypatch):
+    monkeypatch.setattr(settings, "ledger_enabled", False)
+    assert reply(bot, "/summary") == MessageFormatterService().format_ledger_required_message()
+
+def test_report_for_an_empty_period():
+    text = MessageFormatterService().format_report("Budi", "2025-01", {"type": {}})
+    assert "Belum ada transaksi." in text and "per Kategori" not in text
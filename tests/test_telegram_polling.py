@@ -0,0 +1,99 @@
+import asyncio
+import json
+from services.telegram_polling_service import TelegramPollingService
+
+class FakeTelegram:
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.offsets = []
+
+    async def delete_webhook(self):
+        return True
+
+    async def get_updates(self, offset=None):
+        self.offsets.append(offset)
+        if self.batches:
+            return self.batches.pop(0)
+        await asyncio.sleep(0.01)
+        return []
+
+def make_update(update_id, chat_id):
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": "x"}}
+
+def read_offset(path):
+    return json.loads(path.read_text())["offset"] if path.exists() else None
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0.01)
+
+def test_offset_is_committed_only_past_finished_updates(tmp_path):
+    path = tmp_path / "offset.json"
+
+    async def scenario():
+        gates = {update_id: asyncio.Event() for update_id in (10, 11, 12)}
+
+        async def handler(update):
+            await gates[update["update_id"]].wait()
+
+        telegram = FakeTelegram([[make_update(10, 1), make_update(11, 2), make_update(12, 3)]])
+        polling = TelegramPollingService(telegram, handler, concurrency=4, offset_path=str(path))
+        await polling.start()
+        await settle()
+        # getUpdates sudah maju, tapi belum ada update yang selesai
+        assert polling.offset == 13
+        assert read_offset(path) is None
+
+        gates[11].set()
+        gates[12].set()
+        await settle()
+        assert read_offset(path) is None  # update 10 masih berjalan
+
+        gates[10].set()
+        await settle()
+        assert read_offset(path) == 13
+        await polling.stop(timeout=1)
+
+    asyncio.run(scenario())
+
+def test_cancelled_updates_are_fetched_again_after_restart(tmp_path):
+    path = tmp_path / "offset.json"
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def handler(update):
+            if update["update_id"] == 21:
+                await release.wait()
+
+        telegram = FakeTelegram([[make_update(20, 1), make_update(21, 1), make_update(22, 2)]])
+        polling = TelegramPollingService(telegram, handler, concurrency=4, offset_path=str(path))
+        await polling.start()
+        await settle()
+        await polling.stop(timeout=0.05)
+        assert read_offset(path) == 21
+
+        restarted = TelegramPollingService(FakeTelegram([]), handler, offset_path=str(path))
+        restarted.load_offset()
+        assert restarted.offset == 21
+
+    asyncio.run(scenario())
+
+def test_updates_from_one_chat_run_in_order(tmp_path):
+    async def scenario():
+        seen = []
+
+        async def handler(update):
+            # Update pertama lebih lambat; urutan per chat tetap terjaga
+            await asyncio.sleep(0.03 if update["update_id"] == 30 else 0)
+            seen.append(update["update_id"])
+
+        telegram = FakeTelegram([[make_update(30, 1), make_update(31, 1), make_update(32, 2)]])
+        polling = TelegramPollingService(telegram, handler, concurrency=4, offset_path=str(tmp_path / "offset.json"))
+        await polling.start()
+        await asyncio.sleep(0.1)
+        await polling.stop(timeout=1)
+        assert seen.index(30) < seen.index(31)
+        assert polling.committed_offset == 33
+
+    asyncio.run(scenario())
@@ -0,0 +1,88 @@
+import asyncio
+import time
+import httpx
+import main
+from services.update_dedup_service import UpdateDedupService
+
+def test_update_is_claimed_once():
+    dedup = UpdateDedupService(persist_path="")
+    assert dedup.claim(1)
+    assert not dedup.claim(1)  # masih diproses
+    dedup.mark_processed(1)
+    assert not dedup.claim(1)  # sudah selesai
+    stats = dedup.stats()
+    assert stats["duplicate_in_flight"] == 1 and stats["duplicate_processed"] == 1
+
+def test_released_update_can_be_claimed_again():
+    dedup = UpdateDedupService(persist_path="")
+    assert dedup.claim(2)
+    dedup.release(2)
+    assert dedup.claim(2)
+
+def test_release_does_not_forget_a_processed_update():
+    dedup = UpdateDedupService(persist_path="")
+    dedup.claim(3)
+    dedup.mark_processed(3)
+    dedup.release(3)
+    assert not dedup.claim(3)
+
+def test_store_is_bounded_and_expires(monkeypatch):
+    dedup = UpdateDedupService(max_size=2, ttl=60, persist_path="")
+    for update_id in (1, 2, 3):
+        dedup.claim(update_id)
+    assert dedup.claim(1)  # yang paling lama sudah dibuang
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert dedup.claim(3)  # kedaluwarsa setelah TTL
+
+def test_processed_updates_survive_restart(tmp_path):
+    path = str(tmp_path / "seen_updates.json")
+    dedup = UpdateDedupService(persist_path=path)
+    dedup.claim(10)
+    dedup.mark_processed(10)
+    dedup.claim(11)  # belum selesai, tidak ikut disimpan
+    dedup.save()
+
+    restarted = UpdateDedupService(persist_path=path)
+    assert not restarted.claim(10)
+    assert restarted.claim(11)
+
+def test_webhook_drops_redelivered_update(monkeypatch):
+    handled = []
+
+    async def process_update(data):
+        handled.append(data["update_id"])
+
+    monkeypatch.setattr(main.finance_bot, "process_update", process_update)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            update = {"update_id": 910001, "message": {"chat": {"id": 1}}}
+            first = await client.post("/webhook", json=update)
+            second = await client.post("/webhook", json=update)
+            return first.json(), second.json()
+
+    assert asyncio.run(scenario()) == ({"status": "ok"}, {"status": "duplicate"})
+    assert handled == [910001]
+
+def test_failed_update_is_released_for_a_retry(monkeypatch):
+    attempts = []
+
+    async def process_update(data):
+        attempts.append(data["update_id"])
+        if len(attempts) == 1:
+            raise RuntimeError("boom")
+
+    monkeypatch.setattr(main.finance_bot, "process_update", process_update)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            update = {"update_id": 910002, "message": {"chat": {"id": 1}}}
+            await client.post("/webhook", json=update)
+            return (await client.post("/webhook", json=update)).json()
+
+    assert asyncio.run(scenario()) == {"status": "ok"}
+    assert attempts == [910002, 910002]